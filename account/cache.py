@@ -0,0 +1,525 @@
+import gzip
+import json
+import os
+import pickle
+import random
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django_redis import get_redis_connection
+from django_redis.cache import RedisCache
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def get_progress_version_cache_key(user_id=None, child_id=None):
+    if child_id:
+        return f"progress_version_child_{child_id}"
+    return f"progress_version_user_{user_id}"
+
+
+def get_versions(cache_keys):
+    """
+    Return {cache_key: version} for several version keys in one cache round
+    trip, creating the missing ones.
+    """
+    versions = cache.get_many(cache_keys)
+    missing = {key: uuid.uuid4().hex for key in cache_keys if key not in versions}
+    for key, version in missing.items():
+        cache.add(key, version, timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing.keys()))
+    return versions
+
+
+def bump_progress_version(user_id=None, child_id=None):
+    """
+    Mark the progress of a learner (a student user or a child) as changed, so
+    responses that include it are no longer answered as not modified.
+    """
+    cache.set(
+        get_progress_version_cache_key(user_id, child_id),
+        uuid.uuid4().hex,
+        timeout=None,
+    )
+
+
+# Views cached per learner register their keys in a set per learner, so the
+# progress of one learner is invalidated without scanning the keyspace. The
+# sets outlive the entries they list. Changes for every learner, like content
+# edits, are handled by versioned keys instead.
+LEARNER_CACHE_INDEX_TIMEOUT = 86400
+
+
+def get_learner_cache_index_key(user_id=None, child_id=None):
+    if child_id:
+        return f"cache_index_child_{child_id}"
+    return f"cache_index_user_{user_id}"
+
+
+def add_to_learner_cache_index(index_key, cache_key):
+    if isinstance(caches["default"], RedisCache):
+        redis_index_key = cache.make_key(index_key)
+        pipeline = get_redis_connection("default").pipeline(transaction=False)
+        pipeline.sadd(redis_index_key, cache_key)
+        pipeline.expire(redis_index_key, LEARNER_CACHE_INDEX_TIMEOUT)
+        pipeline.execute()
+        return
+
+    # Other backends, used in development, keep the sets as pickled values
+    cache_keys = cache.get(index_key, set())
+    cache_keys.add(cache_key)
+    cache.set(index_key, cache_keys, LEARNER_CACHE_INDEX_TIMEOUT)
+
+
+def delete_learner_cache(user_id=None, child_id=None):
+    """
+    Delete every cache key registered for a learner (a student user or a
+    child) with one SMEMBERS and one UNLINK.
+    """
+    index_key = get_learner_cache_index_key(user_id, child_id)
+    if not isinstance(caches["default"], RedisCache):
+        cache.delete_many([*cache.get(index_key, ()), index_key])
+        return
+
+    connection = get_redis_connection("default")
+    # Keys registered after the set is read go to a new set
+    pipeline = connection.pipeline(transaction=True)
+    pipeline.smembers(cache.make_key(index_key))
+    pipeline.unlink(cache.make_key(index_key))
+    cache_keys, _ = pipeline.execute()
+    if cache_keys:
+        connection.unlink(*[cache.make_key(key.decode()) for key in cache_keys])
+
+
+def invalidate_learners(user_ids=(), child_ids=()):
+    """
+    Bump the progress versions and delete the cached views of many learners
+    at once, for bulk updates that skip the model signals.
+    """
+    versions = {
+        get_progress_version_cache_key(user_id=user_id): uuid.uuid4().hex
+        for user_id in user_ids
+    }
+    versions.update(
+        {
+            get_progress_version_cache_key(child_id=child_id): uuid.uuid4().hex
+            for child_id in child_ids
+        }
+    )
+    if versions:
+        cache.set_many(versions, timeout=None)
+    for user_id in user_ids:
+        delete_learner_cache(user_id=user_id)
+    for child_id in child_ids:
+        delete_learner_cache(child_id=child_id)
+
+
+# Cached values stay fresh for their timeout plus up to this fraction of it,
+# so keys written together do not all expire together
+CACHE_TIMEOUT_JITTER = 0.1
+# Seconds an expired value is kept and served while one request rebuilds it
+CACHE_STALE_GRACE = 300
+# Single flight: how long a rebuild may hold its lock, and how long others
+# wait for it on a cold key before building the value themselves
+CACHE_BUILD_LOCK_TIMEOUT = 30
+CACHE_BUILD_WAIT = 5
+CACHE_BUILD_POLL_INTERVAL = 0.05
+
+CachedValue = namedtuple("CachedValue", ["fresh_until", "value"])
+
+
+def get_cache_build_lock_key(cache_key):
+    return f"build_lock_{cache_key}"
+
+
+def _store_cached_value(cache_key, value, timeout):
+    timeout += random.uniform(0, timeout * CACHE_TIMEOUT_JITTER)
+    entry = CachedValue(time.time() + timeout, value)
+    cache.set(cache_key, entry, int(timeout) + CACHE_STALE_GRACE)
+    return entry
+
+
+def set_cached_value(cache_key, value, timeout, index_key=None):
+    """
+    Cache `value` for get_or_build, fresh for a jittered `timeout`, and return
+    it.
+    """
+    value = _store_cached_value(cache_key, value, timeout).value
+    if index_key:
+        add_to_learner_cache_index(index_key, cache_key)
+    return value
+
+
+# In-process tier for keys that are the same for every user
+LOCAL_CACHE_MAX_ENTRIES = 256
+LOCAL_CACHE_TIMEOUT = 30
+LOCAL_CACHE_CHANNEL = "local_cache_invalidation"
+LOCAL_CACHE_RECONNECT_DELAY = 5
+
+
+class LocalCache:
+    """
+    A small LRU of CachedValue entries with a short TTL, kept in each process
+    in front of the shared cache. Keys deleted with delete_cached are
+    broadcast over Redis pub/sub and dropped by every process; while the
+    process is not subscribed the tier is bypassed.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._listener_lock = threading.Lock()
+        self._listener_pid = None
+        self.subscribed = False
+        # Bumped on every invalidation, so a value read from the shared cache
+        # before an invalidation is not stored after it
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, entry, generation):
+        with self._lock:
+            if generation == self.generation:
+                self._entries[key] = entry
+
+    def delete_many(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def is_enabled(self):
+        """
+        Start the invalidation listener of this process if it is not running
+        and return whether it is subscribed. Only Redis caches broadcast.
+        """
+        if not isinstance(caches["default"], RedisCache):
+            return False
+        if self._listener_pid != os.getpid():
+            with self._listener_lock:
+                if self._listener_pid != os.getpid():
+                    # A forked worker starts its own listener with no entries
+                    self._listener_pid = os.getpid()
+                    self.subscribed = False
+                    self.clear()
+                    threading.Thread(
+                        target=self._listen,
+                        name="local-cache-invalidation",
+                        daemon=True,
+                    ).start()
+        return self.subscribed
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub()
+                pubsub.subscribe(LOCAL_CACHE_CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        self.subscribed = True
+                    elif message["type"] == "message":
+                        self.delete_many(json.loads(message["data"]))
+            except Exception as e:
+                print(f"Local cache invalidation listener failed: {e}")
+            # Invalidations may have been missed while disconnected
+            self.subscribed = False
+            self.clear()
+            time.sleep(LOCAL_CACHE_RECONNECT_DELAY)
+
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TIMEOUT)
+
+
+def delete_cached(cache_keys):
+    """
+    Delete keys from the shared cache and from the local tier of every
+    process.
+    """
+    cache_keys = list(cache_keys)
+    cache.delete_many(cache_keys)
+    local_cache.delete_many(cache_keys)
+    if isinstance(caches["default"], RedisCache):
+        try:
+            get_redis_connection("default").publish(
+                LOCAL_CACHE_CHANNEL, json.dumps(cache_keys)
+            )
+        except Exception as e:
+            print(f"Local cache invalidation of {cache_keys} not broadcast: {e}")
+
+
+# Counters of get_or_build are summed per process and added to the shared
+# cache at most every CACHE_METRICS_FLUSH_INTERVAL seconds
+CACHE_METRICS_FIELDS = (
+    "hits",
+    "local_hits",
+    "stale_hits",
+    "misses",
+    "wait_timeouts",
+    "build_ms",
+    "sized",
+    "bytes",
+)
+CACHE_METRICS_FLUSH_INTERVAL = 10
+# Rendered responses are sized by their content; other values are pickled
+# to be sized only for this fraction of misses
+CACHE_METRICS_SIZE_SAMPLE_RATE = 0.1
+CACHE_METRICS_PREFIXES_CACHE_KEY = "cache_metrics_prefixes"
+
+
+def get_cache_metrics_prefix(cache_key):
+    # "course_user_1_id_2" and "courses_user_1" are counted as course and
+    # courses
+    return cache_key.split("_", 1)[0]
+
+
+def get_cache_metrics_cache_key(prefix, field):
+    return f"cache_metrics_{prefix}_{field}"
+
+
+class CacheMetrics:
+    """
+    Hits, misses, rebuild time and rebuilt payload bytes of get_or_build per
+    key prefix, summed over all processes in the shared cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._flushed_at = time.time()
+
+    def record(self, cache_key, **counts):
+        prefix = get_cache_metrics_prefix(cache_key)
+        with self._lock:
+            prefix_counts = self._counts.setdefault(prefix, {})
+            for field, value in counts.items():
+                prefix_counts[field] = prefix_counts.get(field, 0) + value
+            if time.time() - self._flushed_at < CACHE_METRICS_FLUSH_INTERVAL:
+                return
+            pending, self._counts = self._counts, {}
+            self._flushed_at = time.time()
+        self._add_to_shared_cache(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._counts = self._counts, {}
+            self._flushed_at = time.time()
+        self._add_to_shared_cache(pending)
+
+    def _add_to_shared_cache(self, pending):
+        try:
+            prefixes = set(cache.get(CACHE_METRICS_PREFIXES_CACHE_KEY, ()))
+            if not prefixes.issuperset(pending):
+                cache.set(
+                    CACHE_METRICS_PREFIXES_CACHE_KEY,
+                    sorted(prefixes | set(pending)),
+                    timeout=None,
+                )
+            for prefix, counts in pending.items():
+                for field, value in counts.items():
+                    key = get_cache_metrics_cache_key(prefix, field)
+                    cache.add(key, 0, timeout=None)
+                    cache.incr(key, value)
+        except Exception as e:
+            print(f"Cache metrics not saved: {e}")
+
+    def read(self):
+        """
+        Return {prefix: {field: total}} over all processes, after adding the
+        counts of this process.
+        """
+        self.flush()
+        prefixes = cache.get(CACHE_METRICS_PREFIXES_CACHE_KEY, [])
+        values = cache.get_many(
+            [
+                get_cache_metrics_cache_key(prefix, field)
+                for prefix in prefixes
+                for field in CACHE_METRICS_FIELDS
+            ]
+        )
+        return {
+            prefix: {
+                field: values.get(get_cache_metrics_cache_key(prefix, field), 0)
+                for field in CACHE_METRICS_FIELDS
+            }
+            for prefix in prefixes
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+            self._flushed_at = time.time()
+        prefixes = cache.get(CACHE_METRICS_PREFIXES_CACHE_KEY, [])
+        cache.delete_many(
+            [CACHE_METRICS_PREFIXES_CACHE_KEY]
+            + [
+                get_cache_metrics_cache_key(prefix, field)
+                for prefix in prefixes
+                for field in CACHE_METRICS_FIELDS
+            ]
+        )
+
+
+cache_metrics = CacheMetrics()
+
+
+def _get_size_counts(value):
+    if isinstance(value, RenderedResponse):
+        return {"sized": 1, "bytes": len(value.content)}
+    if random.random() < CACHE_METRICS_SIZE_SAMPLE_RATE:
+        return {"sized": 1, "bytes": len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))}
+    return {}
+
+
+def _build_cached_value(cache_key, build, timeout, index_key):
+    started = time.perf_counter()
+    value = build()
+    build_ms = round((time.perf_counter() - started) * 1000)
+    entry = _store_cached_value(cache_key, value, timeout)
+    if index_key:
+        add_to_learner_cache_index(index_key, cache_key)
+    cache_metrics.record(
+        cache_key, misses=1, build_ms=build_ms, **_get_size_counts(value)
+    )
+    return entry
+
+
+def get_or_build(cache_key, build, timeout, local=False, index_key=None):
+    """
+    Return the value cached under `cache_key`, computing it with `build()`
+    when missing or expired. Only the caller holding the build lock of a key
+    rebuilds it; meanwhile the others get the expired value within its grace
+    period, or wait for the new one up to CACHE_BUILD_WAIT seconds before
+    building it themselves.
+    With `local`, for keys that are the same for every user, fresh values are
+    also kept in this process for up to LOCAL_CACHE_TIMEOUT seconds.
+    With `index_key`, built keys are registered in that learner cache index.
+    """
+    local = local and local_cache.is_enabled()
+    if local:
+        generation = local_cache.generation
+        entry = local_cache.get(cache_key)
+        if entry is not None and entry.fresh_until > time.time():
+            cache_metrics.record(cache_key, local_hits=1)
+            return entry.value
+
+    entry = cache.get(cache_key)
+    # Entries cached in an older format count as misses
+    if not isinstance(entry, CachedValue):
+        entry = None
+    elif entry.fresh_until > time.time():
+        cache_metrics.record(cache_key, hits=1)
+        if local:
+            local_cache.set(cache_key, entry, generation)
+        return entry.value
+
+    lock_key = get_cache_build_lock_key(cache_key)
+    if cache.add(lock_key, 1, CACHE_BUILD_LOCK_TIMEOUT):
+        try:
+            entry = _build_cached_value(cache_key, build, timeout, index_key)
+        finally:
+            cache.delete(lock_key)
+        if local:
+            local_cache.set(cache_key, entry, generation)
+        return entry.value
+
+    if entry is not None:
+        cache_metrics.record(cache_key, stale_hits=1)
+        return entry.value
+
+    deadline = time.time() + CACHE_BUILD_WAIT
+    while time.time() < deadline:
+        time.sleep(CACHE_BUILD_POLL_INTERVAL)
+        entry = cache.get(cache_key)
+        if isinstance(entry, CachedValue):
+            cache_metrics.record(cache_key, hits=1)
+            return entry.value
+    cache_metrics.record(cache_key, wait_timeouts=1)
+    return _build_cached_value(cache_key, build, timeout, index_key).value
+
+
+# Rendered responses at least this large are cached gzip-compressed
+RENDERED_RESPONSE_COMPRESS_MIN_SIZE = 1024
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+RenderedResponse = namedtuple(
+    "RenderedResponse", ["content_type", "encoding", "content"]
+)
+
+
+def render_response_entry(data):
+    """
+    Render `data` to the final JSON bytes of a response, compressed when
+    large. A cache hit then needs neither unpickling of nested dicts nor the
+    DRF renderer.
+    """
+    content = JSONRenderer().render(data)
+    encoding = None
+    if len(content) >= RENDERED_RESPONSE_COMPRESS_MIN_SIZE:
+        content = gzip.compress(content)
+        encoding = "gzip"
+    return RenderedResponse("application/json", encoding, content)
+
+
+def set_cached_response(cache_key, data, timeout, index_key=None):
+    """
+    Cache `data` as a rendered response for get_or_build_response.
+    """
+    return set_cached_value(
+        cache_key, render_response_entry(data), timeout, index_key=index_key
+    )
+
+
+def render_cached_response(request, entry):
+    content_type, encoding, content = entry
+    accepts_gzip = settings.VIEW_CACHE_GZIP_PASSTHROUGH and _accepts_gzip.search(
+        request.headers.get("Accept-Encoding", "")
+    )
+    if encoding == "gzip" and not accepts_gzip:
+        content = gzip.decompress(content)
+        encoding = None
+
+    response = HttpResponse(content, content_type=content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def get_or_build_response(
+    request, cache_key, build, timeout, local=False, index_key=None
+):
+    """
+    Return the response cached under `cache_key`, rendered from `build()`
+    with get_or_build when missing or expired. `build` returns the data of
+    the response, or a DRF Response whose data is used. Misses and hits send
+    the same bytes; compressed bytes are passed through to clients that
+    accept gzip. `local` and `index_key` are passed on to get_or_build.
+    """
+
+    def build_entry():
+        data = build()
+        if isinstance(data, Response):
+            data = data.data
+        return render_response_entry(data)
+
+    return render_cached_response(
+        request,
+        get_or_build(cache_key, build_entry, timeout, local=local, index_key=index_key),
+    )
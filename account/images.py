@@ -0,0 +1,64 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+IMAGE_VARIANT_QUALITY = 80
+
+
+def build_image_variants(field_file):
+    """
+    Store resized WebP and JPEG copies of an image next to the original, e.g.
+    questions/cat.png -> questions/cat_w320.webp. Widths at or above the
+    original are skipped. Returns
+    {"source": name, "webp": {"320": name, ...}, "jpeg": {"320": name, ...}}.
+    """
+    storage = field_file.storage
+    root = os.path.splitext(field_file.name)[0]
+    variants = {"source": field_file.name}
+
+    with storage.open(field_file.name, "rb") as source:
+        image = ImageOps.exif_transpose(PILImage.open(source))
+        image.load()
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+
+    for extension, image_format in IMAGE_VARIANT_FORMATS.items():
+        variants[extension] = {}
+        if image_format == "JPEG" and image.mode == "RGBA":
+            encoded = PILImage.new("RGB", image.size, (255, 255, 255))
+            encoded.paste(image, mask=image.getchannel("A"))
+        else:
+            encoded = image
+
+        for width in IMAGE_VARIANT_WIDTHS:
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = encoded.resize((width, height), PILImage.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=IMAGE_VARIANT_QUALITY)
+            variants[extension][str(width)] = storage.save(
+                f"{root}_w{width}.{extension}", ContentFile(buffer.getvalue())
+            )
+
+    return variants
+
+
+def delete_image_variants(variants, storage, keep=()):
+    for extension in IMAGE_VARIANT_FORMATS:
+        for name in (variants or {}).get(extension, {}).values():
+            if name not in keep:
+                storage.delete(name)
+
+
+def get_image_variant_names(variants):
+    return {
+        name
+        for extension in IMAGE_VARIANT_FORMATS
+        for name in (variants or {}).get(extension, {}).values()
+    }
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0017_school_school_year"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="child",
+            name="avatar_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="student",
+            name="avatar_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -8,6 +8,7 @@ from django.contrib.auth.models import (
 )
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from .utils import get_school_year
 
@@ -188,6 +189,8 @@ class Student(models.Model):
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, default="O")
     language = models.CharField(max_length=50, choices=LANGUAGE_CHOICES, default="kz")
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
+    # Resized copies built by account.tasks.generate_image_variants
+    avatar_variants = models.JSONField(default=dict, blank=True)
     birth_date = models.DateField(default=date(2015, 1, 1), blank=True, null=True)
     last_task_completed_at = models.DateTimeField(null=True, blank=True)
 
@@ -200,7 +203,7 @@ class Student(models.Model):
                 self.level = requirement.level
             else:
                 break
-        self.save()
+        self.save(update_fields=["level"])
 
     def update_streak(self):
         now = timezone.now()
@@ -214,7 +217,7 @@ class Student(models.Model):
         else:
             self.streak = 1
         self.last_task_completed_at = now
-        self.save()
+        self.save(update_fields=["streak", "last_task_completed_at"])
 
     def add_question_reward(self):
         question_reward = settings.QUESTION_REWARD
@@ -222,6 +225,13 @@ class Student(models.Model):
         self.stars += question_reward
         self.save()
 
+    def add_question_rewards(self, count):
+        question_reward = settings.QUESTION_REWARD * count
+        type(self).objects.filter(pk=self.pk).update(
+            cups=F("cups") + question_reward, stars=F("stars") + question_reward
+        )
+        self.refresh_from_db(fields=["cups", "stars"])
+
 
 class Parent(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="parent")
@@ -238,6 +248,8 @@ class Child(models.Model):
     last_name = models.CharField(max_length=150)
     grade = models.IntegerField(choices=GRADE_CHOICES)
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
+    # Resized copies built by account.tasks.generate_image_variants
+    avatar_variants = models.JSONField(default=dict, blank=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, default="O")
     language = models.CharField(max_length=50, choices=LANGUAGE_CHOICES, default="ru")
     cups = models.PositiveIntegerField(default=0)
@@ -256,7 +268,7 @@ class Child(models.Model):
                 self.level = requirement.level
             else:
                 break
-        self.save()
+        self.save(update_fields=["level"])
 
     def update_streak(self):
         now = timezone.now()
@@ -270,7 +282,7 @@ class Child(models.Model):
         else:
             self.streak = 1
         self.last_task_completed_at = now
-        self.save()
+        self.save(update_fields=["streak", "last_task_completed_at"])
 
     def add_question_reward(self):
         question_reward = settings.QUESTION_REWARD
@@ -278,6 +290,13 @@ class Child(models.Model):
         self.stars += question_reward
         self.save()
 
+    def add_question_rewards(self, count):
+        question_reward = settings.QUESTION_REWARD * count
+        type(self).objects.filter(pk=self.pk).update(
+            cups=F("cups") + question_reward, stars=F("stars") + question_reward
+        )
+        self.refresh_from_db(fields=["cups", "stars"])
+
 
 class MotivationalPhrase(models.Model):
     text = models.CharField(max_length=255)
@@ -1,8 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from django.core.validators import validate_email
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
@@ -10,11 +11,73 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from account.models import *
 
 from .tasks import send_activation_email
-from .utils import generate_password
+from .utils import confirm_direct_upload, generate_password
 
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Resized copies of an image as {"webp": {"320": url, ...}, "jpeg": {...}},
+    read from a `*_variants` field filled by generate_image_variants.
+    """
+
+    def to_representation(self, value):
+        variants = {
+            format: names
+            for format, names in (value or {}).items()
+            if format != "source"
+        }
+        names = [name for names in variants.values() for name in names.values()]
+        # Storages that sign URLs can sign all variants in one batch
+        if hasattr(default_storage, "urls"):
+            urls = default_storage.urls(names)
+        else:
+            urls = {name: default_storage.url(name) for name in names}
+        return {
+            format: {width: urls[name] for width, name in names.items()}
+            for format, names in variants.items()
+        }
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=255)
+    method = serializers.ChoiceField(choices=["post", "put"], default="post")
+
+
+class DirectUploadFieldMixin:
+    """
+    Accept the `upload_token` of a finished direct upload in place of a file,
+    so create and update endpoints double as the upload confirmation.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            model_field = self.parent.Meta.model._meta.get_field(self.source)
+            try:
+                return confirm_direct_upload(model_field, data)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.messages)
+        return super().to_internal_value(data)
+
+
+class DirectUploadFileField(DirectUploadFieldMixin, serializers.FileField):
+    pass
+
+
+class DirectUploadImageField(DirectUploadFieldMixin, serializers.ImageField):
+    pass
+
+
+class DirectUploadModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.FileField: DirectUploadFileField,
+        models.ImageField: DirectUploadImageField,
+    }
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -270,6 +333,7 @@ class StudentRegistrationSerializer(serializers.ModelSerializer):
 class StudentSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     school_name = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = Student
@@ -370,6 +434,7 @@ class ChildSerializer(serializers.ModelSerializer):
     tasks_completed = serializers.SerializerMethodField()
     has_subscription = serializers.SerializerMethodField()
     is_free_trial = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = Child
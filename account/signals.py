@@ -4,12 +4,27 @@ from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from account.models import Child, DailyMessage, Parent, Student
 from account.tasks import (
-    course_invalidate_cache,
     invalidate_user_cache,
     delete_keys_matching,
+    schedule_image_variants,
 )
+from account.cache import bump_progress_version, delete_cached, delete_learner_cache
+from account.images import delete_image_variants
 from subscription.models import Subscription
-from tasks.models import Chapter, Content, Course, Lesson, Section, Task, TaskCompletion
+from tasks.models import (
+    CanvasImage,
+    Chapter,
+    Content,
+    ContentNode,
+    Course,
+    Image,
+    Lesson,
+    Question,
+    Section,
+    Task,
+    TaskCompletion,
+)
+from tasks.utils import bump_content_version
 from modo.models import TestResult
 
 
@@ -28,12 +43,14 @@ User = get_user_model()
 @receiver(post_delete, sender=User)
 def clear_user_cache(sender, instance, **kwargs):
     invalidate_user_cache.delay(instance.id)
-    patterns = [
-        f"courses_user_{instance.id}*",
-        f"course_user_{instance.id}*",
-    ]
-    for pattern in patterns:
-        delete_keys_matching.delay(pattern=pattern)
+    delete_learner_cache(user_id=instance.id)
+    # Views of a child are cached under the child
+    if instance.is_parent:
+        child_ids = Child.objects.filter(parent__user_id=instance.id).values_list(
+            "id", flat=True
+        )
+        for child_id in child_ids:
+            delete_learner_cache(child_id=child_id)
 
 
 @receiver(post_save, sender=Subscription)
@@ -48,6 +65,20 @@ def clear_subscription_cache(sender, instance, **kwargs):
 def clear_student_cache(sender, instance, **kwargs):
     if instance.user:
         invalidate_user_cache.delay(instance.user.id)
+    # Grade and language decide which courses the student sees
+    bump_progress_version(user_id=instance.user_id)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Child)
+def create_avatar_variants(sender, instance, **kwargs):
+    schedule_image_variants(instance, "avatar")
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Child)
+def delete_avatar_variants(sender, instance, **kwargs):
+    delete_image_variants(instance.avatar_variants, instance.avatar.storage)
 
 
 @receiver(post_save, sender=Parent)
@@ -68,10 +99,12 @@ def invalidate_child_cache(child_id):
 def clear_child_cache(sender, instance, **kwargs):
     invalidate_user_cache.delay(instance.parent.user.id)
     invalidate_child_cache(instance.pk)
+    bump_progress_version(child_id=instance.pk)
 
 
 @receiver([post_save, post_delete], sender=Course)
 def invalidate_courses_cache(sender, instance, **kwargs):
+    bump_content_version()
     try:
         print(f"Invalidating cache for course {instance.pk}")
         delete_keys_matching.delay()
@@ -81,18 +114,21 @@ def invalidate_courses_cache(sender, instance, **kwargs):
 
 @receiver([post_save, post_delete], sender=Section)
 def invalidate_sections_cache(sender, instance, **kwargs):
+    bump_content_version()
     delete_keys_matching.delay()
     delete_keys_matching.delay(pattern="section*")
 
 
 @receiver([post_save, post_delete], sender=Chapter)
 def invalidate_chapters_cache(sender, instance, **kwargs):
+    bump_content_version()
     delete_keys_matching.delay(pattern="section*")
     delete_keys_matching.delay(pattern="chapter*")
 
 
 @receiver([post_save, post_delete], sender=Task)
 def invalidate_tasks_cache(sender, instance, **kwargs):
+    bump_content_version()
     delete_keys_matching.delay(pattern="content*")
     delete_keys_matching.delay(pattern="chapter*")
     delete_keys_matching.delay(pattern="section*")
@@ -101,60 +137,36 @@ def invalidate_tasks_cache(sender, instance, **kwargs):
 
 @receiver([post_save, post_delete], sender=Lesson)
 def invalidate_lessons_cache(sender, instance, **kwargs):
+    bump_content_version()
     delete_keys_matching.delay(pattern="content*")
     delete_keys_matching.delay(pattern="chapter*")
     delete_keys_matching.delay(pattern="section*")
     delete_keys_matching.delay(pattern="lesson*")
 
 
+# Tasks nest their questions and images, and chapters their content nodes
+@receiver([post_save, post_delete], sender=ContentNode)
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Image)
+@receiver([post_save, post_delete], sender=CanvasImage)
+def invalidate_question_content(sender, instance, **kwargs):
+    bump_content_version()
+
+
 @receiver([post_save, post_delete], sender=TestResult)
 def invalidate_tests_cache_modo(sender, instance, **kwargs):
-    delete_keys_matching.delay(pattern="section*")
-    delete_keys_matching.delay(pattern="chapter*")
+    bump_progress_version(instance.user_id, instance.child_id)
+    delete_learner_cache(instance.user_id, instance.child_id)
 
 
 @receiver([post_save, pre_delete], sender=TaskCompletion)
 def invalidate_task_completion_cache(sender, instance, **kwargs):
-    task = instance.task
-    chapter = task.chapter
-    section = chapter.section
-    course = section.course
-
-    if not course:
-        return
-
-    user_id = None
-
-    try:
-        if instance.user:
-            user_id = instance.user.id
-    except Exception as e:
-        print(f"[Signal] Error resolving user/child in TaskCompletion: {e}")
-        # Optionally skip invalidation if critical data is missing
-        return
-
-    patterns = [
-        f"courses_user_{user_id}*",
-        f"course_user_{user_id}*",
-        f"sections_user_{user_id}*",
-        f"section_user_{user_id}*",
-        f"chapters_user_{user_id}*",
-        f"chapter_user_{user_id}*",
-        f"tasks_user_{user_id}*",
-        f"task_user_{user_id}*",
-        f"lessons_user_{user_id}*",
-        f"lesson_user_{user_id}*",
-        f"content_user_{user_id}*",
-        f"contents_user_{user_id}*",
-    ]
-
-    for pattern in patterns:
-        print(f"Invalidating cache for pattern: {pattern}")
-        delete_keys_matching.delay(pattern=pattern)
+    bump_progress_version(instance.user_id, instance.child_id)
+    delete_learner_cache(instance.user_id, instance.child_id)
 
 
 @receiver([post_save, post_delete], sender=DailyMessage)
 def invalidate_daily_message_cache(sender, instance, **kwargs):
     cache_key = f"daily_message_{instance.language}"
     print(f"Invalidating cache for {cache_key}")
-    cache.delete(cache_key)
+    delete_cached([cache_key])
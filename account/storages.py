@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name, setting
+
+from .utils import (
+    PRESIGNED_URL_EXPIRATION,
+    get_presigned_url_cache_key,
+    get_presigned_url_cache_timeout,
+)
+
+
+class CachedUrlS3Storage(S3Storage):
+    """
+    S3 storage whose signed read URLs are cached until
+    PRESIGNED_URL_CACHE_MARGIN before they expire. Payloads listing many
+    files are not re-signed on every request, and clients get the same URL
+    for a file, so they can cache it.
+    """
+
+    def get_default_settings(self):
+        return {
+            **super().get_default_settings(),
+            "querystring_expire": setting(
+                "AWS_QUERYSTRING_EXPIRE", PRESIGNED_URL_EXPIRATION
+            ),
+        }
+
+    def _get_url_cache_key(self, name, expire):
+        return get_presigned_url_cache_key(
+            self.bucket_name, self._normalize_name(clean_name(name)), expire
+        )
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or http_method or not self.querystring_auth:
+            return super().url(name, parameters, expire, http_method)
+        return self.urls([name], expire)[name]
+
+    def urls(self, names, expire=None):
+        """
+        Signed URLs of many files as {name: url}, for list payloads. The cache
+        is read with one get_many and only the misses are signed.
+        """
+        if not self.querystring_auth:
+            return {name: self.url(name) for name in names}
+
+        if expire is None:
+            expire = self.querystring_expire
+        cache_keys = {self._get_url_cache_key(name, expire): name for name in names}
+        cached = cache.get_many(cache_keys.keys())
+        urls = {cache_keys[cache_key]: url for cache_key, url in cached.items()}
+
+        signed = {}
+        for cache_key, name in cache_keys.items():
+            if name not in urls:
+                urls[name] = signed[cache_key] = super().url(name, expire=expire)
+        timeout = get_presigned_url_cache_timeout(expire)
+        if signed and timeout:
+            cache.set_many(signed, timeout)
+        return urls
@@ -1,14 +1,17 @@
 from typing import List, Optional
 import uuid
+from collections import Counter
 from datetime import timedelta
+from functools import partial
 import random
 
 from celery import group, shared_task
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import cache
-from account.utils import get_cache_key
 from django.contrib.auth.hashers import make_password
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery
 from django.core.mail import (
     EmailMultiAlternatives,
     get_connection,
@@ -20,16 +23,23 @@ from django.utils import timezone
 from django.utils.html import strip_tags
 import pandas as pd
 
+from account.cache import invalidate_learners
 from account.models import (
     Child,
     Class,
     DailyMessage,
     MotivationalPhrase,
     Parent,
+    School,
     Student,
     User,
     LANGUAGE_CHOICES,
 )
+from account.images import (
+    build_image_variants,
+    delete_image_variants,
+    get_image_variant_names,
+)
 from account.utils import (
     generate_password,
     render_email,
@@ -323,60 +333,99 @@ def send_user_credentials_to_admins(file_path, school_name):
     return f"User credentials file sent to {settings.ADMIN_EMAILS}"
 
 
+# Descriptions quoted per question in a complaint digest
+COMPLAINT_DIGEST_SAMPLES = 3
+COMPLAINT_DIGEST_DESCRIPTION_LENGTH = 300
+
+
+def _format_complaint_digest(complaints):
+    """
+    Return the body of a digest of `complaints`, grouped by course and then
+    by question, with the most reported questions first.
+    """
+    groups = {}
+    for complaint in complaints:
+        course_group = groups.setdefault(complaint.course, {})
+        course_group.setdefault(complaint.question, []).append(complaint)
+
+    lines = [f"New complaints since the last digest: {len(complaints)}"]
+    for course, questions in sorted(
+        groups.items(), key=lambda item: item[0].name if item[0] else ""
+    ):
+        lines += ["", f"Course: {course.name if course else 'No course'}"]
+        for question, question_complaints in sorted(
+            questions.items(), key=lambda item: -len(item[1])
+        ):
+            task = question.task
+            title = question.title or question.question_text or ""
+            chapter = task.chapter.title if task.chapter else "-"
+            types = Counter(complaint.type for complaint in question_complaints)
+            lines += [
+                "",
+                f"  Question {question.id}: {title}",
+                f"  Task: {task.title} | Chapter: {chapter}",
+                f"  Complaints: {len(question_complaints)} ("
+                + ", ".join(f"{name}: {count}" for name, count in types.items())
+                + ")",
+            ]
+            for complaint in question_complaints[:COMPLAINT_DIGEST_SAMPLES]:
+                description = complaint.description[
+                    :COMPLAINT_DIGEST_DESCRIPTION_LENGTH
+                ]
+                lines.append(f"    - #{complaint.id} [{complaint.type}] {description}")
+            remaining = len(question_complaints) - COMPLAINT_DIGEST_SAMPLES
+            if remaining > 0:
+                lines.append(f"    ... and {remaining} more")
+    return "\n".join(lines)
+
+
 @shared_task
-def send_complaint_to_admins(complaint_id):
+def send_complaint_digest():
     """
-    Send an email to admins with the details of a complaint.
+    Email admins one digest of the complaints not yet notified, grouped by
+    course and question, so a burst of reports on one question is one
+    message. The complaints are claimed before sending and released again if
+    sending fails.
     """
-    complaint = Complaint.objects.get(pk=complaint_id)
-    subject = f"New Complaint Received: {complaint.type}"
-    body = f"Complaint ID: {complaint.id}\n\nComplaint type: {complaint.type}\n\nDetails: {complaint.description}"
+    complaint_ids = list(
+        Complaint.objects.filter(notified_at__isnull=True)
+        .order_by("created_at")
+        .values_list("id", flat=True)
+    )
+    if not complaint_ids:
+        return "No new complaints"
 
+    notified_at = timezone.now()
+    Complaint.objects.filter(id__in=complaint_ids, notified_at__isnull=True).update(
+        notified_at=notified_at
+    )
+    complaints = list(
+        Complaint.objects.filter(id__in=complaint_ids, notified_at=notified_at)
+        .select_related("course", "question__task__chapter")
+        .order_by("created_at")
+    )
+    if not complaints:
+        return "No new complaints"
+
+    question_count = len({complaint.question_id for complaint in complaints})
     email = EmailMessage(
-        subject=subject,
-        body=body,
+        subject=(
+            f"Complaint digest: {len(complaints)} new complaints "
+            f"on {question_count} questions"
+        ),
+        body=_format_complaint_digest(complaints),
         from_email=settings.DEFAULT_FROM_EMAIL,
         to=settings.ADMIN_EMAILS,
     )
-    email.send(fail_silently=False)
-
-    return f"Complaint email sent to {settings.ADMIN_EMAILS}"
-
-
-@shared_task
-def course_invalidate_cache(
-    course_id, prefix, item_id=None, user_id=None, child_id=None
-):
     try:
-        if user_id:
-            user = User.objects.get(pk=user_id)
-            _invalidate_keys(user, child_id, course_id, prefix, item_id)
-        else:
-            for user in User.objects.all():
-                if hasattr(user, "student"):
-                    _invalidate_keys(user, None, course_id, prefix, item_id)
-                elif hasattr(user, "parent"):
-                    children = Child.objects.filter(parent=user.parent)
-                    for child in children:
-                        _invalidate_keys(user, child.id, course_id, prefix, item_id)
-                else:
-                    _invalidate_keys(user, None, course_id, prefix, item_id)
-    except Exception as e:
-        print(f"[course_invalidate_cache] Error: {e}")
-
+        email.send(fail_silently=False)
+    except Exception:
+        Complaint.objects.filter(
+            id__in=[complaint.id for complaint in complaints]
+        ).update(notified_at=None)
+        raise
 
-def _invalidate_keys(user, child_id, course_id, prefix, item_id):
-    if prefix == "course":
-        list_key = get_cache_key(prefix + "s", user, child_id)
-    else:
-        list_key = get_cache_key(prefix + "s", user, child_id, course=course_id)
-    cache.delete(list_key)
-    print("Cache invalidated:", list_key)
-
-    if item_id:
-        detail_key = get_cache_key(prefix, user, child_id, id=item_id)
-        cache.delete(detail_key)
-        print("Cache invalidated:", detail_key)
+    return f"Complaint digest of {len(complaints)} sent to {settings.ADMIN_EMAILS}"
 
 
 @shared_task
@@ -434,63 +483,331 @@ def generate_daily_messages(languages_list: Optional[List[str]] = None):
             )
 
 
+def _move_class_grades(classes, step):
+    """
+    Move `classes` one grade up (step 1) or down (step -1) together with their
+    students, in two set-based UPDATEs. The bulk updates skip the signals, so
+    the moved students' cached views, whose course lists depend on the grade,
+    are invalidated on commit. Returns (classes moved, students moved).
+    """
+    students = Student.objects.filter(school_class__in=classes)
+    user_ids = list(students.values_list("user_id", flat=True))
+    # Students first: the class filter still sees the old grades.
+    moved_students = students.update(
+        grade=Subquery(
+            Class.objects.filter(pk=OuterRef("school_class_id")).values("grade")[:1]
+        )
+        + step
+    )
+    moved_classes = classes.update(grade=F("grade") + step)
+    transaction.on_commit(partial(invalidate_learners, user_ids))
+    return moved_classes, moved_students
+
+
 @shared_task
 def increment_schoolclass_grade(school_class_id):
     school_class = Class.objects.get(pk=school_class_id)
-    previous_grade = school_class.grade
-    school = school_class.school
-    if not school:
-        return {"error": "School not found"}
-
-    if not school_class:
-        return {"error": "School class not found"}
-
     if school_class.grade >= 11:
         return {"error": "Cannot increment grade beyond 11"}
 
     with transaction.atomic():
+        School.objects.filter(pk=school_class.school_id).update(
+            school_year=get_next_school_year()
+        )
+        _move_class_grades(Class.objects.filter(pk=school_class.pk), 1)
+
+    print(f"Grade incremented to {school_class.grade + 1} for class {school_class}")
+
+    return {"status": f"Grade incremented to {school_class.grade + 1}"}
+
+
+@shared_task
+def decrement_schoolclass_grade(school_class_id):
+    school_class = Class.objects.get(pk=school_class_id)
+    if school_class.grade < 1:
+        return {"error": "Cannot decrement grade below 0"}
+
+    with transaction.atomic():
+        School.objects.filter(pk=school_class.school_id).update(
+            school_year=get_school_year()
+        )
+        _move_class_grades(Class.objects.filter(pk=school_class.pk), -1)
+
+    print(f"Grade decremented to {school_class.grade - 1} for class {school_class}")
+
+    return {"status": f"Grade decremented to {school_class.grade - 1}"}
+
+
+ROLLOVER_SCHOOL_BATCH_SIZE = 200
+ROLLOVER_DIRECTIONS = ("increment", "decrement")
+
+
+@shared_task
+def rollover_school_grades(direction="increment", school_ids=None, dry_run=False):
+    """
+    Moves every class of the selected schools (all schools by default) one grade
+    up or down, together with the grades of their students, using a few
+    set-based UPDATE statements per batch of schools.
+
+    `school_year` is used as the idempotency marker: an increment targets
+    schools that are not yet on the next school year, a decrement targets
+    schools that are not yet back on the current one, so re-running the job
+    never moves the same school twice.
+    """
+    if direction not in ROLLOVER_DIRECTIONS:
+        return {"error": f"direction must be one of {ROLLOVER_DIRECTIONS}"}
+
+    if direction == "increment":
         school_year = get_next_school_year()
-        if school.school_year != school_year:
-            school.school_year = school_year
-            school.save()
-        school_class.grade += 1
-        school_class.save()
+        movable_classes = Q(grade__lt=11)
+        step = 1
+    else:
+        school_year = get_school_year()
+        movable_classes = Q(grade__gte=1)
+        step = -1
+
+    schools = School.objects.exclude(school_year=school_year)
+    if school_ids is not None:
+        schools = schools.filter(pk__in=school_ids)
+    pending_school_ids = list(schools.order_by("pk").values_list("pk", flat=True))
+
+    report = {
+        "direction": direction,
+        "dry_run": dry_run,
+        "school_year": school_year,
+        "schools": 0,
+        "classes": 0,
+        "students": 0,
+        "skipped_classes": 0,
+    }
+
+    for start in range(0, len(pending_school_ids), ROLLOVER_SCHOOL_BATCH_SIZE):
+        batch = pending_school_ids[start : start + ROLLOVER_SCHOOL_BATCH_SIZE]
+        classes = Class.objects.filter(school_id__in=batch)
+        students = Student.objects.filter(
+            school_class__in=classes.filter(movable_classes)
+        )
+
+        report["schools"] += len(batch)
+        report["skipped_classes"] += classes.exclude(movable_classes).count()
+
+        if dry_run:
+            report["classes"] += classes.filter(movable_classes).count()
+            report["students"] += students.count()
+            continue
+
+        with transaction.atomic():
+            moved_classes, moved_students = _move_class_grades(
+                classes.filter(movable_classes), step
+            )
+            report["classes"] += moved_classes
+            report["students"] += moved_students
+            School.objects.filter(pk__in=batch).update(school_year=school_year)
+
+    print(f"[rollover_school_grades] {report}")
+
+    return report
+
+
+SCHOOL_DELETION_CHUNK_SIZE = 500
+SCHOOL_DELETION_PROGRESS_TIMEOUT = 60 * 60 * 24
+
+
+def get_school_deletion_cache_key(school_id):
+    return f"school_deletion_{school_id}"
 
-        school_class.students.update(grade=school_class.grade)
 
-    print(
-        f"Grade incremented to {school_class.grade} for class {previous_grade}{school_class.section}"
+def _delete_cascade(queryset):
+    """
+    Deletes the rows of `queryset` and, leaf tables first, every row that
+    cascades from them, with one statement per table. The plan follows the
+    relations declared on the models, so tables added later are covered.
+    Rows are removed without going through Django's collector, so no per-row
+    signals are sent.
+    """
+    model = queryset.model
+    for relation in model._meta.related_objects:
+        field = relation.field
+        if relation.many_to_many:
+            through = field.remote_field.through
+            through._base_manager.filter(
+                **{f"{field.m2m_reverse_field_name()}__in": queryset}
+            )._raw_delete(queryset.db)
+            continue
+
+        related = relation.related_model._base_manager.filter(
+            **{f"{field.name}__in": queryset}
+        )
+        on_delete = field.remote_field.on_delete
+        if on_delete is models.CASCADE:
+            _delete_cascade(related)
+        elif on_delete is models.SET_NULL:
+            related.update(**{field.name: None})
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f"{model.__name__} rows cannot be bulk deleted: "
+                f"{relation.related_model.__name__}.{field.name} uses "
+                f"{on_delete.__name__}."
+            )
+
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        through._base_manager.filter(
+            **{f"{field.m2m_field_name()}__in": queryset}
+        )._raw_delete(queryset.db)
+
+    queryset._raw_delete(queryset.db)
+
+
+def _delete_users_data(user_ids):
+    """
+    Deletes the users and everything that hangs off them. The raw deletes
+    send no signals, so the caches of the deleted learners (the users and
+    their children) are invalidated here.
+    """
+    child_ids = list(
+        Child.objects.filter(parent__user_id__in=user_ids).values_list("id", flat=True)
     )
+    with transaction.atomic():
+        _delete_cascade(User.objects.filter(id__in=user_ids))
+
+    cache.delete_many([f"user_data_{user_id}" for user_id in user_ids])
+    invalidate_learners(user_ids, child_ids)
 
-    return {"status": f"Grade incremented to {school_class.grade}"}
+
+def _set_school_deletion_progress(school_id, **progress):
+    cache.set(
+        get_school_deletion_cache_key(school_id),
+        progress,
+        SCHOOL_DELETION_PROGRESS_TIMEOUT,
+    )
 
 
 @shared_task
-def decrement_schoolclass_grade(school_class_id):
-    school_class = Class.objects.get(pk=school_class_id)
-    previous_grade = school_class.grade
-    school = school_class.school
+def delete_school_data(school_id):
+    """
+    Deletes a school with its classes, students and the students' users in
+    chunks. Progress is kept in the cache under
+    `get_school_deletion_cache_key(school_id)`.
+    """
+    # tasks.utils imports this module
+    from tasks.utils import bump_content_version
+
+    school = School.objects.filter(pk=school_id).first()
     if not school:
         return {"error": "School not found"}
 
-    if not school_class:
-        return {"error": "School class not found"}
+    user_ids = list(
+        Student.objects.filter(Q(school=school) | Q(school_class__school=school))
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    total_users = len(user_ids)
+    deleted_users = 0
 
-    if school_class.grade < 1:
-        return {"error": "Cannot decrement grade below 0"}
+    try:
+        for start in range(0, total_users, SCHOOL_DELETION_CHUNK_SIZE):
+            _set_school_deletion_progress(
+                school_id,
+                status="running",
+                total_users=total_users,
+                deleted_users=deleted_users,
+            )
+            chunk = user_ids[start : start + SCHOOL_DELETION_CHUNK_SIZE]
+            _delete_users_data(chunk)
+            deleted_users += len(chunk)
+
+        supervisor_id = school.supervisor_id
+        with transaction.atomic():
+            _delete_cascade(School.objects.filter(pk=school_id))
+        if supervisor_id:
+            _delete_users_data([supervisor_id])
+        # Content rows cascaded from or detached from the deleted users skip
+        # the signals that would bump the content version
+        bump_content_version()
+    except Exception as e:
+        _set_school_deletion_progress(
+            school_id,
+            status="failed",
+            total_users=total_users,
+            deleted_users=deleted_users,
+            error=str(e),
+        )
+        raise
 
-    with transaction.atomic():
-        school_year = get_school_year()
-        if school.school_year != school_year:
-            school.school_year = school_year
-            school.save()
-        school_class.grade -= 1
-        school_class.save()
+    _set_school_deletion_progress(
+        school_id,
+        status="finished",
+        total_users=total_users,
+        deleted_users=deleted_users,
+    )
+    print(f"[delete_school_data] School {school_id}: deleted {deleted_users} users")
+
+    return {"status": "finished", "deleted_users": deleted_users}
 
-        school_class.students.update(grade=school_class.grade)
 
-    print(
-        f"Grade decremented to {school_class.grade} for class {previous_grade}{school_class.section}"
+def schedule_image_variants(instance, field_name):
+    """
+    Queue variant generation once the transaction commits, if the image in
+    `field_name` differs from the one the stored variants were built from.
+    Meant for post_save handlers of models with a `<field_name>_variants`.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants") or {}
+    if variants.get("source") == (field_file.name if field_file else None):
+        return
+    transaction.on_commit(
+        lambda: generate_image_variants.delay(
+            instance._meta.label, instance.pk, field_name
+        )
     )
 
-    return {"status": f"Grade decremented to {school_class.grade}"}
+
+@shared_task
+def generate_image_variants(model_label, pk, field_name):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    field_file = getattr(instance, field_name)
+    variants_field = f"{field_name}_variants"
+    old_variants = getattr(instance, variants_field) or {}
+    source = field_file.name if field_file else None
+    if old_variants.get("source") == source:
+        return
+
+    variants = {}
+    if field_file:
+        try:
+            variants = build_image_variants(field_file)
+        except Exception as e:
+            print(f"Could not build variants for {model_label} {pk}: {e}")
+            return
+
+    # The image may have been replaced while the variants were being built.
+    # save() rather than update() so cache invalidation signals run.
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).first()
+        current_file = getattr(current, field_name) if current else None
+        is_current = current is not None and (
+            (current_file.name if current_file else None) == source
+        )
+        if is_current:
+            setattr(current, variants_field, variants)
+            current.save(update_fields=[variants_field])
+
+    storage = field_file.storage
+    if is_current:
+        # Rows copied from another one share its image and variants
+        old_source = old_variants.get("source")
+        if old_source and model.objects.filter(**{field_name: old_source}).exists():
+            return
+        delete_image_variants(
+            old_variants, storage, keep=get_image_variant_names(variants)
+        )
+    else:
+        delete_image_variants(
+            variants, storage, keep=get_image_variant_names(old_variants)
+        )
@@ -1,2 +1,850 @@
+import gzip
+import json
+import smtplib
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.response import Response
+from storages.backends.s3 import S3Storage
+
+from documents.models import Document
+from modo.utils import TEST_BODY_CACHE_TIMEOUT
+from tasks.models import (
+    Answer,
+    Chapter,
+    Complaint,
+    Course,
+    Image,
+    Question,
+    Section,
+    Task,
+    TaskCompletion,
+)
+from tasks.utils import (
+    bump_content_version,
+    get_content_cache_key,
+    get_content_version,
+)
+from tasks.views import CACHE_TIMEOUT
+
+from . import cache as account_cache
+from . import utils
+from .images import build_image_variants
+from .models import Child, Class, Parent, School, Student, User
+from .storages import CachedUrlS3Storage
+from .tasks import (
+    decrement_schoolclass_grade,
+    delete_school_data,
+    generate_image_variants,
+    increment_schoolclass_grade,
+    rollover_school_grades,
+    send_complaint_digest,
+)
+from .utils import (
+    allocate_orders,
+    get_next_school_year,
+    get_school_year,
+    reorder,
+    update_rows_by_pk,
+)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CachedUrlS3StorageTest(SimpleTestCase):
+    # Presigning is computed locally, so these run without network access
+
+    def setUp(self):
+        cache.clear()
+        self.storage = CachedUrlS3Storage(
+            bucket_name="bucket",
+            endpoint_url="http://localhost:9000",
+            access_key="test-key",
+            secret_key="test-secret",
+            location="media",
+        )
+
+    def test_url_is_cached(self):
+        url = self.storage.url("a.png")
+        self.assertIn("/bucket/media/a.png", url)
+        self.assertIn("Signature=", url)
+
+        with mock.patch.object(S3Storage, "url") as sign_url:
+            self.assertEqual(self.storage.url("a.png"), url)
+        sign_url.assert_not_called()
+
+    def test_urls_with_other_expiry_or_parameters_are_signed(self):
+        url = self.storage.url("a.png")
+
+        self.assertNotEqual(self.storage.url("a.png", expire=60), url)
+        with mock.patch.object(S3Storage, "url", return_value="signed") as sign_url:
+            self.storage.url(
+                "a.png", parameters={"ResponseContentDisposition": "attachment"}
+            )
+        sign_url.assert_called_once()
+
+    def test_batch_signs_only_uncached_urls(self):
+        url = self.storage.url("a.png")
+
+        with mock.patch.object(
+            S3Storage, "url", side_effect=lambda name, expire: f"signed {name}"
+        ) as sign_url:
+            urls = self.storage.urls(["a.png", "b.png"])
+        self.assertEqual(urls, {"a.png": url, "b.png": "signed b.png"})
+        sign_url.assert_called_once_with(
+            "b.png", expire=self.storage.querystring_expire
+        )
+        self.assertEqual(self.storage.url("b.png"), "signed b.png")
+
+    def test_cached_urls_outlive_cached_payloads(self):
+        # A URL handed out just before its cache entry expires can still be
+        # served from a view cache or a cached test body for their full life
+        longest_payload_age = (
+            CACHE_TIMEOUT * (1 + account_cache.CACHE_TIMEOUT_JITTER)
+            + account_cache.CACHE_STALE_GRACE
+            + account_cache.LOCAL_CACHE_TIMEOUT
+        )
+        self.assertGreaterEqual(utils.PRESIGNED_URL_CACHE_MARGIN, longest_payload_age)
+        self.assertGreaterEqual(
+            utils.PRESIGNED_URL_CACHE_MARGIN, TEST_BODY_CACHE_TIMEOUT
+        )
+
+        expire = self.storage.querystring_expire
+        self.assertGreater(utils.get_presigned_url_cache_timeout(expire), 0)
+        self.assertEqual(
+            utils.get_presigned_url_cache_timeout(expire)
+            + utils.PRESIGNED_URL_CACHE_MARGIN,
+            expire,
+        )
+
+    def test_short_lived_urls_are_not_cached(self):
+        with mock.patch.object(S3Storage, "url", return_value="signed") as sign_url:
+            self.storage.url("a.png", expire=60)
+            self.storage.url("a.png", expire=60)
+        self.assertEqual(sign_url.call_count, 2)
+
+
+class DirectUploadTest(SimpleTestCase):
+    # A storage pointed at a local S3-compatible server; presigning is local
+    # and the object lookups are mocked, so no server needs to be running.
+
+    def setUp(self):
+        self.field = Document._meta.get_field("file")
+        self.storage = S3Storage(
+            bucket_name="bucket",
+            endpoint_url="http://localhost:9000",
+            access_key="test-key",
+            secret_key="test-secret",
+            location="media",
+        )
+        patcher = mock.patch.object(self.field, "storage", self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_presigned_post(self):
+        upload = utils.create_direct_upload(self.field, "plan.pdf", "application/pdf")
+
+        self.assertEqual(upload["method"], "POST")
+        self.assertTrue(upload["url"].startswith("http://localhost:9000"))
+        self.assertRegex(upload["fields"]["key"], r"^media/documents/plan_\w+\.pdf$")
+        self.assertEqual(upload["fields"]["Content-Type"], "application/pdf")
+
+    def test_presigned_put(self):
+        upload = utils.create_direct_upload(
+            self.field, "plan.pdf", "application/pdf", method="put"
+        )
+
+        self.assertEqual(upload["method"], "PUT")
+        self.assertIn("/bucket/media/documents/plan_", upload["url"])
+
+    def test_confirm_returns_storage_name(self):
+        upload = utils.create_direct_upload(self.field, "plan.pdf", "application/pdf")
+
+        with mock.patch.object(
+            self.storage, "exists", return_value=True
+        ), mock.patch.object(self.storage, "size", return_value=1024):
+            name = utils.confirm_direct_upload(self.field, upload["upload_token"])
+        self.assertRegex(name, r"^documents/plan_\w+\.pdf$")
+
+    def test_confirm_rejects_missing_and_oversized_files(self):
+        upload = utils.create_direct_upload(
+            self.field, "plan.pdf", "application/pdf", max_size=100
+        )
+
+        with mock.patch.object(self.storage, "exists", return_value=False):
+            with self.assertRaises(ValidationError):
+                utils.confirm_direct_upload(self.field, upload["upload_token"])
+
+        with mock.patch.object(
+            self.storage, "exists", return_value=True
+        ), mock.patch.object(self.storage, "size", return_value=101), mock.patch.object(
+            self.storage, "delete"
+        ) as delete:
+            with self.assertRaises(ValidationError):
+                utils.confirm_direct_upload(self.field, upload["upload_token"])
+        delete.assert_called_once()
+
+    def test_confirm_rejects_token_of_another_field(self):
+        upload = utils.create_direct_upload(self.field, "plan.pdf", "application/pdf")
+
+        with self.assertRaises(ValidationError):
+            utils.confirm_direct_upload(
+                Image._meta.get_field("image"), upload["upload_token"]
+            )
+        with self.assertRaises(ValidationError):
+            utils.confirm_direct_upload(self.field, "not-a-token")
+
+
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.storage = FileSystemStorage(location=media_root.name)
+        patcher = mock.patch.object(
+            Image._meta.get_field("image"), "storage", self.storage
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        course = Course.objects.create(name="Math", grade=5)
+        section = Section.objects.create(course=course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        self.question = Question.objects.create(task=task, question_type="click_image")
+        self.image = Image.objects.create(
+            question=self.question, image=self.upload("questions/cat.png")
+        )
+
+    def upload(self, name, size=(800, 400)):
+        buffer = BytesIO()
+        PILImage.new("RGBA", size, (255, 0, 0, 128)).save(buffer, "PNG")
+        return self.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def generate(self):
+        generate_image_variants("tasks.Image", self.image.pk, "image")
+        self.image.refresh_from_db()
+        return self.image.image_variants
+
+    def test_variants_below_original_width(self):
+        variants = self.generate()
+
+        self.assertEqual(variants["source"], "questions/cat.png")
+        self.assertEqual(
+            variants["webp"],
+            {"320": "questions/cat_w320.webp", "640": "questions/cat_w640.webp"},
+        )
+        self.assertEqual(list(variants["jpeg"]), ["320", "640"])
+        with self.storage.open(variants["jpeg"]["320"]) as variant:
+            self.assertEqual(PILImage.open(variant).size, (320, 160))
+
+    def test_replaced_image_drops_stale_variants(self):
+        old_variants = self.generate()
+        Image.objects.filter(pk=self.image.pk).update(
+            image=self.upload("questions/dog.png", size=(500, 500))
+        )
+
+        variants = self.generate()
+
+        self.assertEqual(variants["source"], "questions/dog.png")
+        self.assertEqual(list(variants["webp"]), ["320"])
+        for name in old_variants["webp"].values():
+            self.assertFalse(self.storage.exists(name))
+
+    def test_variants_of_image_replaced_while_building_discarded(self):
+        built = {}
+
+        def build_then_replace(field_file):
+            built.update(build_image_variants(field_file))
+            Image.objects.filter(pk=self.image.pk).update(image="questions/dog.png")
+            return built
+
+        with mock.patch(
+            "account.tasks.build_image_variants", side_effect=build_then_replace
+        ):
+            self.assertEqual(self.generate(), {})
+        for name in built["webp"].values():
+            self.assertFalse(self.storage.exists(name))
+
+    def test_scheduled_only_for_a_new_image(self):
+        with mock.patch.object(generate_image_variants, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.image.save()
+            delay.assert_called_once_with("tasks.Image", self.image.pk, "image")
+
+            self.generate()
+            delay.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.image.save()
+            delay.assert_not_called()
+
+    def test_deleted_row_removes_variants_unless_shared(self):
+        variants = self.generate()
+        copy = Image.objects.create(
+            question=self.question,
+            image=self.image.image.name,
+            image_variants=variants,
+        )
+
+        self.image.delete()
+        self.assertTrue(self.storage.exists(variants["webp"]["320"]))
+
+        copy.delete()
+        self.assertFalse(self.storage.exists(variants["webp"]["320"]))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class GetOrBuildTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.build = mock.Mock(return_value="new")
+
+    def test_builds_once_then_hits(self):
+        self.assertEqual(account_cache.get_or_build("key", self.build, 60), "new")
+        self.assertEqual(account_cache.get_or_build("key", self.build, 60), "new")
+        self.build.assert_called_once()
+        self.assertIsNone(cache.get(account_cache.get_cache_build_lock_key("key")))
+
+    def test_timeout_is_jittered(self):
+        now = time.time()
+        account_cache.set_cached_value("key", "value", 1000)
+        fresh_for = cache.get("key").fresh_until - now
+        self.assertGreaterEqual(fresh_for, 1000)
+        self.assertLessEqual(
+            fresh_for, 1000 * (1 + account_cache.CACHE_TIMEOUT_JITTER) + 1
+        )
+
+    def test_stale_value_served_while_another_request_rebuilds(self):
+        cache.set("key", account_cache.CachedValue(time.time() - 1, "old"))
+        cache.add(account_cache.get_cache_build_lock_key("key"), 1)
+
+        self.assertEqual(account_cache.get_or_build("key", self.build, 60), "old")
+        self.build.assert_not_called()
+
+    def test_expired_value_rebuilt_by_lock_holder(self):
+        cache.set("key", account_cache.CachedValue(time.time() - 1, "old"))
+
+        self.assertEqual(account_cache.get_or_build("key", self.build, 60), "new")
+        self.build.assert_called_once()
+
+    def test_cold_key_waits_for_the_rebuild(self):
+        cache.add(account_cache.get_cache_build_lock_key("key"), 1)
+
+        def rebuilt_elsewhere(seconds):
+            account_cache.set_cached_value("key", "built elsewhere", 60)
+
+        with mock.patch.object(
+            account_cache.time, "sleep", side_effect=rebuilt_elsewhere
+        ):
+            value = account_cache.get_or_build("key", self.build, 60)
+        self.assertEqual(value, "built elsewhere")
+        self.build.assert_not_called()
+
+    def test_old_format_entries_are_misses(self):
+        cache.set("key", {"data": "old format"})
+        self.assertEqual(account_cache.get_or_build("key", self.build, 60), "new")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    VIEW_CACHE_GZIP_PASSTHROUGH=True,
+)
+class CachedResponseTest(SimpleTestCase):
+    large = [{"title": f"Chapter {index}"} for index in range(100)]
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def get(self, data, accept_encoding=""):
+        request = self.factory.get("/", headers={"accept-encoding": accept_encoding})
+        return account_cache.get_or_build_response(request, "key", lambda: data, 60)
+
+    def test_small_response_stored_plain(self):
+        response = self.get(Response([]), accept_encoding="gzip")
+
+        self.assertEqual(response.content, b"[]")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(self.get(["rebuilt"]).content, b"[]")
+
+    def test_large_response_passed_through_gzipped(self):
+        response = self.get(self.large, accept_encoding="gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.large)
+
+    def test_large_response_decompressed_for_other_clients(self):
+        self.get(self.large, accept_encoding="gzip")
+
+        for accept_encoding, passthrough in (("br", True), ("gzip", False)):
+            with self.subTest(accept_encoding=accept_encoding):
+                with self.settings(VIEW_CACHE_GZIP_PASSTHROUGH=passthrough):
+                    response = self.get(None, accept_encoding=accept_encoding)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(json.loads(response.content), self.large)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class LocalCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        account_cache.local_cache.clear()
+        patcher = mock.patch.object(
+            account_cache.local_cache, "is_enabled", return_value=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.build = mock.Mock(return_value="value")
+
+    def test_hot_key_served_from_memory(self):
+        account_cache.get_or_build("key", self.build, 60, local=True)
+
+        with mock.patch.object(account_cache.cache, "get") as shared_get:
+            self.assertEqual(
+                account_cache.get_or_build("key", self.build, 60, local=True), "value"
+            )
+        shared_get.assert_not_called()
+        self.build.assert_called_once()
+
+    def test_delete_cached_drops_local_entry(self):
+        account_cache.get_or_build("key", self.build, 60, local=True)
+        account_cache.delete_cached(["key"])
+
+        self.build.return_value = "rebuilt"
+        self.assertEqual(
+            account_cache.get_or_build("key", self.build, 60, local=True), "rebuilt"
+        )
+
+    def test_value_read_before_invalidation_is_not_kept(self):
+        generation = account_cache.local_cache.generation
+        account_cache.local_cache.delete_many(["key"])
+        account_cache.local_cache.set(
+            "key", account_cache.CachedValue(time.time() + 60, "old"), generation
+        )
+        self.assertIsNone(account_cache.local_cache.get("key"))
+
+    def test_listener_applies_broadcast_invalidations(self):
+        local_cache = account_cache.LocalCache(10, 60)
+        local_cache.set("key", account_cache.CachedValue(time.time() + 60, "value"), 0)
+        pubsub = mock.Mock()
+        pubsub.listen.return_value = [
+            {"type": "subscribe", "data": 1},
+            {"type": "message", "data": '["key"]'},
+        ]
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch.object(
+            account_cache, "get_redis_connection"
+        ) as connection, mock.patch.object(
+            account_cache.time, "sleep", side_effect=Stop
+        ):
+            connection.return_value.pubsub.return_value = pubsub
+            with self.assertRaises(Stop):
+                local_cache._listen()
+
+        pubsub.subscribe.assert_called_once_with(account_cache.LOCAL_CACHE_CHANNEL)
+        self.assertIsNone(local_cache.get("key"))
+        # The stream ended, so the tier is bypassed until resubscribed
+        self.assertFalse(local_cache.subscribed)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CacheMetricsTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        account_cache.cache_metrics.reset()
+        self.build = mock.Mock(return_value="value")
+
+    def test_hits_and_misses_counted_per_prefix(self):
+        account_cache.get_or_build("course_user_1_id_2", self.build, 60)
+        account_cache.get_or_build("course_user_1_id_2", self.build, 60)
+        account_cache.get_or_build("course_user_2_id_2", self.build, 60)
+        account_cache.get_or_build("league_groups_list", self.build, 60)
+
+        metrics = account_cache.cache_metrics.read()
+        self.assertEqual(metrics["course"]["hits"], 1)
+        self.assertEqual(metrics["course"]["misses"], 2)
+        self.assertEqual(metrics["league"]["misses"], 1)
+
+    def test_rendered_responses_sized_by_content(self):
+        entry = account_cache.render_response_entry({"id": 1})
+        self.build.return_value = entry
+
+        # Sized without sampling
+        with mock.patch.object(account_cache.random, "random") as sample:
+            account_cache.get_or_build("course_user_1_id_2", self.build, 60)
+        sample.assert_not_called()
+
+        metrics = account_cache.cache_metrics.read()
+        self.assertEqual(metrics["course"]["sized"], 1)
+        self.assertEqual(metrics["course"]["bytes"], len(entry.content))
+
+    def test_build_time_excludes_the_cache_write(self):
+        def slow_set(*args, **kwargs):
+            time.sleep(0.05)
+
+        with mock.patch.object(account_cache.cache, "set", side_effect=slow_set):
+            account_cache.get_or_build("course_user_1_id_2", self.build, 60)
+
+        self.assertLess(account_cache.cache_metrics.read()["course"]["build_ms"], 50)
+
+    def test_counts_are_flushed_in_batches(self):
+        account_cache.cache_metrics.flush()
+        account_cache.get_or_build("task_user_1", self.build, 60)
+        self.assertIsNone(
+            cache.get(account_cache.get_cache_metrics_cache_key("task", "misses"))
+        )
+
+        account_cache.cache_metrics.flush()
+        self.assertEqual(
+            cache.get(account_cache.get_cache_metrics_cache_key("task", "misses")), 1
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class LearnerCacheIndexTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.build = mock.Mock(return_value="value")
+        self.student = account_cache.get_learner_cache_index_key(user_id=1)
+        self.child = account_cache.get_learner_cache_index_key(user_id=2, child_id=3)
+        for key, index_key in (
+            ("courses_user_1", self.student),
+            ("sections_user_1_course_5", self.student),
+            ("section_user_1_id_7", self.student),
+            ("sections_user_1_course_6", self.student),
+            ("sections_user_2_child_3_course_5", self.child),
+        ):
+            account_cache.get_or_build(key, self.build, 60, index_key=index_key)
+
+    def test_learner_keys_deleted_together(self):
+        account_cache.delete_learner_cache(user_id=1)
+
+        self.assertIsNone(cache.get("courses_user_1"))
+        self.assertIsNone(cache.get("section_user_1_id_7"))
+        self.assertIsNotNone(cache.get("sections_user_2_child_3_course_5"))
+
+        account_cache.delete_learner_cache(user_id=2, child_id=3)
+        self.assertIsNone(cache.get("sections_user_2_child_3_course_5"))
+
+    def test_content_keys_change_with_the_content_version(self):
+        user = mock.Mock(id=1)
+        key = get_content_cache_key("sections", user, course=5)
+        self.assertEqual(get_content_cache_key("sections", user, course=5), key)
+
+        bump_content_version()
+        self.assertNotEqual(get_content_cache_key("sections", user, course=5), key)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class DeleteSchoolDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = User.objects.create(username="supervisor", role="parent")
+        parent = Parent.objects.create(user=self.supervisor)
+        self.child = Child.objects.create(
+            parent=parent, first_name="Child", last_name="Child", grade=5
+        )
+        self.school = School.objects.create(name="School", supervisor=self.supervisor)
+        school_class = Class.objects.create(school=self.school, grade=5, section="A")
+        self.student = User.objects.create(username="student", role="student")
+        Student.objects.create(
+            user=self.student, school=self.school, school_class=school_class, grade=5
+        )
+        self.course = Course.objects.create(
+            name="Math", grade=5, created_by=self.supervisor
+        )
+        section = Section.objects.create(course=self.course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        question = Question.objects.create(task=task, question_type="true_false")
+        Answer.objects.create(user=self.student, question=question, is_correct=True)
+        TaskCompletion.objects.create(user=self.student, task=task)
+
+    def test_school_deleted_with_dependent_rows(self):
+        result = delete_school_data(self.school.pk)
+
+        self.assertEqual(result, {"status": "finished", "deleted_users": 1})
+        self.assertFalse(School.objects.exists())
+        self.assertFalse(Class.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Parent.objects.exists())
+        self.assertFalse(Child.objects.exists())
+        self.assertFalse(Answer.objects.exists())
+        self.assertFalse(TaskCompletion.objects.exists())
+        self.course.refresh_from_db()
+        self.assertIsNone(self.course.created_by)
+
+    def test_deleted_learners_caches_invalidated(self):
+        for user_id, child_id in ((self.student.id, None), (None, self.child.id)):
+            account_cache.set_cached_value(
+                f"sections_{user_id}_{child_id}",
+                "cached",
+                60,
+                account_cache.get_learner_cache_index_key(user_id, child_id),
+            )
+        content_version = get_content_version()
+
+        delete_school_data(self.school.pk)
+
+        self.assertIsNone(cache.get(f"sections_{self.student.id}_None"))
+        self.assertIsNone(cache.get(f"sections_None_{self.child.id}"))
+        self.assertNotEqual(get_content_version(), content_version)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class RolloverSchoolGradesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(
+            name="School", school_year=get_school_year()
+        )
+        self.fifth = Class.objects.create(school=self.school, grade=5, section="A")
+        self.eleventh = Class.objects.create(school=self.school, grade=11, section="A")
+        user = User.objects.create(username="student", role="student")
+        self.student = Student.objects.create(
+            user=user, school=self.school, school_class=self.fifth, grade=5
+        )
+
+    def assertGrades(self, fifth, eleventh, student):
+        self.fifth.refresh_from_db()
+        self.eleventh.refresh_from_db()
+        self.student.refresh_from_db()
+        self.assertEqual(
+            (self.fifth.grade, self.eleventh.grade, self.student.grade),
+            (fifth, eleventh, student),
+        )
+
+    def test_increment_runs_once_per_school_year(self):
+        report = rollover_school_grades("increment")
+
+        self.assertEqual(
+            (report["schools"], report["classes"], report["students"]), (1, 1, 1)
+        )
+        self.assertEqual(report["skipped_classes"], 1)
+        self.assertGrades(6, 11, 6)
+        self.school.refresh_from_db()
+        self.assertEqual(self.school.school_year, get_next_school_year())
+
+        report = rollover_school_grades("increment")
+
+        self.assertEqual(
+            (report["schools"], report["classes"], report["students"]), (0, 0, 0)
+        )
+        self.assertGrades(6, 11, 6)
+
+    def test_decrement_runs_once_per_school_year(self):
+        rollover_school_grades("increment")
+        rollover_school_grades("decrement")
+        rollover_school_grades("decrement")
+
+        self.assertGrades(5, 10, 5)
+        self.school.refresh_from_db()
+        self.assertEqual(self.school.school_year, get_school_year())
+
+    def test_moved_students_caches_invalidated(self):
+        user_id = self.student.user_id
+        account_cache.set_cached_value(
+            "courses_user",
+            "grade 5",
+            60,
+            account_cache.get_learner_cache_index_key(user_id),
+        )
+        progress_key = account_cache.get_progress_version_cache_key(user_id)
+        progress_version = account_cache.get_versions([progress_key])[progress_key]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rollover_school_grades("increment")
+
+        self.assertIsNone(cache.get("courses_user"))
+        self.assertNotEqual(
+            account_cache.get_versions([progress_key])[progress_key], progress_version
+        )
+
+    def test_single_class_moves_with_its_students(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = increment_schoolclass_grade(self.fifth.pk)
+
+        self.assertEqual(result, {"status": "Grade incremented to 6"})
+        self.assertGrades(6, 11, 6)
+        self.assertEqual(
+            increment_schoolclass_grade(self.eleventh.pk),
+            {"error": "Cannot increment grade beyond 11"},
+        )
+
+        decrement_schoolclass_grade(self.fifth.pk)
+
+        self.assertGrades(5, 11, 5)
+
+    def test_dry_run_writes_nothing(self):
+        report = rollover_school_grades("increment", dry_run=True)
+
+        self.assertEqual((report["classes"], report["students"]), (1, 1))
+        self.assertGrades(5, 11, 5)
+        self.school.refresh_from_db()
+        self.assertEqual(self.school.school_year, get_school_year())
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    ADMIN_EMAILS=["admin@example.com"],
+)
+class ComplaintDigestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="student", role="student")
+        course = Course.objects.create(name="Math", grade=5)
+        section = Section.objects.create(course=course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        self.question = Question.objects.create(
+            task=task, title="Question", question_type="true_false"
+        )
+        self.other_question = Question.objects.create(
+            task=task, title="Other", question_type="true_false"
+        )
+
+    def complain(self, question, type="bug"):
+        return Complaint.objects.create(
+            question=question, user=self.user, type=type, description="Wrong"
+        )
+
+    def test_digest_claims_unnotified_complaints_once(self):
+        self.complain(self.question)
+        self.complain(self.question, type="content")
+        self.complain(self.other_question)
+        notified = self.complain(self.other_question)
+        Complaint.objects.filter(pk=notified.pk).update(notified_at=timezone.now())
+
+        send_complaint_digest()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            mail.outbox[0].subject,
+            "Complaint digest: 3 new complaints on 2 questions",
+        )
+        self.assertIn("Complaints: 2 (bug: 1, content: 1)", mail.outbox[0].body)
+        self.assertNotIn(f"#{notified.pk} ", mail.outbox[0].body)
+        self.assertFalse(Complaint.objects.filter(notified_at__isnull=True).exists())
+
+        self.assertEqual(send_complaint_digest(), "No new complaints")
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_releases_complaints(self):
+        complaint = self.complain(self.question)
+
+        with mock.patch(
+            "django.core.mail.EmailMessage.send", side_effect=smtplib.SMTPException
+        ):
+            with self.assertRaises(smtplib.SMTPException):
+                send_complaint_digest()
+
+        complaint.refresh_from_db()
+        self.assertIsNone(complaint.notified_at)
+
+        send_complaint_digest()
+
+        self.assertEqual(len(mail.outbox), 1)
+        complaint.refresh_from_db()
+        self.assertIsNotNone(complaint.notified_at)
+
+
+class ReorderTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(name="Math", grade=5)
+        self.other_course = Course.objects.create(name="Physics", grade=5)
+        self.sections = [
+            Section.objects.create(course=self.course, title=title)
+            for title in ("A", "B", "C")
+        ]
+        self.other = Section.objects.create(course=self.other_course, title="D")
+
+    def get_orders(self, course):
+        return list(
+            Section.objects.filter(course=course)
+            .order_by("pk")
+            .values_list("title", "order")
+        )
+
+    def test_swap_onto_taken_orders_in_one_statement(self):
+        first, second, third = self.sections
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = reorder(
+                Section.objects.all(), {first.pk: 3, second.pk: 1, third.pk: 2}
+            )
+
+        self.assertEqual(updated, 3)
+        # Silk may record queries in the same connection
+        updates = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "tasks_section"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.get_orders(self.course), [("A", 3), ("B", 1), ("C", 2)])
+
+    def test_missing_or_foreign_pks_not_matched(self):
+        first = self.sections[0]
+        missing_pk = self.other.pk + 1
+
+        updated = reorder(
+            Section.objects.filter(course=self.course),
+            {first.pk: 5, self.other.pk: 5, missing_pk: 5},
+        )
+
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.get_orders(self.course), [("A", 5), ("B", 2), ("C", 3)])
+        self.assertEqual(self.get_orders(self.other_course), [("D", 1)])
+        self.assertEqual(reorder(Section.objects.all(), {}), 0)
+
+    def test_rows_without_a_value_keep_their_field(self):
+        first, second, _ = self.sections
+
+        update_rows_by_pk(
+            Section.objects.all(),
+            {first.pk: {"title": "First", "order": 9}, second.pk: {"title": "Second"}},
+            ["title", "order"],
+        )
+
+        self.assertEqual(
+            self.get_orders(self.course), [("First", 9), ("Second", 2), ("C", 3)]
+        )
+
+    def test_allocate_orders_per_group_without_collisions(self):
+        empty_course = Course.objects.create(name="Art", grade=5)
+        objs = [
+            Section(course=self.course, title="E"),
+            Section(course=empty_course, title="F"),
+            Section(course=self.course, title="G"),
+        ]
+
+        allocate_orders(Section.objects, objs, "course")
+
+        self.assertEqual([obj.order for obj in objs], [4, 1, 5])
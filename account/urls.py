@@ -4,6 +4,7 @@ from rest_framework_nested import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 
 from account.views import *
+from account.views.cache_views import CacheMetricsView
 from account.views.daily_message_views import (
     DailyMessageView,
     DailyMessageViewSet,
@@ -74,4 +75,5 @@ urlpatterns = [
     path("progress/weekly/", WeeklyProgressAPIView.as_view(), name="weekly-progress"),
     path("progress/day/", ProgressForSpecificDay.as_view(), name="daily-progress"),
     path("daily-message-student/", DailyMessageView.as_view(), name="daily-message"),
+    path("cache-metrics/", CacheMetricsView.as_view(), name="cache-metrics"),
 ]
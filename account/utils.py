@@ -1,7 +1,13 @@
+import hashlib
+import os
 import secrets
+import uuid
 
 import re
 
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Case, F, Max, Value, When
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from datetime import datetime
@@ -25,23 +31,125 @@ def generate_password():
     return secrets.token_urlsafe(password_length)
 
 
-import boto3
-from botocore.exceptions import NoCredentialsError
+# Signed URLs of account.storages.CachedUrlS3Storage are dropped from the
+# cache this long before they expire, so a URL handed out from the cache is
+# still valid for at least this many seconds. It must cover the longest time
+# a URL can then be served from a cached payload: view caches keep entries
+# for up to an hour plus jitter, the stale grace and the in-process tier.
+PRESIGNED_URL_CACHE_MARGIN = 2 * 60 * 60
+# Default expiry of signed media URLs, so they can be cached for a while on
+# top of the margin
+PRESIGNED_URL_EXPIRATION = 6 * 60 * 60
 
 
-def get_presigned_url(bucket_name, key, expiration=3600):
-    s3_client = boto3.client("s3", region_name="eu-north-1")
-    try:
-        url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": key},
+def get_presigned_url_cache_key(bucket_name, key, expiration):
+    digest = hashlib.md5(f"{bucket_name}/{key}".encode()).hexdigest()
+    return f"presigned_url_{expiration}_{digest}"
+
+
+def get_presigned_url_cache_timeout(expiration):
+    """
+    Return how long a URL signed for `expiration` seconds may be cached, or 0
+    if it expires too soon to be cached at all.
+    """
+    return max(expiration - PRESIGNED_URL_CACHE_MARGIN, 0)
+
+
+DIRECT_UPLOAD_EXPIRATION = 900
+DIRECT_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+# How long after issuing an upload the client may still confirm it
+DIRECT_UPLOAD_TOKEN_MAX_AGE = 86400
+DIRECT_UPLOAD_SALT = "account.direct_upload"
+
+
+def _get_field_label(model_field):
+    return f"{model_field.model._meta.label}.{model_field.name}"
+
+
+def create_direct_upload(
+    model_field,
+    filename,
+    content_type,
+    method="post",
+    max_size=DIRECT_UPLOAD_MAX_SIZE,
+    expiration=DIRECT_UPLOAD_EXPIRATION,
+):
+    """
+    Presign an upload of `filename` straight to the S3 storage of a model
+    FileField, so the file never passes through the web worker. The returned
+    `upload_token` is handed back to a confirm endpoint, which attaches the
+    stored file with confirm_direct_upload.
+    """
+    storage = model_field.storage
+    if not hasattr(storage, "bucket"):
+        raise ValidationError("Direct uploads need an S3 storage backend.")
+
+    root, ext = os.path.splitext(model_field.generate_filename(None, filename))
+    name = f"{root}_{uuid.uuid4().hex[:12]}{ext}"
+    key = storage._normalize_name(name)
+    s3_client = storage.connection.meta.client
+
+    if method == "put":
+        upload = {
+            "method": "PUT",
+            "url": s3_client.generate_presigned_url(
+                "put_object",
+                Params={
+                    "Bucket": storage.bucket_name,
+                    "Key": key,
+                    "ContentType": content_type,
+                },
+                ExpiresIn=expiration,
+            ),
+            "headers": {"Content-Type": content_type},
+        }
+    else:
+        post = s3_client.generate_presigned_post(
+            storage.bucket_name,
+            key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size],
+            ],
             ExpiresIn=expiration,
         )
-        return url
-    except NoCredentialsError:
-        return None
-    except Exception as e:
-        return None
+        upload = {"method": "POST", "url": post["url"], "fields": post["fields"]}
+
+    upload["upload_token"] = signing.dumps(
+        {"name": name, "field": _get_field_label(model_field), "max_size": max_size},
+        salt=DIRECT_UPLOAD_SALT,
+    )
+    upload["expires_in"] = expiration
+    return upload
+
+
+def confirm_direct_upload(model_field, upload_token):
+    """
+    Check that the file behind `upload_token` was uploaded for `model_field`
+    and return its storage name, ready to be assigned to the field.
+    """
+    try:
+        upload = signing.loads(
+            upload_token, salt=DIRECT_UPLOAD_SALT, max_age=DIRECT_UPLOAD_TOKEN_MAX_AGE
+        )
+    except signing.SignatureExpired:
+        raise ValidationError("Upload token has expired.")
+    except signing.BadSignature:
+        raise ValidationError("Invalid upload token.")
+
+    if upload["field"] != _get_field_label(model_field):
+        raise ValidationError("Upload token was issued for another field.")
+
+    storage = model_field.storage
+    name = upload["name"]
+    if not storage.exists(name):
+        raise ValidationError("File has not been uploaded yet.")
+    # A presigned PUT cannot limit the body size, so it is checked here
+    if storage.size(name) > upload["max_size"]:
+        storage.delete(name)
+        raise ValidationError("Uploaded file is too large.")
+    return name
 
 
 def cyrillic_to_username(text):
@@ -145,7 +253,6 @@ def get_cache_key(prefix, user, child_id=None, **kwargs):
         key += f"_child_{child_id}"
     for k, v in kwargs.items():
         key += f"_{k}_{v}"
-    print("[get_cache_key]", key)
     return key
 
 
@@ -165,3 +272,57 @@ def get_next_school_year():
         return f"{year}-{year + 1}"
     else:
         return f"{year + 1}-{year + 2}"
+
+
+def update_rows_by_pk(queryset, values_by_pk, fields):
+    """
+    Write per-row values with a single UPDATE ... SET field = CASE ... END.
+    `values_by_pk` maps pk to {field: value}; a row without a value for a
+    field keeps its current one. Returns the number of rows matched.
+    """
+    updates = {}
+    for field in fields:
+        whens = [
+            When(pk=pk, then=Value(values[field]))
+            for pk, values in values_by_pk.items()
+            if field in values
+        ]
+        if whens:
+            updates[field] = Case(
+                *whens,
+                default=F(field),
+                output_field=queryset.model._meta.get_field(field),
+            )
+    if not updates:
+        return 0
+    return queryset.filter(pk__in=values_by_pk.keys()).update(**updates)
+
+
+def reorder(queryset, orders, field="order"):
+    """
+    Apply {pk: order} to the rows of `queryset` in one statement.
+    """
+    return update_rows_by_pk(
+        queryset, {pk: {field: order} for pk, order in orders.items()}, [field]
+    )
+
+
+def allocate_orders(queryset, objs, group_field, field="order"):
+    """
+    Give unsaved `objs` consecutive `field` values after the current maximum
+    of their group (e.g. the chapter of a content), reading the maximum of
+    every group with one aggregate.
+    """
+    attname = queryset.model._meta.get_field(group_field).attname
+    groups = {getattr(obj, attname) for obj in objs}
+    last_orders = dict(
+        queryset.filter(**{f"{attname}__in": groups})
+        .values_list(attname)
+        .annotate(last=Max(field))
+        .order_by()
+    )
+    for obj in objs:
+        group = getattr(obj, attname)
+        last_orders[group] = (last_orders.get(group) or 0) + 1
+        setattr(obj, field, last_orders[group])
+    return objs
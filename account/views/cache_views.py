@@ -0,0 +1,39 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from account.permissions import IsSuperUser
+from account.cache import cache_metrics
+
+
+class CacheMetricsView(APIView):
+    """
+    Hits, misses, rebuild time and payload bytes of the view caches per key
+    prefix (course, section, chapter, task, league, ...).
+    """
+
+    permission_classes = [IsSuperUser]
+
+    def get(self, request):
+        metrics = cache_metrics.read()
+        for counts in metrics.values():
+            lookups = (
+                counts["hits"]
+                + counts["local_hits"]
+                + counts["stale_hits"]
+                + counts["misses"]
+            )
+            builds = counts["misses"]
+            counts["hit_rate"] = (
+                round((lookups - builds) / lookups, 4) if lookups else None
+            )
+            counts["avg_build_ms"] = (
+                round(counts["build_ms"] / builds, 1) if builds else None
+            )
+            counts["avg_bytes"] = (
+                round(counts["bytes"] / counts["sized"]) if counts["sized"] else None
+            )
+        return Response(metrics, status=200)
+
+    def delete(self, request):
+        cache_metrics.reset()
+        return Response({"message": "Cache metrics reset."}, status=200)
@@ -2,14 +2,15 @@ from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
-from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from account.models import LANGUAGE_CHOICES, DailyMessage, MotivationalPhrase
 from datetime import date
+from functools import partial
 
 from account.permissions import IsSuperUser
 from account.serializers import DailyMessageSerializer, MotivationalPhraseSerializer
 from account.tasks import generate_daily_messages
+from account.cache import get_or_build
 
 
 class DailyMessageView(APIView):
@@ -42,33 +43,26 @@ class DailyMessageView(APIView):
         if language not in [choice[0] for choice in LANGUAGE_CHOICES]:
             return Response({"error": "Invalid language."}, status=400)
 
-        if cache.get(f"daily_message_{language}"):
-            # Cache hit
-            print("Cache hit")
-
+        message = get_or_build(
+            f"daily_message_{language}",
+            partial(self._get_message, language),
+            timeout=3600,
+            local=True,
+        )
+        if message is None:
             return Response(
-                {
-                    "message": cache.get(f"daily_message_{language}"),
-                    "language": language,
-                },
-                status=200,
+                {"message": "No message found for the specified language."}, status=404
             )
+        return Response({"message": message, "language": language}, status=200)
 
-        # Cache miss
-        print("Cache miss")
-
-        try:
-            daily_message = DailyMessage.objects.get(
+    def _get_message(self, language):
+        return (
+            DailyMessage.objects.filter(
                 language=language, is_active=True, date=date.today()
             )
-            cache.set(f"daily_message_{language}", daily_message.message, timeout=3600)
-            return Response(
-                {"message": daily_message.message, "language": language}, status=200
-            )
-        except DailyMessage.DoesNotExist:
-            return Response(
-                {"message": "No message found for the specified language."}, status=404
-            )
+            .values_list("message", flat=True)
+            .first()
+        )
 
 
 class DailyMessageViewSet(viewsets.ModelViewSet):
@@ -1,4 +1,5 @@
 import os
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models.signals import post_save
 from datetime import datetime
@@ -8,7 +9,12 @@ import pandas as pd
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from account.tasks import decrement_schoolclass_grade, increment_schoolclass_grade
+from account.tasks import (
+    SCHOOL_DELETION_PROGRESS_TIMEOUT,
+    delete_school_data,
+    get_school_deletion_cache_key,
+    rollover_school_grades,
+)
 
 from account.models import Class, School, Student, User
 from account.permissions import IsSuperUser
@@ -51,27 +57,14 @@ class SchoolViewSet(viewsets.ModelViewSet):
     )
     def increment_grade(self, request, pk=None):
         school = self.get_object()
-        classes = school.classes.all()
 
-        if not classes:
+        if not school.classes.exists():
             return Response(
                 {"message": "No classes found for this school"},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        try:
-            for school_class in classes:
-                increment_schoolclass_grade.delay(school_class.id)
-
-            return Response(
-                {"message": "Grades incremented successfully"},
-                status=status.HTTP_200_OK,
-            )
-        except Exception as e:
-            return Response(
-                {"message": f"Error occurred: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        return self._rollover_grades(request, "increment", school_ids=[school.pk])
 
     @action(
         detail=True,
@@ -81,27 +74,14 @@ class SchoolViewSet(viewsets.ModelViewSet):
     )
     def decrement_grade(self, request, pk=None):
         school = self.get_object()
-        classes = school.classes.all()
 
-        if not classes:
+        if not school.classes.exists():
             return Response(
                 {"message": "No classes found for this school"},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        try:
-            for school_class in classes:
-                decrement_schoolclass_grade.delay(school_class.id)
-
-            return Response(
-                {"message": "Grades decremented successfully"},
-                status=status.HTTP_200_OK,
-            )
-        except Exception as e:
-            return Response(
-                {"message": f"Error occurred: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        return self._rollover_grades(request, "decrement", school_ids=[school.pk])
 
     @action(
         detail=False,
@@ -111,23 +91,7 @@ class SchoolViewSet(viewsets.ModelViewSet):
         permission_classes=[IsSuperUser],
     )
     def increment_grades_global(self, request):
-        for school in School.objects.all():
-            classes = school.classes.all()
-            if not classes:
-                continue
-
-            try:
-                for school_class in classes:
-                    increment_schoolclass_grade.delay(school_class.id)
-            except Exception as e:
-                return Response(
-                    {"message": f"Error occurred: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-        return Response(
-            {"message": "All school grades incremented successfully"},
-            status=status.HTTP_200_OK,
-        )
+        return self._rollover_grades(request, "increment")
 
     @action(
         detail=False,
@@ -137,23 +101,36 @@ class SchoolViewSet(viewsets.ModelViewSet):
         permission_classes=[IsSuperUser],
     )
     def decrement_grades_global(self, request):
-        for school in School.objects.all():
-            classes = school.classes.all()
-            if not classes:
-                continue
+        return self._rollover_grades(request, "decrement")
 
-            try:
-                for school_class in classes:
-                    decrement_schoolclass_grade.delay(school_class.id)
-            except Exception as e:
-                return Response(
-                    {"message": f"Error occurred: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    def _rollover_grades(self, request, direction, school_ids=None):
+        """
+        Runs the grade rollover job. With `?dry_run=true` the job only counts
+        what would move and the report is returned right away, otherwise it is
+        queued and the task id is returned.
+        """
+        dry_run = request.query_params.get("dry_run", "").lower() == "true"
+
+        try:
+            if dry_run:
+                report = rollover_school_grades(
+                    direction, school_ids=school_ids, dry_run=True
                 )
-        return Response(
-            {"message": "All school grades decremented successfully"},
-            status=status.HTTP_200_OK,
-        )
+                return Response(report, status=status.HTTP_200_OK)
+
+            task = rollover_school_grades.delay(direction, school_ids=school_ids)
+            return Response(
+                {
+                    "message": f"Grade {direction} has been scheduled",
+                    "task_id": task.id,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            return Response(
+                {"message": f"Error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
     @action(detail=True, methods=["post"])
     def assign_supervisor(self, request, pk=None):
@@ -607,23 +584,27 @@ class SchoolViewSet(viewsets.ModelViewSet):
     )
     def delete_school(self, request, pk=None):
         """
-        Deletes a school and all associated data.
+        Schedules deletion of a school and all associated data.
+        Progress can be followed through `delete-school-status`.
         """
         school = self.get_object()
+        progress = cache.get(get_school_deletion_cache_key(school.pk))
+        if progress and progress.get("status") in ("scheduled", "running"):
+            return Response(
+                {"message": "School deletion is already in progress"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
-            disconnect_signals()
-            with transaction.atomic():
-                for school_class in school.classes.all():
-                    for student in school_class.students.all():
-                        student.user.delete()
-                    school_class.delete()
-                if school.supervisor:
-                    school.supervisor.delete()
-                school.delete()
-            reconnect_signals()
+            cache.set(
+                get_school_deletion_cache_key(school.pk),
+                {"status": "scheduled"},
+                SCHOOL_DELETION_PROGRESS_TIMEOUT,
+            )
+            task = delete_school_data.delay(school.pk)
             return Response(
-                {"message": "School deleted successfully"},
-                status=status.HTTP_204_NO_CONTENT,
+                {"message": "School deletion has been scheduled", "task_id": task.id},
+                status=status.HTTP_202_ACCEPTED,
             )
         except Exception as e:
             return Response(
@@ -631,6 +612,28 @@ class SchoolViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="delete-school-status",
+        permission_classes=[IsSuperUser],
+    )
+    def delete_school_status(self, request):
+        school_id = request.query_params.get("school_id")
+        if not school_id:
+            return Response(
+                {"message": "School ID is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        progress = cache.get(get_school_deletion_cache_key(school_id))
+        if not progress:
+            return Response(
+                {"message": "No deletion found for this school"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(progress, status=status.HTTP_200_OK)
+
 
 def disconnect_signals():
     """
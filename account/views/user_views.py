@@ -1,4 +1,5 @@
-from django.core.cache import cache
+from functools import partial
+
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
@@ -7,6 +8,7 @@ from rest_framework.views import APIView
 
 from account.models import Child, Student
 from account.serializers import ChildSerializer
+from account.cache import get_or_build_response
 
 
 class CurrentUserView(APIView):
@@ -15,18 +17,9 @@ class CurrentUserView(APIView):
     def get(self, request):
         user = request.user
         cache_key = f"user_data_{user.id}"
-        cached_data = cache.get(cache_key)
-
-        print("cached_data", cached_data)
-
-        if cached_data is None:
-            print("cached_data is None")
-            data = self._get_user_data(user)
-            cache.set(cache_key, data, timeout=300)  # Cache for 5 minutes
-        else:
-            data = cached_data
-
-        return Response(data)
+        return get_or_build_response(
+            request, cache_key, partial(self._get_user_data, user), timeout=300
+        )
 
     def _get_user_data(self, user):
         data = {}
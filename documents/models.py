@@ -1,6 +1,7 @@
 from django.db import models
 
 from account.models import GRADE_CHOICES, LANGUAGE_CHOICES
+from account.utils import allocate_orders
 from django.db import transaction
 
 DOCUMENT_TYPES = (("ktp", "KTP"),)
@@ -48,12 +49,7 @@ class Document(models.Model):
     def save(self, *args, **kwargs):
         with transaction.atomic():
             if not self.pk:
-                last_order = (
-                    Document.objects.filter(subject=self.subject)
-                    .order_by("-order")
-                    .first()
-                )
-                self.order = last_order.order + 1 if last_order else 1
+                allocate_orders(Document.objects, [self], "subject")
             super().save(*args, **kwargs)
 
     def __str__(self):
@@ -1,10 +1,11 @@
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
+from account.serializers import DirectUploadModelSerializer
 from .models import Document, Subject
 import os
 
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(DirectUploadModelSerializer):
     class Meta:
         model = Document
         fields = [
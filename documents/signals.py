@@ -14,8 +14,7 @@ def invalidate_cache_subjects(sender, instance, **kwargs):
     invalidate_cache_celery.delay(cache_keys)
 
 
-@receiver([post_save, post_delete], sender=Document)
-def invalidate_cache_documents(sender, instance, **kwargs):
+def get_document_cache_keys(instance):
     cache_keys = [
         f"document_{instance.pk}",
     ]
@@ -38,6 +37,12 @@ def invalidate_cache_documents(sender, instance, **kwargs):
                 f"documents_list_subject_{instance.subject_id}_type_{doc_type}"
             )
 
+    return cache_keys
+
+
+@receiver([post_save, post_delete], sender=Document)
+def invalidate_cache_documents(sender, instance, **kwargs):
+    cache_keys = get_document_cache_keys(instance)
     print(cache_keys)
     invalidate_cache_celery.delay(cache_keys)
 
@@ -1,13 +1,19 @@
+from functools import partial
+
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from .models import Document, Subject
 from .serializers import DocumentSerializer, SubjectSerializer
 from account.permissions import IsSuperUser
+from account.serializers import DirectUploadSerializer
+from account.cache import get_or_build_response
+from account.utils import create_direct_upload, reorder
+from .signals import get_document_cache_keys
+from .tasks import invalidate_cache_celery
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import action
 
@@ -34,35 +40,27 @@ class SubjectViewSet(viewsets.ModelViewSet):
             return Response({"error": "Grade is required."}, status=400)
         cache_key = f"subjects_list_grade_{grade}"
 
-        print(cache_key)
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-
         if grade:
             self.queryset = self.queryset.filter(grade=grade)
 
-        response = super().list(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().list, request, *args, **kwargs),
+            timeout=3600,
+            local=True,
+        )
 
     def retrieve(self, request, *args, **kwargs):
         subject_id = kwargs.get("pk")
         cache_key = f"subject_{subject_id}"
 
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().retrieve, request, *args, **kwargs),
+            timeout=3600,
+        )
 
 
 class DocumentViewSet(viewsets.ModelViewSet):
@@ -82,15 +80,6 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if language:
             cache_key += f"_language_{language}"
 
-        print(cache_key)
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-
         if not subject_id:
             return Response({"error": "Subject ID is required."}, status=400)
 
@@ -104,9 +93,12 @@ class DocumentViewSet(viewsets.ModelViewSet):
         if language:
             self.queryset = self.queryset.filter(language=language)
 
-        response = super().list(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().list, request, *args, **kwargs),
+            timeout=3600,
+        )
 
     def create(self, request, *args, **kwargs):
         print(request.data)
@@ -130,24 +122,46 @@ class DocumentViewSet(viewsets.ModelViewSet):
         document_id = kwargs.get("pk")
         cache_key = f"document_{document_id}"
 
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().retrieve, request, *args, **kwargs),
+            timeout=3600,
+        )
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "change_order",
+            "upload_url",
+        ]:
             self.permission_classes = [IsAuthenticated, IsSuperUser]
         else:
             self.permission_classes = [AllowAny]
 
         return [permission() for permission in self.permission_classes]
 
+    @action(detail=False, methods=["post"], url_path="upload-url")
+    def upload_url(self, request, *args, **kwargs):
+        """
+        Presign a direct upload of a document file to storage. The returned
+        `upload_token` is then sent as `file` to create or partial_update.
+        """
+        serializer = DirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = create_direct_upload(
+                Document._meta.get_field("file"), **serializer.validated_data
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(upload, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=["patch"], url_path="update-document-order")
     def change_order(self, request, *args, **kwargs):
         """
@@ -157,20 +171,33 @@ class DocumentViewSet(viewsets.ModelViewSet):
 
         try:
             order_data = request.data
+            orders = {}
+            for item in order_data:
+                doc_id = item.get("id")
+                new_order = item.get("order")
+
+                if not doc_id or not new_order:
+                    return Response(
+                        {"error": "ID and new order are required"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                orders[int(doc_id)] = new_order
+
             with transaction.atomic():
-                for item in order_data:
-                    doc_id = item.get("id")
-                    new_order = item.get("order")
-
-                    if not doc_id or not new_order:
-                        return Response(
-                            {"error": "ID and new order are required"},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                    document = get_object_or_404(Document, id=int(doc_id))
-                    document.order = new_order
-                    document.save()
+                if reorder(Document.objects.all(), orders) != len(orders):
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": "Some documents do not exist"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+
+            # The single UPDATE skips post_save, so the lists are invalidated here
+            cache_keys = set()
+            for document in Document.objects.filter(pk__in=orders).only(
+                "pk", "subject_id", "document_type", "language"
+            ):
+                cache_keys.update(get_document_cache_keys(document))
+            invalidate_cache_celery.delay(list(cache_keys))
 
             return Response(
                 {"message": "Order updated successfully"}, status=status.HTTP_200_OK
@@ -24,9 +24,7 @@ def get_league_group_list_cache_key(league_id=None):
     Generate a cache key for the list of league groups.
     """
     if league_id:
-        print(f"Generating cache key for league groups with league_id: {league_id}")
         return f"league_groups_list_{league_id}"
-    print("Generating cache key for all league groups")
     return "league_groups_list"
 
 
@@ -7,10 +7,12 @@ from rest_framework import viewsets, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
 import math
+from functools import partial
 from random import shuffle, randint
 
 from account.models import Child, School, Student
 from account.permissions import IsSuperUser, IsAuthenticated
+from account.cache import get_or_build_response
 from .models import League, LeagueGroup, LeagueGroupParticipant
 from .serializers import (
     LeagueSerializer,
@@ -49,30 +51,22 @@ class LeagueViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         cache_key = get_league_list_cache_key()
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-
-        response = super().list(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().list, request, *args, **kwargs),
+            timeout=3600,
+            local=True,
+        )
 
     def retrieve(self, request, *args, **kwargs):
         cache_key = get_league_cache_key(kwargs["pk"])
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
-
-        print("Cache miss")
-
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().retrieve, request, *args, **kwargs),
+            timeout=3600,
+        )
 
 
 class LeagueGroupViewSet(
@@ -98,30 +92,22 @@ class LeagueGroupViewSet(
     def list(self, request, *args, **kwargs):
         league_id = self.request.query_params.get("league_id")
         cache_key = get_league_group_list_cache_key(league_id)
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            print("Cache hit")
-            return Response(cached_data)
-
-        print("Cache miss")
-
-        response = super().list(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().list, request, *args, **kwargs),
+            timeout=3600,
+            local=True,
+        )
 
     def retrieve(self, request, *args, **kwargs):
         cache_key = get_league_group_cache_key(kwargs["pk"])
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit")
-            return Response(cached_data)
-
-        print("Cache miss")
-
-        response = super().retrieve(request, *args, **kwargs)
-        cache.set(cache_key, response.data, timeout=3600)
-        return response
+        return get_or_build_response(
+            request,
+            cache_key,
+            partial(super().retrieve, request, *args, **kwargs),
+            timeout=3600,
+        )
 
     @action(detail=True, methods=["get"])
     def standings(self, request, pk=None):
@@ -129,51 +115,49 @@ class LeagueGroupViewSet(
         Get participants for a specific league group.
         """
         cache_key = get_league_group_participant_list_cache_key(pk)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit")
-            return Response(cached_data)
 
-        print("Cache miss")
-        participant_prefetch = Prefetch(
-            "participants",
-            queryset=LeagueGroupParticipant.objects.order_by(
-                "-cups_earned",
-                "last_question_answered",
-            ).select_related("student", "child"),
-            to_attr="prefetched_participants",
-        )
-        league_group = (
-            LeagueGroup.objects.select_related("league")
-            .prefetch_related(participant_prefetch)
-            .get(pk=pk)
-        )
-        participants = league_group.prefetched_participants
-        response_data = {}
-        participant_data = [
-            {
-                "place": index + 1,
-                "student": str(participant.student) if participant.student else None,
-                "child": str(participant.child) if participant.child else None,
-                "cups_earned": participant.cups_earned,
-                "rank": participant.rank,
-                "last_question_answered": participant.last_question_answered,
+        def build():
+            participant_prefetch = Prefetch(
+                "participants",
+                queryset=LeagueGroupParticipant.objects.order_by(
+                    "-cups_earned",
+                    "last_question_answered",
+                ).select_related("student", "child"),
+                to_attr="prefetched_participants",
+            )
+            league_group = (
+                LeagueGroup.objects.select_related("league")
+                .prefetch_related(participant_prefetch)
+                .get(pk=pk)
+            )
+            participants = league_group.prefetched_participants
+            response_data = {}
+            participant_data = [
+                {
+                    "place": index + 1,
+                    "student": (
+                        str(participant.student) if participant.student else None
+                    ),
+                    "child": str(participant.child) if participant.child else None,
+                    "cups_earned": participant.cups_earned,
+                    "rank": participant.rank,
+                    "last_question_answered": participant.last_question_answered,
+                }
+                for index, participant in enumerate(participants)
+            ]
+            league_data = {
+                "league_name": league_group.league.name,
+                "group_name": league_group.group_name,
+                "max_players": league_group.league.max_players,
+                "promotions_rate": league_group.league.promotions_rate,
+                "demotions_rate": league_group.league.demotions_rate,
+                "participants_number": len(participants),
             }
-            for index, participant in enumerate(participants)
-        ]
-        league_data = {
-            "league_name": league_group.league.name,
-            "group_name": league_group.group_name,
-            "max_players": league_group.league.max_players,
-            "promotions_rate": league_group.league.promotions_rate,
-            "demotions_rate": league_group.league.demotions_rate,
-            "participants_number": len(participants),
-        }
-        response_data["league"] = league_data
-        response_data["participants"] = participant_data
-
-        cache.set(cache_key, response_data, timeout=600)
-        return Response(response_data)
+            response_data["league"] = league_data
+            response_data["participants"] = participant_data
+            return response_data
+
+        return get_or_build_response(request, cache_key, build, timeout=600)
 
 
 class TestingView(APIView):
@@ -7,6 +7,8 @@ from .models import (
     TestAnswer,
     TestResult,
     TestCategory,
+    TestStatistics,
+    QuestionStatistics,
 )
 
 
@@ -38,3 +40,5 @@ admin.site.register(AnswerOption)
 admin.site.register(TestAnswer)
 admin.site.register(TestResult)
 admin.site.register(TestCategory)
+admin.site.register(TestStatistics)
+admin.site.register(QuestionStatistics)
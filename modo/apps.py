@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ModoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'modo'
+
+    def ready(self):
+        import modo.signals
@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-19 18:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_answered_questions(apps, schema_editor):
+    TestResult = apps.get_model("modo", "TestResult")
+    TestAnswer = apps.get_model("modo", "TestAnswer")
+
+    answered = (
+        TestAnswer.objects.filter(test_result=OuterRef("pk"))
+        .values("test_result")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    TestResult.objects.update(answered_questions=Coalesce(Subquery(answered), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("modo", "0018_merge_20250716_1231"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="testresult",
+            name="answered_questions",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_answered_questions, migrations.RunPython.noop),
+    ]
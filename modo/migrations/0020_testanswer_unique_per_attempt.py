@@ -0,0 +1,27 @@
+# Generated by Django 5.1 on 2026-10-19 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("modo", "0019_testresult_answered_questions"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="testanswer",
+            name="unique_user_question",
+        ),
+        migrations.RemoveConstraint(
+            model_name="testanswer",
+            name="unique_child_question",
+        ),
+        migrations.AddConstraint(
+            model_name="testanswer",
+            constraint=models.UniqueConstraint(
+                fields=("test_result", "question"), name="unique_test_result_question"
+            ),
+        ),
+    ]
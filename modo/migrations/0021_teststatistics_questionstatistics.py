@@ -0,0 +1,76 @@
+# Generated by Django 5.1 on 2026-10-19 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("modo", "0020_testanswer_unique_per_attempt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("responses", models.PositiveIntegerField(default=0)),
+                ("difficulty", models.FloatField(blank=True, null=True)),
+                ("discrimination", models.FloatField(blank=True, null=True)),
+                ("option_distribution", models.JSONField(default=dict)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "question",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statistics",
+                        to="modo.question",
+                    ),
+                ),
+                (
+                    "test",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="question_statistics",
+                        to="modo.test",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TestStatistics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("mean_score", models.FloatField(default=0)),
+                ("score_percentiles", models.JSONField(default=dict)),
+                ("last_answer_id", models.BigIntegerField(default=0)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "test",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statistics",
+                        to="modo.test",
+                    ),
+                ),
+            ],
+        ),
+    ]
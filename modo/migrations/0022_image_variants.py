@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("modo", "0021_teststatistics_questionstatistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answeroption",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="content",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
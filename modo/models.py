@@ -1,6 +1,8 @@
 from django.db import models
-from django.db.models import Q, UniqueConstraint
+from django.db.models import F, UniqueConstraint
+from django.db.models.functions import Round
 from account.models import LANGUAGE_CHOICES
+from account.cache import bump_progress_version
 from modo.utils import get_language_display_name
 
 TEST_TYPE = [
@@ -88,6 +90,8 @@ class Content(models.Model):
     content_type = models.CharField(max_length=5, choices=CONTENT_TYPE, default="text")
     text = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to="contents/images/", blank=True, null=True)
+    # Resized copies built by account.tasks.generate_image_variants
+    image_variants = models.JSONField(default=dict, blank=True)
     order = models.IntegerField(default=0)
 
     class Meta:
@@ -105,6 +109,8 @@ class AnswerOption(models.Model):
     )
     text = models.CharField(max_length=255, null=True, blank=True)
     image = models.ImageField(upload_to="answer_options/images/", blank=True, null=True)
+    # Resized copies built by account.tasks.generate_image_variants
+    image_variants = models.JSONField(default=dict, blank=True)
     is_correct = models.BooleanField(default=False)
     option_type = models.CharField(max_length=5, choices=CONTENT_TYPE, default="text")
 
@@ -132,6 +138,7 @@ class TestResult(models.Model):
     is_finished = models.BooleanField(default=False)
     score = models.IntegerField(default=0)
     total_questions = models.IntegerField(default=0)
+    answered_questions = models.IntegerField(default=0)
     correct_answers = models.IntegerField(default=0)
     date_taken = models.DateTimeField(auto_now_add=True)
 
@@ -139,6 +146,31 @@ class TestResult(models.Model):
         unique_together = ("test", "user", "child", "attempt_number")
         ordering = ["-date_taken"]
 
+    def record_answers(
+        self, answered_delta, correct_delta, total_questions, finish=False
+    ):
+        """
+        Adjust the attempt progress in a single UPDATE. The deltas are the
+        number of newly answered questions and the change in correct answers.
+        Returns whether the attempt is finished.
+        """
+        is_finished = finish or (
+            self.answered_questions + answered_delta >= total_questions
+        )
+        TestResult.objects.filter(pk=self.pk).update(
+            total_questions=total_questions,
+            answered_questions=F("answered_questions") + answered_delta,
+            correct_answers=F("correct_answers") + correct_delta,
+            score=(
+                Round((F("correct_answers") + correct_delta) * 100.0 / total_questions)
+                if total_questions
+                else 0
+            ),
+            is_finished=is_finished,
+        )
+        bump_progress_version(self.user_id, self.child_id)
+        return is_finished
+
     def __str__(self):
         user_or_child = (
             f"User: {self.user.id}" if self.user else f"Child: {self.child.id}"
@@ -181,13 +213,48 @@ class TestAnswer(models.Model):
     class Meta:
         constraints = [
             UniqueConstraint(
-                fields=["question", "user"],
-                condition=Q(user__isnull=False),
-                name="unique_user_question",
-            ),
-            UniqueConstraint(
-                fields=["question", "child"],
-                condition=Q(child__isnull=False),
-                name="unique_child_question",
+                fields=["test_result", "question"],
+                name="unique_test_result_question",
             ),
         ]
+
+
+class TestStatistics(models.Model):
+    """
+    Item analysis of a test over its finished attempts, refreshed by
+    modo.tasks.compute_test_statistics.
+    """
+
+    test = models.OneToOneField(
+        Test, related_name="statistics", on_delete=models.CASCADE
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    mean_score = models.FloatField(default=0)
+    # {"p10": ..., "p25": ..., "p50": ..., "p75": ..., "p90": ...} of the score
+    score_percentiles = models.JSONField(default=dict)
+    # Latest answer included, used to skip tests without new data
+    last_answer_id = models.BigIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.test.title} - Attempts: {self.attempts}"
+
+
+class QuestionStatistics(models.Model):
+    question = models.OneToOneField(
+        Question, related_name="statistics", on_delete=models.CASCADE
+    )
+    test = models.ForeignKey(
+        Test, related_name="question_statistics", on_delete=models.CASCADE
+    )
+    responses = models.PositiveIntegerField(default=0)
+    # Share of responses that are correct, lower means harder
+    difficulty = models.FloatField(null=True, blank=True)
+    # Correlation between the item and the rest of the attempt score
+    discrimination = models.FloatField(null=True, blank=True)
+    # {answer_option_id: times chosen}
+    option_distribution = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.question.title} - Difficulty: {self.difficulty}"
@@ -8,17 +8,30 @@ from .models import (
     TestAnswer,
     TestCategory,
     TestResult,
+    QuestionStatistics,
+    TestStatistics,
 )
 from drf_spectacular.utils import extend_schema_field
 
+from account.serializers import (
+    DirectUploadImageField,
+    DirectUploadModelSerializer,
+    ImageVariantsField,
+)
+from account.utils import allocate_orders
+
+
+class AnswerOptionSerializer(DirectUploadModelSerializer):
+    image_variants = ImageVariantsField()
 
-class AnswerOptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnswerOption
         fields = "__all__"
 
 
-class ContentSerializer(serializers.ModelSerializer):
+class ContentSerializer(DirectUploadModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Content
         fields = "__all__"
@@ -265,6 +278,18 @@ class ShortTestResultSerializer(serializers.ModelSerializer):
         ]
 
 
+class TestBodySerializer(serializers.ModelSerializer):
+    """
+    Learner independent part of TestSerializer, cached per test version.
+    """
+
+    questions = TestQuestionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Test
+        fields = "__all__"
+
+
 class TestSerializer(serializers.ModelSerializer):
     questions = TestQuestionSerializer(many=True, read_only=True)
     is_finished = serializers.SerializerMethodField()
@@ -358,18 +383,35 @@ class TestResultSerializer(serializers.ModelSerializer):
         if not request:
             return []
 
-        # Determine user or child
-        if obj.user:
-            answers = TestAnswer.objects.filter(question__test=obj.test, user=obj.user)
-        else:
-            answers = TestAnswer.objects.filter(
-                question__test=obj.test, child=obj.child
-            )
+        answers = obj.answers.select_related(
+            "answer_option", "question"
+        ).prefetch_related("question__contents", "question__answer_options")
 
         return TestAnswerSerializer(answers, many=True, context=self.context).data
 
 
-class FullAnswerOptionSerializer(serializers.ModelSerializer):
+class SubmittedAnswerSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    answer_option = serializers.IntegerField()
+
+
+class TestAnswersSubmitSerializer(serializers.Serializer):
+    test = serializers.IntegerField()
+    answers = SubmittedAnswerSerializer(many=True, allow_empty=False)
+    finish = serializers.BooleanField(default=False)
+
+    def validate_answers(self, value):
+        question_ids = [answer["question"] for answer in value]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError(
+                "Each question can be answered only once per submission."
+            )
+        return value
+
+
+class FullAnswerOptionSerializer(DirectUploadModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = AnswerOption
         exclude = ["question"]
@@ -394,7 +436,9 @@ class FullAnswerOptionSerializer(serializers.ModelSerializer):
         return data
 
 
-class FullContentSerializer(serializers.ModelSerializer):
+class FullContentSerializer(DirectUploadModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Content
         exclude = ["question"]
@@ -434,10 +478,10 @@ class FullQuestionCreateSerializer(serializers.ModelSerializer):
         answers_data = validated_data.pop("answer_options", [])
         test = self.context.get("test")
 
-        if 'order' not in validated_data:
-            order = len(test.questions.all())+1
-            validated_data['order'] = order
-        question = Question.objects.create(test=test, **validated_data)
+        question = Question(test=test, **validated_data)
+        if "order" not in validated_data:
+            allocate_orders(Question.objects, [question], "test")
+        question.save()
 
         if contents_data:
             for content in contents_data:
@@ -485,15 +529,64 @@ class FullTestCreateSerializer(serializers.ModelSerializer):
 
         return test
 
-class ImageOrURLField(serializers.ImageField):
+class ImportAnswerOptionSerializer(FullAnswerOptionSerializer):
+    """Answer option from an import manifest; `image` is a path in the archive."""
+
+    image = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+
+class ImportContentSerializer(FullContentSerializer):
+    """Content from an import manifest; `image` is a path in the archive."""
+
+    image = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+
+class ImportQuestionSerializer(serializers.ModelSerializer):
+    contents = ImportContentSerializer(many=True, required=False)
+    answer_options = ImportAnswerOptionSerializer(many=True, required=False)
+
+    class Meta:
+        model = Question
+        exclude = ["test"]
+        extra_kwargs = {"order": {"required": False}}
+
+
+class ImportTestSerializer(serializers.ModelSerializer):
+    """
+    Validates one test of an import manifest. Rows are created by
+    modo.tasks.import_test_bundle, not by this serializer.
+    """
+
+    questions = ImportQuestionSerializer(many=True)
+
+    class Meta:
+        model = Test
+        fields = [
+            "title",
+            "shuffle_questions",
+            "description",
+            "test_type",
+            "order",
+            "questions",
+            "category",
+        ]
+
+
+class TestImportSerializer(serializers.Serializer):
+    manifest = serializers.FileField()
+    media = serializers.FileField(required=False)
+
+
+class ImageOrURLField(DirectUploadImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith(("http://", "https://")):
             return data
         return super().to_internal_value(data)
 
-class FullAnswerOptionUpdateSerializer(serializers.ModelSerializer):
+class FullAnswerOptionUpdateSerializer(DirectUploadModelSerializer):
     id = serializers.IntegerField(required=False)
     image = ImageOrURLField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = AnswerOption
@@ -524,9 +617,10 @@ class FullAnswerOptionUpdateSerializer(serializers.ModelSerializer):
         return data
 
 
-class FullContentUpdateSerializer(serializers.ModelSerializer):
+class FullContentUpdateSerializer(DirectUploadModelSerializer):
     id = serializers.IntegerField(required=False)
     image = ImageOrURLField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Content
@@ -674,3 +768,44 @@ class TestCategorySerializer(serializers.ModelSerializer):
             "test_type",
             "image",
         ]
+
+
+class QuestionStatisticsSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source="question.title", read_only=True)
+    order = serializers.IntegerField(source="question.order", read_only=True)
+
+    class Meta:
+        model = QuestionStatistics
+        fields = [
+            "question",
+            "title",
+            "order",
+            "responses",
+            "difficulty",
+            "discrimination",
+            "option_distribution",
+        ]
+
+
+class TestStatisticsSerializer(serializers.ModelSerializer):
+    questions = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TestStatistics
+        fields = [
+            "test",
+            "attempts",
+            "mean_score",
+            "score_percentiles",
+            "computed_at",
+            "questions",
+        ]
+
+    @extend_schema_field(QuestionStatisticsSerializer(many=True))
+    def get_questions(self, obj):
+        questions = (
+            QuestionStatistics.objects.filter(test_id=obj.test_id)
+            .select_related("question")
+            .order_by("question__order", "question_id")
+        )
+        return QuestionStatisticsSerializer(questions, many=True).data
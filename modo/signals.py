@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from account.tasks import schedule_image_variants
+from account.images import delete_image_variants
+from tasks.utils import bump_content_version
+from .models import AnswerOption, Content, Question, Test
+from .utils import bump_test_version
+
+
+@receiver([post_save, post_delete], sender=Test)
+def invalidate_test_version(sender, instance, **kwargs):
+    bump_content_version()
+    bump_test_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_test_version_for_question(sender, instance, **kwargs):
+    bump_content_version()
+    bump_test_version(instance.test_id)
+
+
+@receiver([post_save, post_delete], sender=Content)
+@receiver([post_save, post_delete], sender=AnswerOption)
+def invalidate_test_version_for_question_item(sender, instance, **kwargs):
+    bump_content_version()
+    test_id = (
+        Question.objects.filter(pk=instance.question_id)
+        .values_list("test_id", flat=True)
+        .first()
+    )
+    if test_id:
+        bump_test_version(test_id)
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_save, sender=AnswerOption)
+def create_image_variants(sender, instance, **kwargs):
+    schedule_image_variants(instance, "image")
+
+
+@receiver(post_delete, sender=Content)
+@receiver(post_delete, sender=AnswerOption)
+def delete_question_item_image_variants(sender, instance, **kwargs):
+    delete_image_variants(instance.image_variants, instance.image.storage)
@@ -0,0 +1,366 @@
+import json
+import os
+import shutil
+import zipfile
+from functools import partial
+
+import numpy as np
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Max
+
+from account.tasks import schedule_image_variants
+from tasks.utils import bump_content_version
+
+from .models import (
+    AnswerOption,
+    Content,
+    Question,
+    QuestionStatistics,
+    Test,
+    TestAnswer,
+    TestResult,
+    TestStatistics,
+)
+from .serializers import ImportTestSerializer
+from .utils import bump_test_versions
+
+TEST_IMPORT_PROGRESS_TIMEOUT = 86400
+
+
+def get_test_import_cache_key(import_id):
+    return f"test_import_{import_id}"
+
+
+def get_test_import_dir(import_id):
+    return os.path.join(settings.TEST_IMPORT_ROOT, import_id)
+
+
+def _set_test_import_progress(import_id, **progress):
+    cache.set(
+        get_test_import_cache_key(import_id),
+        progress,
+        timeout=TEST_IMPORT_PROGRESS_TIMEOUT,
+    )
+
+
+def _missing_media(test_data, media_names):
+    """
+    Return per-item errors for images the manifest references but the
+    archive does not contain.
+    """
+    errors = {}
+    for q_index, question in enumerate(test_data["questions"]):
+        for kind in ("contents", "answer_options"):
+            for index, item in enumerate(question.get(kind, [])):
+                image = item.get("image")
+                if image and image not in media_names:
+                    errors[f"questions[{q_index}].{kind}[{index}]"] = (
+                        f"Image '{image}' not found in the media archive."
+                    )
+    return errors
+
+
+def _store_image(archive, name, model, stored):
+    """
+    Stream an archive member to the storage of `model.image` and return the
+    stored name. Images shared by several rows are uploaded once.
+    """
+    key = (model, name)
+    if key not in stored:
+        field = model._meta.get_field("image")
+        with archive.open(name) as source:
+            stored[key] = field.storage.save(
+                field.generate_filename(None, os.path.basename(name)),
+                File(source, name=os.path.basename(name)),
+            )
+    return stored[key]
+
+
+@shared_task
+def import_test_bundle(import_id):
+    """
+    Import tests from a JSON manifest and an optional zip of images:
+    {"tests": [{"title": ..., "questions": [{"title": ...,
+        "contents": [{"content_type": "image", "image": "q1.png"}],
+        "answer_options": [{"option_type": "text", "text": "A", "is_correct": true}]
+    }]}]}
+    Invalid tests are skipped and reported; the valid ones are created with one
+    bulk_create per model.
+    """
+    import_dir = get_test_import_dir(import_id)
+    manifest_path = os.path.join(import_dir, "manifest.json")
+    media_path = os.path.join(import_dir, "media.zip")
+    archive = None
+
+    try:
+        _set_test_import_progress(import_id, status="running")
+
+        with open(manifest_path, "rb") as manifest_file:
+            manifest = json.load(manifest_file)
+        tests_data = manifest.get("tests") if isinstance(manifest, dict) else None
+        if not isinstance(tests_data, list):
+            raise ValueError("Manifest must be an object with a 'tests' list.")
+
+        if os.path.exists(media_path):
+            archive = zipfile.ZipFile(media_path)
+            media_names = set(archive.namelist())
+        else:
+            media_names = set()
+
+        errors = []
+        valid_tests = []
+        for index, test_data in enumerate(tests_data):
+            serializer = ImportTestSerializer(data=test_data)
+            if not serializer.is_valid():
+                errors.append({"item": f"tests[{index}]", "errors": serializer.errors})
+                continue
+            missing = _missing_media(serializer.validated_data, media_names)
+            if missing:
+                errors.append({"item": f"tests[{index}]", "errors": missing})
+                continue
+            valid_tests.append(serializer.validated_data)
+
+        # Uploads happen before the transaction so it is not held open on S3
+        stored_images = {}
+        for data in valid_tests:
+            for question_data in data["questions"]:
+                for kind, model in (
+                    ("contents", Content),
+                    ("answer_options", AnswerOption),
+                ):
+                    for item in question_data.get(kind, []):
+                        if item.get("image"):
+                            item["image"] = _store_image(
+                                archive, item["image"], model, stored_images
+                            )
+
+        with transaction.atomic():
+            tests = Test.objects.bulk_create(
+                [
+                    Test(**{k: v for k, v in data.items() if k != "questions"})
+                    for data in valid_tests
+                ]
+            )
+
+            questions = []
+            questions_data = []
+            for test, data in zip(tests, valid_tests):
+                for order, question_data in enumerate(data["questions"], start=1):
+                    fields = {
+                        k: v
+                        for k, v in question_data.items()
+                        if k not in ("contents", "answer_options")
+                    }
+                    fields.setdefault("order", order)
+                    questions.append(Question(test=test, **fields))
+                    questions_data.append(question_data)
+            questions = Question.objects.bulk_create(questions)
+
+            contents = []
+            answer_options = []
+            for question, question_data in zip(questions, questions_data):
+                contents += [
+                    Content(question=question, **{"order": order, **content})
+                    for order, content in enumerate(
+                        question_data.get("contents", []), start=1
+                    )
+                ]
+                answer_options += [
+                    AnswerOption(question=question, **option)
+                    for option in question_data.get("answer_options", [])
+                ]
+            Content.objects.bulk_create(contents)
+            AnswerOption.objects.bulk_create(answer_options)
+
+            # bulk_create skips post_save, so variants are queued and the
+            # content and test versions are bumped here
+            for item in contents + answer_options:
+                if item.image:
+                    schedule_image_variants(item, "image")
+            transaction.on_commit(bump_content_version)
+            transaction.on_commit(
+                partial(bump_test_versions, [test.pk for test in tests])
+            )
+
+        report = {
+            "status": "finished",
+            "tests": [test.pk for test in tests],
+            "questions": len(questions),
+            "contents": len(contents),
+            "answer_options": len(answer_options),
+            "errors": errors,
+        }
+        _set_test_import_progress(import_id, **report)
+        return report
+    except Exception as e:
+        print(f"Test import {import_id} failed: {e}")
+        _set_test_import_progress(import_id, status="failed", error=str(e))
+        raise
+    finally:
+        if archive is not None:
+            archive.close()
+        shutil.rmtree(import_dir, ignore_errors=True)
+
+
+SCORE_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def _nan_to_none(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _compute_item_analysis(test_id):
+    """
+    Load the finished attempts of a test into an attempts x questions matrix
+    and compute the statistics column-wise.
+    """
+    results = np.array(
+        TestResult.objects.filter(test_id=test_id, is_finished=True).values_list(
+            "id", "score"
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    question_ids = np.array(
+        Question.objects.filter(test_id=test_id).values_list("id", flat=True),
+        dtype=np.int64,
+    )
+    answers = np.array(
+        TestAnswer.objects.filter(
+            test_result__test_id=test_id, test_result__is_finished=True
+        ).values_list(
+            "id", "test_result_id", "question_id", "answer_option_id", "is_correct"
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 5)
+
+    # Answers of questions deleted since the attempt are ignored
+    answers = answers[np.isin(answers[:, 2], question_ids)]
+    results = results[np.argsort(results[:, 0])]
+    question_ids = np.sort(question_ids)
+    rows = np.searchsorted(results[:, 0], answers[:, 1])
+    cols = np.searchsorted(question_ids, answers[:, 2])
+    scores = results[:, 1]
+
+    answered = np.zeros((len(results), len(question_ids)), dtype=bool)
+    correct = np.zeros((len(results), len(question_ids)), dtype=float)
+    answered[rows, cols] = True
+    correct[rows, cols] = answers[:, 4]
+
+    responses = answered.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        difficulty = correct.sum(axis=0) / responses
+
+        # Corrected point-biserial: each item against the rest of the score
+        rest = correct.sum(axis=1)[:, None] - correct
+        item_dev = correct - correct.mean(axis=0)
+        rest_dev = rest - rest.mean(axis=0)
+        discrimination = (item_dev * rest_dev).sum(axis=0) / np.sqrt(
+            (item_dev**2).sum(axis=0) * (rest_dev**2).sum(axis=0)
+        )
+
+    option_keys, option_counts = np.unique(
+        answers[:, [2, 3]], axis=0, return_counts=True
+    )
+    distributions = {}
+    for (question_id, option_id), count in zip(option_keys, option_counts):
+        distributions.setdefault(int(question_id), {})[str(option_id)] = int(count)
+
+    question_stats = [
+        QuestionStatistics(
+            question_id=int(question_id),
+            test_id=test_id,
+            responses=int(responses[index]),
+            difficulty=_nan_to_none(difficulty[index]),
+            discrimination=_nan_to_none(discrimination[index]),
+            option_distribution=distributions.get(int(question_id), {}),
+        )
+        for index, question_id in enumerate(question_ids)
+    ]
+
+    if len(scores):
+        percentiles = np.percentile(scores, SCORE_PERCENTILES)
+        score_percentiles = {
+            f"p{p}": round(float(value), 2)
+            for p, value in zip(SCORE_PERCENTILES, percentiles)
+        }
+        mean_score = round(float(scores.mean()), 2)
+    else:
+        score_percentiles = {}
+        mean_score = 0
+
+    test_stats = TestStatistics(
+        test_id=test_id,
+        attempts=len(scores),
+        mean_score=mean_score,
+        score_percentiles=score_percentiles,
+        last_answer_id=int(answers[:, 0].max()) if len(answers) else 0,
+    )
+    return test_stats, question_stats
+
+
+@shared_task
+def compute_test_statistics(test_ids=None):
+    """
+    Refresh item analysis for every test whose finished attempts changed since
+    the last run. One test is held in memory at a time.
+    """
+    fingerprints = TestAnswer.objects.filter(test_result__is_finished=True)
+    if test_ids:
+        fingerprints = fingerprints.filter(test_result__test_id__in=test_ids)
+    fingerprints = fingerprints.values("test_result__test_id").annotate(
+        last_answer_id=Max("id"), attempts=Count("test_result", distinct=True)
+    )
+    computed = {
+        stats["test_id"]: (stats["last_answer_id"], stats["attempts"])
+        for stats in TestStatistics.objects.values(
+            "test_id", "last_answer_id", "attempts"
+        )
+    }
+
+    refreshed = []
+    for fingerprint in fingerprints:
+        test_id = fingerprint["test_result__test_id"]
+        if computed.get(test_id) == (
+            fingerprint["last_answer_id"],
+            fingerprint["attempts"],
+        ):
+            continue
+
+        test_stats, question_stats = _compute_item_analysis(test_id)
+        with transaction.atomic():
+            TestStatistics.objects.bulk_create(
+                [test_stats],
+                update_conflicts=True,
+                unique_fields=["test"],
+                update_fields=[
+                    "attempts",
+                    "mean_score",
+                    "score_percentiles",
+                    "last_answer_id",
+                    "computed_at",
+                ],
+            )
+            QuestionStatistics.objects.filter(test_id=test_id).exclude(
+                question_id__in=[stats.question_id for stats in question_stats]
+            ).delete()
+            QuestionStatistics.objects.bulk_create(
+                question_stats,
+                update_conflicts=True,
+                unique_fields=["question"],
+                update_fields=[
+                    "test",
+                    "responses",
+                    "difficulty",
+                    "discrimination",
+                    "option_distribution",
+                    "computed_at",
+                ],
+            )
+        refreshed.append(test_id)
+
+    print(f"Test statistics refreshed for {len(refreshed)} tests")
+    return refreshed
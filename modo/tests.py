@@ -1,3 +1,657 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from account.cache import add_to_learner_cache_index, get_learner_cache_index_key
+from account.models import Child, Parent, User
+from tasks.utils import get_content_version
+
+from .models import (
+    AnswerOption,
+    Content,
+    Question,
+    QuestionStatistics,
+    Test,
+    TestAnswer,
+    TestCategory,
+    TestResult,
+    TestStatistics,
+)
+from .tasks import compute_test_statistics, get_test_import_dir, import_test_bundle
+from .utils import get_test_version_cache_key
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SubmitTestAnswersTest(TestCase):
+    url = "/api/modo/submit-answers/"
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create(username="student", role="student")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.test = Test.objects.create(title="Test")
+        self.options = {}
+        for order in (1, 2):
+            question = Question.objects.create(
+                test=self.test, title=f"Question {order}", order=order
+            )
+            self.options[order] = (
+                AnswerOption.objects.create(question=question, is_correct=True),
+                AnswerOption.objects.create(question=question, is_correct=False),
+            )
+
+    def answer(self, order, correct=True):
+        option = self.options[order][0 if correct else 1]
+        return {"question": option.question_id, "answer_option": option.pk}
+
+    def submit(self, *answers, finish=False):
+        return self.client.post(
+            self.url,
+            {"test": self.test.pk, "answers": list(answers), "finish": finish},
+            format="json",
+        )
+
+    def cache_learner_views(self):
+        for user_id in (self.student.id, self.student.id + 1):
+            cache_key = f"sections_user_{user_id}"
+            cache.set(cache_key, "cached")
+            add_to_learner_cache_index(get_learner_cache_index_key(user_id), cache_key)
+
+    def test_whole_attempt_in_one_request(self):
+        response = self.submit(self.answer(1), self.answer(2, correct=False))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.json(),
+            {
+                "attempt_number": 1,
+                "is_finished": True,
+                "score": 50,
+                "total_questions": 2,
+                "correct_answers": 1,
+            },
+        )
+        self.assertEqual(TestAnswer.objects.filter(user=self.student).count(), 2)
+
+    def test_chunks_update_changed_answers(self):
+        response = self.submit(self.answer(1, correct=False))
+
+        self.assertFalse(response.json()["is_finished"])
+        self.assertEqual(response.json()["correct_answers"], 0)
+        self.cache_learner_views()
+
+        response = self.submit(self.answer(1), self.answer(2))
+
+        self.assertTrue(response.json()["is_finished"])
+        self.assertEqual(response.json()["correct_answers"], 2)
+        self.assertEqual(response.json()["score"], 100)
+        result = TestResult.objects.get()
+        self.assertEqual(result.answered_questions, 2)
+        self.assertEqual(result.answers.count(), 2)
+        # Finishing drops the cached views of that learner only
+        self.assertIsNone(cache.get(f"sections_user_{self.student.id}"))
+        self.assertEqual(cache.get(f"sections_user_{self.student.id + 1}"), "cached")
+
+    def test_finish_closes_attempt_and_next_answers_start_another(self):
+        response = self.submit(self.answer(1), finish=True)
+
+        self.assertTrue(response.json()["is_finished"])
+        self.assertEqual(response.json()["score"], 50)
+
+        response = self.submit(self.answer(1, correct=False))
+
+        self.assertEqual(response.json()["attempt_number"], 2)
+        self.assertFalse(response.json()["is_finished"])
+        self.assertEqual(TestAnswer.objects.count(), 2)
+
+    def test_option_of_another_question_rejected(self):
+        answer = self.answer(1)
+        answer["answer_option"] = self.options[2][0].pk
+
+        response = self.submit(answer, self.answer(2))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["questions"], [answer["question"]])
+        self.assertFalse(TestResult.objects.exists())
+        self.assertFalse(TestAnswer.objects.exists())
+
+    def test_parent_answers_for_own_child_only(self):
+        parent = User.objects.create(username="parent", role="parent")
+        child = Child.objects.create(
+            parent=Parent.objects.create(user=parent), first_name="A", grade=5
+        )
+        other_child = Child.objects.create(
+            parent=Parent.objects.create(
+                user=User.objects.create(username="other", role="parent")
+            ),
+            first_name="B",
+            grade=5,
+        )
+        self.client.force_authenticate(parent)
+
+        response = self.client.post(
+            f"{self.url}?child_id={child.pk}",
+            {"test": self.test.pk, "answers": [self.answer(1)]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(TestAnswer.objects.filter(child=child).exists())
+
+        response = self.client.post(
+            f"{self.url}?child_id={other_child.pk}",
+            {"test": self.test.pk, "answers": [self.answer(1)]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class AnswerQuestionTest(TestCase):
+    url = "/api/modo/answer-question/"
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create(username="student", role="student")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.test = Test.objects.create(title="Test")
+        self.questions = [self.add_question(order) for order in (1, 2)]
+
+    def add_question(self, order):
+        question = Question.objects.create(
+            test=self.test, title=f"Question {order}", order=order
+        )
+        return (
+            question,
+            AnswerOption.objects.create(question=question, is_correct=True),
+            AnswerOption.objects.create(question=question, is_correct=False),
+        )
+
+    def answer(self, index, correct=True):
+        question, right, wrong = self.questions[index]
+        response = self.client.post(
+            f"{self.url}?question_id={question.pk}",
+            {"answer_option": (right if correct else wrong).pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return TestResult.objects.order_by("-attempt_number").first()
+
+    def assertProgress(self, result, answered, correct, score, is_finished):
+        self.assertEqual(
+            (
+                result.answered_questions,
+                result.correct_answers,
+                result.score,
+                result.is_finished,
+            ),
+            (answered, correct, score, is_finished),
+        )
+
+    def test_changed_answer_adjusts_score(self):
+        self.assertProgress(self.answer(0), 1, 1, 50, False)
+        self.assertProgress(self.answer(0, correct=False), 1, 0, 0, False)
+        self.assertProgress(self.answer(0), 1, 1, 50, False)
+        self.assertEqual(TestAnswer.objects.count(), 1)
+
+    def test_last_question_finishes_attempt(self):
+        self.answer(0, correct=False)
+        self.assertProgress(self.answer(1), 2, 1, 50, True)
+
+        result = self.answer(0)
+
+        self.assertEqual(result.attempt_number, 2)
+        self.assertProgress(result, 1, 1, 50, False)
+
+    def test_added_question_counts_towards_score(self):
+        self.answer(0)
+        self.questions.append(self.add_question(3))
+
+        result = self.answer(1)
+
+        self.assertEqual(result.total_questions, 3)
+        self.assertProgress(result, 2, 2, 67, False)
+
+    def test_option_of_another_question_not_found(self):
+        question = self.questions[0][0]
+        response = self.client.post(
+            f"{self.url}?question_id={question.pk}",
+            {"answer_option": self.questions[1][1].pk},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(TestResult.objects.exists())
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TestListOverlayTest(TestCase):
+    url = "/api/modo/tests/"
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create(username="student", role="student")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.category = TestCategory.objects.create(name="Category")
+        self.first = Test.objects.create(title="First", category=self.category, order=1)
+        self.second = Test.objects.create(
+            title="Second", category=self.category, order=2
+        )
+        self.question = Question.objects.create(test=self.first, title="Question")
+
+    def add_result(self, user, test, attempt_number, **fields):
+        result = TestResult.objects.create(
+            user=user, test=test, attempt_number=attempt_number, **fields
+        )
+        # Distinct timestamps keep the latest attempt first
+        TestResult.objects.filter(pk=result.pk).update(
+            date_taken=datetime(2024, 9, attempt_number)
+        )
+
+    def get_list(self):
+        response = self.client.get(self.url, {"category_id": self.category.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {test["title"]: test for test in response.json()}
+
+    def test_results_of_the_learner_overlaid(self):
+        self.add_result(
+            self.student,
+            self.first,
+            1,
+            is_finished=True,
+            total_questions=4,
+            correct_answers=4,
+        )
+        self.add_result(
+            self.student, self.first, 2, total_questions=4, correct_answers=1
+        )
+        other = User.objects.create(username="other", role="student")
+        self.add_result(other, self.second, 1, is_finished=True, total_questions=1)
+
+        tests = self.get_list()
+
+        self.assertTrue(tests["First"]["is_finished"])
+        self.assertEqual(tests["First"]["score_percentage"], 25)
+        self.assertEqual(
+            [result["attempt_number"] for result in tests["First"]["test_results"]],
+            [2, 1],
+        )
+        self.assertEqual(tests["First"]["questions"][0]["title"], "Question")
+        self.assertEqual(
+            (
+                tests["Second"]["is_finished"],
+                tests["Second"]["score_percentage"],
+                tests["Second"]["test_results"],
+            ),
+            (False, 0.0, []),
+        )
+
+    def test_body_cached_until_test_changes(self):
+        self.get_list()
+
+        with CaptureQueriesContext(connection) as queries:
+            tests = self.get_list()
+        self.assertFalse(
+            [query for query in queries if "modo_question" in query["sql"]]
+        )
+        self.assertEqual(tests["First"]["questions"][0]["title"], "Question")
+
+        self.question.title = "Renamed"
+        self.question.save()
+
+        tests = self.get_list()
+        self.assertEqual(tests["First"]["questions"][0]["title"], "Renamed")
+
+    def test_parent_needs_child_id(self):
+        self.client.force_authenticate(
+            User.objects.create(username="parent", role="parent")
+        )
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TestReviewTest(TestCase):
+    url = "/api/modo/test-review/"
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create(username="student", role="student")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.test = Test.objects.create(title="Test")
+        self.options = []
+        for order in (1, 2):
+            question = Question.objects.create(
+                test=self.test, title=f"Question {order}", order=order
+            )
+            self.options.append(
+                (
+                    AnswerOption.objects.create(question=question, is_correct=True),
+                    AnswerOption.objects.create(question=question, is_correct=False),
+                )
+            )
+        # First attempt all correct, second one wrong on the first question
+        self.attempts = [
+            self.submit([option for option, _ in self.options]),
+            self.submit([self.options[0][1]], finish=True),
+        ]
+
+    def submit(self, options, finish=False):
+        response = self.client.post(
+            "/api/modo/submit-answers/",
+            {
+                "test": self.test.pk,
+                "answers": [
+                    {"question": option.question_id, "answer_option": option.pk}
+                    for option in options
+                ],
+                "finish": finish,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return options
+
+    def review(self, **params):
+        response = self.client.get(self.url, {"test_id": self.test.pk, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_full_review_lists_answers_of_the_attempt(self):
+        for attempt_number, options in enumerate(self.attempts, start=1):
+            with self.subTest(attempt_number=attempt_number):
+                review = self.review(attempt_number=attempt_number)
+                self.assertEqual(review["attempt_number"], attempt_number)
+                self.assertEqual(
+                    [
+                        (answer["question"]["id"], answer["answer_option"]["id"])
+                        for answer in review["test_answers"]
+                    ],
+                    [(option.question_id, option.pk) for option in options],
+                )
+
+    def test_compact_review_references_the_test_body(self):
+        review = self.review(compact="true")
+
+        self.assertEqual(review["result"]["attempt_number"], 2)
+        self.assertEqual(review["result"]["score"], 0)
+        self.assertEqual(
+            [question["title"] for question in review["test"]["questions"]],
+            ["Question 1", "Question 2"],
+        )
+        wrong = self.options[0][1]
+        self.assertEqual(
+            review["answers"],
+            [
+                {
+                    "question": wrong.question_id,
+                    "answer_option": wrong.pk,
+                    "is_correct": False,
+                }
+            ],
+        )
+
+    def test_missing_attempt_not_found(self):
+        for params in ({"attempt_number": 3}, {"test_id": self.test.pk + 1}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    self.url, {"test_id": self.test.pk, **params}
+                )
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class UpdateTestOrderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username="staff", is_superuser=True)
+        )
+        self.category = TestCategory.objects.create(name="Category")
+        self.first = Test.objects.create(title="First", category=self.category, order=1)
+        self.second = Test.objects.create(
+            title="Second", category=self.category, order=2
+        )
+
+    def update_order(self, orders):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f"/api/modo/tests/update-test-order/?category_id={self.category.pk}",
+                [{"id": pk, "order": order} for pk, order in orders],
+                format="json",
+            )
+
+    def get_list(self, **headers):
+        return self.client.get(
+            "/api/modo/tests/", {"category_id": self.category.pk}, headers=headers
+        )
+
+    def test_reorder_changes_test_list_etag(self):
+        response = self.get_list()
+        etag = response["ETag"]
+
+        response = self.update_order([(self.first.pk, 2), (self.second.pk, 1)])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.get_list(if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [test["title"] for test in response.json()], ["Second", "First"]
+        )
+
+    def assert_orders(self, *orders):
+        self.assertEqual(
+            list(Test.objects.order_by("pk").values_list("order", flat=True)),
+            list(orders),
+        )
+
+    def test_unknown_or_foreign_tests_roll_back(self):
+        other = Test.objects.create(
+            title="Other", category=TestCategory.objects.create(name="Other"), order=1
+        )
+
+        for pk in (other.pk, other.pk + 1):
+            with self.subTest(pk=pk):
+                response = self.update_order([(self.first.pk, 2), (pk, 1)])
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assert_orders(1, 2, 1)
+
+    def test_repeated_test_takes_last_order(self):
+        response = self.update_order(
+            [(self.first.pk, 5), (self.second.pk, 1), (self.first.pk, 2)]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_orders(2, 1)
+
+    def test_missing_order_rejected(self):
+        response = self.client.patch(
+            f"/api/modo/tests/update-test-order/?category_id={self.category.pk}",
+            [{"id": self.first.pk, "order": 2}, {"id": self.second.pk}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assert_orders(1, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ImportTestBundleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        import_root = tempfile.TemporaryDirectory()
+        self.addCleanup(import_root.cleanup)
+        settings_override = override_settings(TEST_IMPORT_ROOT=import_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def run_import(self, manifest):
+        import_dir = get_test_import_dir("bundle")
+        os.makedirs(import_dir)
+        with open(os.path.join(import_dir, "manifest.json"), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_test_bundle("bundle")
+
+    def test_import_creates_numbered_rows_and_bumps_versions(self):
+        content_version = get_content_version()
+
+        report = self.run_import(
+            {
+                "tests": [
+                    {
+                        "title": "Imported",
+                        "questions": [
+                            {
+                                "title": "Question",
+                                "contents": [
+                                    {"content_type": "text", "text": "First"},
+                                    {"content_type": "text", "text": "Second"},
+                                ],
+                                "answer_options": [
+                                    {
+                                        "option_type": "text",
+                                        "text": "A",
+                                        "is_correct": True,
+                                    }
+                                ],
+                            }
+                        ],
+                    },
+                    {"questions": []},
+                ]
+            }
+        )
+
+        self.assertEqual(report["status"], "finished")
+        self.assertEqual(len(report["errors"]), 1)
+        test = Test.objects.get(pk__in=report["tests"])
+        self.assertEqual(
+            list(Content.objects.order_by("order").values_list("text", "order")),
+            [("First", 1), ("Second", 2)],
+        )
+        self.assertEqual(AnswerOption.objects.get().question.test, test)
+        self.assertNotEqual(get_content_version(), content_version)
+        self.assertIsNotNone(cache.get(get_test_version_cache_key(test.pk)))
+
+
+class ComputeTestStatisticsTest(TestCase):
+    def setUp(self):
+        self.student = User.objects.create(username="student", role="student")
+        self.test = Test.objects.create(title="Test")
+        self.options = []
+        for order in range(1, 5):
+            question = Question.objects.create(
+                test=self.test, title=f"Question {order}", order=order
+            )
+            self.options.append(
+                (
+                    AnswerOption.objects.create(question=question, is_correct=True),
+                    AnswerOption.objects.create(question=question, is_correct=False),
+                )
+            )
+        # The last question is answered correctly in every attempt
+        for attempt_number, correct in enumerate(
+            ([1, 1, 1, 1], [1, 1, 0, 1], [1, 0, 0, 1], [0, 0, 0, 1]), start=1
+        ):
+            self.add_attempt(attempt_number, correct)
+        self.add_attempt(5, [0, 0, 0, 0], is_finished=False)
+
+    def add_attempt(self, attempt_number, correct, is_finished=True):
+        result = TestResult.objects.create(
+            test=self.test,
+            user=self.student,
+            attempt_number=attempt_number,
+            is_finished=is_finished,
+            score=sum(correct) * 25,
+        )
+        TestAnswer.objects.bulk_create(
+            TestAnswer(
+                test_result=result,
+                user=self.student,
+                question_id=right.question_id,
+                answer_option=right if is_correct else wrong,
+                is_correct=is_correct,
+            )
+            for (right, wrong), is_correct in zip(self.options, correct)
+        )
+
+    def test_item_analysis_of_finished_attempts(self):
+        self.assertEqual(compute_test_statistics(), [self.test.pk])
+
+        test_stats = TestStatistics.objects.get(test=self.test)
+        self.assertEqual(test_stats.attempts, 4)
+        self.assertEqual(test_stats.mean_score, 62.5)
+        self.assertEqual(test_stats.score_percentiles["p50"], 62.5)
+        stats = list(
+            QuestionStatistics.objects.order_by("question__order").values_list(
+                "responses", "difficulty", "discrimination"
+            )
+        )
+        self.assertEqual(
+            stats,
+            [(4, 0.75, 0.5222), (4, 0.5, 0.7071), (4, 0.25, 0.5222), (4, 1.0, None)],
+        )
+        right, wrong = self.options[0]
+        self.assertEqual(
+            QuestionStatistics.objects.get(question=right.question).option_distribution,
+            {str(right.pk): 3, str(wrong.pk): 1},
+        )
+
+    def test_only_changed_tests_recomputed(self):
+        compute_test_statistics()
+
+        self.assertEqual(compute_test_statistics(), [])
+
+        self.add_attempt(6, [1, 1, 1, 1])
+
+        self.assertEqual(compute_test_statistics(), [self.test.pk])
+        self.assertEqual(TestStatistics.objects.get().attempts, 5)
+
+    def test_statistics_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="staff", is_staff=True))
+        url = f"/api/modo/tests/{self.test.pk}/statistics/"
+
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        compute_test_statistics()
+        response = client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["attempts"], 4)
+        self.assertEqual(
+            [question["title"] for question in response.json()["questions"]],
+            ["Question 1", "Question 2", "Question 3", "Question 4"],
+        )
+
+        client.force_authenticate(self.student)
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
@@ -8,6 +8,7 @@ from .views import (
     ContentViewSet,
     AnswerOptionViewSet,
     AnswerQuestionAPIView,
+    SubmitTestAnswersAPIView,
 )
 
 router = DefaultRouter()
@@ -21,5 +22,6 @@ router.register(r"answer-options", AnswerOptionViewSet)
 urlpatterns = [
     path("", include(router.urls)),
     path("answer-question/", AnswerQuestionAPIView.as_view(), name="answer-question"),
+    path("submit-answers/", SubmitTestAnswersAPIView.as_view(), name="submit-answers"),
     path("test-review/", TestReviewAPIView.as_view(), name="test-review"),
 ]
@@ -1,6 +1,10 @@
 import re
+import uuid
 from collections import defaultdict
 
+from django.core.cache import cache
+from django.db.models import Prefetch
+
 
 def parse_nested_form_data(data, files=None):
     """
@@ -111,3 +115,111 @@ def get_language_display_name(language_code):
         "ru": "Russian",
     }
     return language_names.get(language_code, language_code.upper())
+
+
+def get_test_version_cache_key(test_id):
+    """
+    Generate a cache key for the content version of a test.
+    """
+    return f"test_version_{test_id}"
+
+
+def get_test_version(test_id):
+    """
+    Return the current content version of a test. The version changes every
+    time the test, its questions, contents or answer options change, so
+    anything cached under it never has to be deleted explicitly.
+    """
+    cache_key = get_test_version_cache_key(test_id)
+    version = cache.get(cache_key)
+    if version is None:
+        cache.add(cache_key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(cache_key)
+    return version
+
+
+def get_test_versions(test_ids):
+    """
+    Return {test_id: version} for several tests with one cache round trip.
+    """
+    keys = {get_test_version_cache_key(test_id): test_id for test_id in test_ids}
+    versions = cache.get_many(keys.keys())
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_test_version(test_id):
+    cache.set(get_test_version_cache_key(test_id), uuid.uuid4().hex, timeout=None)
+
+
+def bump_test_versions(test_ids):
+    cache.set_many(
+        {get_test_version_cache_key(test_id): uuid.uuid4().hex for test_id in test_ids},
+        timeout=None,
+    )
+
+
+def get_test_questions_count(test_id):
+    """
+    Return the number of questions in a test, cached per test version.
+    """
+    from .models import Question
+
+    cache_key = f"test_questions_count_{test_id}_{get_test_version(test_id)}"
+    count = cache.get(cache_key)
+    if count is None:
+        count = Question.objects.filter(test_id=test_id).count()
+        cache.set(cache_key, count, timeout=3600)
+    return count
+
+
+# Media URLs in the body come from the storage's URL cache, which hands out
+# URLs valid for at least PRESIGNED_URL_CACHE_MARGIN, so the body must expire
+# sooner
+TEST_BODY_CACHE_TIMEOUT = 1800
+
+
+def get_test_body_cache_key(test_id, version):
+    return f"test_body_{test_id}_{version}"
+
+
+def get_test_bodies(test_ids):
+    """
+    Return {test_id: serialized test body} with questions, contents and answer
+    options. Bodies hold nothing learner specific and are cached per test
+    version; missing ones are built together with a fixed number of queries.
+    """
+    from .models import Question, Test
+    from .serializers import TestBodySerializer
+
+    versions = get_test_versions(test_ids)
+    keys = {
+        get_test_body_cache_key(test_id, version): test_id
+        for test_id, version in versions.items()
+    }
+    bodies = {keys[key]: body for key, body in cache.get_many(keys.keys()).items()}
+
+    missing = [test_id for test_id in test_ids if test_id not in bodies]
+    if missing:
+        tests = Test.objects.filter(pk__in=missing).prefetch_related(
+            Prefetch(
+                "questions",
+                queryset=Question.objects.prefetch_related(
+                    "contents", "answer_options"
+                ),
+            )
+        )
+        built = {test.pk: TestBodySerializer(test).data for test in tests}
+        cache.set_many(
+            {
+                get_test_body_cache_key(test_id, versions[test_id]): body
+                for test_id, body in built.items()
+            },
+            timeout=TEST_BODY_CACHE_TIMEOUT,
+        )
+        bodies.update(built)
+
+    return bodies
@@ -1,12 +1,21 @@
 import json
+import os
+import uuid
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from drf_spectacular.utils import extend_schema
 from pprint import pprint
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
 
+from account.cache import delete_learner_cache
 from account.models import Child, User
+from account.serializers import DirectUploadSerializer
+from account.utils import create_direct_upload, reorder
+from tasks.utils import ContentETagMixin, bump_content_version
 from .models import (
     TestAnswer,
     Test,
@@ -15,25 +24,48 @@ from .models import (
     AnswerOption,
     TestResult,
     TestCategory,
+    TestStatistics,
     TEST_TYPE,
 )
 from .serializers import (
     FullTestCreateSerializer,
     FullTestUpdateSerializer,
+    ShortTestResultSerializer,
     SingleTestQuestionSerializer,
+    TestAnswersSubmitSerializer,
     TestCategorySerializer,
+    TestImportSerializer,
     TestResultSerializer,
     TestSerializer,
+    TestStatisticsSerializer,
     TestQuestionSerializer,
     ContentSerializer,
     AnswerOptionSerializer,
     FullQuestionCreateSerializer,
     FullQuestionUpdateSerializer
 )
-from account.permissions import IsParent, IsStudent, IsSuperUserOrStaffOrReadOnly
+from account.permissions import (
+    IsParent,
+    IsStaff,
+    IsStudent,
+    IsSuperUser,
+    IsSuperUserOrStaffOrReadOnly,
+)
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
-from .utils import clean_parsed_data, parse_nested_form_data
+from .tasks import (
+    TEST_IMPORT_PROGRESS_TIMEOUT,
+    get_test_import_cache_key,
+    get_test_import_dir,
+    import_test_bundle,
+)
+from .utils import (
+    bump_test_versions,
+    clean_parsed_data,
+    get_test_bodies,
+    get_test_questions_count,
+    parse_nested_form_data,
+)
 
 from rest_framework.response import Response
 
@@ -42,7 +74,7 @@ MAX_CONTENTS = 8
 VALID_TEST_TYPES = [choice[0] for choice in TEST_TYPE]
 
 
-class TestViewSet(viewsets.ModelViewSet):
+class TestViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Test.objects.all()
     serializer_class = TestSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -69,6 +101,79 @@ class TestViewSet(viewsets.ModelViewSet):
             TestSerializer(test, context={"request": request}).data, status=201
         )
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import-bundle",
+        parser_classes=[MultiPartParser],
+    )
+    def import_bundle(self, request, *args, **kwargs):
+        """
+        Accepts `manifest` (JSON) and optional `media` (zip of images) and
+        imports them in the background. Poll `import-status` for the report.
+        """
+        serializer = TestImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        import_id = uuid.uuid4().hex
+        import_dir = get_test_import_dir(import_id)
+        os.makedirs(import_dir)
+        uploads = {
+            "manifest.json": serializer.validated_data["manifest"],
+            "media.zip": serializer.validated_data.get("media"),
+        }
+        for filename, upload in uploads.items():
+            if upload is None:
+                continue
+            with open(os.path.join(import_dir, filename), "wb") as destination:
+                for chunk in upload.chunks():
+                    destination.write(chunk)
+
+        cache.set(
+            get_test_import_cache_key(import_id),
+            {"status": "scheduled"},
+            timeout=TEST_IMPORT_PROGRESS_TIMEOUT,
+        )
+        import_test_bundle.delay(import_id)
+        return Response(
+            {"message": "Test import has been scheduled", "import_id": import_id},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="import-status",
+        permission_classes=[IsSuperUser | IsStaff],
+    )
+    def import_status(self, request, *args, **kwargs):
+        import_id = request.query_params.get("import_id")
+        progress = cache.get(get_test_import_cache_key(import_id))
+        if progress is None:
+            return Response(
+                {"error": "No import found with this id"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(progress, status=status.HTTP_200_OK)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="statistics",
+        permission_classes=[IsSuperUser | IsStaff],
+    )
+    def statistics(self, request, *args, **kwargs):
+        test = self.get_object()
+        test_statistics = TestStatistics.objects.filter(test=test).first()
+        if test_statistics is None:
+            return Response(
+                {"error": "Statistics have not been computed for this test yet"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            TestStatisticsSerializer(test_statistics).data, status=status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=["put"], url_path="update-full")
     def update_full(self, request, *args, **kwargs):
         test = self.get_object()
@@ -103,34 +208,32 @@ class TestViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # все тесты должны принадлежать одной категории
-            test_ids = [item.get("id") for item in order_data if item.get("id")]
-            if test_ids:
-                tests_in_category = Test.objects.filter(
-                    id__in=test_ids, 
-                    category_id=category_id
-                ).count()
-                
-                if tests_in_category != len(test_ids):
+            orders = {}
+            for item in order_data:
+                test_id = item.get("id")
+                new_order = item.get("order")
+
+                if not test_id or new_order is None:
                     return Response(
-                        {"error": "All tests must belong to the specified category"},
+                        {"error": "ID and new order are required"},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
+                orders[int(test_id)] = new_order
 
+            # все тесты должны принадлежать одной категории
             with transaction.atomic():
-                for item in order_data:
-                    test_id = item.get("id")
-                    new_order = item.get("order")
-
-                    if not test_id or new_order is None:
-                        return Response(
-                            {"error": "ID and new order are required"},
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
+                updated = reorder(Test.objects.filter(category_id=category_id), orders)
+                if updated != len(orders):
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": "All tests must belong to the specified category"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
-                    test = get_object_or_404(Test, id=int(test_id), category_id=category_id)
-                    test.order = new_order
-                    test.save()
+                # The bulk UPDATE skips post_save, so the test list ETags are
+                # invalidated here
+                transaction.on_commit(bump_content_version)
+            bump_test_versions(orders.keys())
 
             return Response(
                 {"message": "Test order updated successfully within category"}, status=status.HTTP_200_OK
@@ -156,19 +259,71 @@ class TestViewSet(viewsets.ModelViewSet):
                 )
             queryset = queryset.filter(test_type=test_type)
 
-        child_id = request.query_params.get("child_id")
-        serializer = self.get_serializer(
-            queryset, context={"request": self.request, "child_id": child_id}, many=True
-        )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        test_ids = list(queryset.values_list("id", flat=True))
+        return Response(self._get_tests_data(test_ids), status=status.HTTP_200_OK)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        child_id = request.query_params.get("child_id")
-        serializer = self.get_serializer(
-            instance, context={"request": self.request, "child_id": child_id}
+        return Response(
+            self._get_tests_data([instance.id])[0], status=status.HTTP_200_OK
         )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def _get_tests_data(self, test_ids):
+        """
+        Merge the cached test bodies with the learner's results, which are
+        read for all tests in one query.
+        """
+        bodies = get_test_bodies(test_ids)
+        results_by_test = self._get_learner_results(test_ids)
+
+        data = []
+        for test_id in test_ids:
+            results = results_by_test.get(test_id)
+            if results is None:
+                overlay = {
+                    "is_finished": False,
+                    "score_percentage": None,
+                    "test_results": [],
+                }
+            else:
+                latest = results[0] if results else None
+                overlay = {
+                    "is_finished": any(result["is_finished"] for result in results),
+                    "score_percentage": (
+                        latest["correct_answers"] / latest["total_questions"] * 100
+                        if latest and latest["total_questions"] > 0
+                        else 0.0
+                    ),
+                    "test_results": results,
+                }
+            data.append({**bodies[test_id], **overlay})
+        return data
+
+    def _get_learner_results(self, test_ids):
+        """
+        Return {test_id: [result, ...]} ordered from the latest attempt, or an
+        empty dict when the user is not a learner.
+        """
+        user = self.request.user
+        if user.is_parent:
+            child_id = self.request.query_params.get("child_id")
+            if not child_id:
+                raise ValidationError("Child ID is required for parent users.")
+            learner_filter = {"child__id": child_id}
+        elif user.is_student:
+            learner_filter = {"user": user}
+        else:
+            return {}
+
+        results_by_test = {test_id: [] for test_id in test_ids}
+        results = (
+            TestResult.objects.filter(test_id__in=test_ids, **learner_filter)
+            .order_by("test_id", "-date_taken")
+            .values("test_id", *ShortTestResultSerializer.Meta.fields)
+        )
+        for result in results:
+            results_by_test[result.pop("test_id")].append(result)
+        return results_by_test
 
 
 class QuestionViewSet(viewsets.ModelViewSet):
@@ -231,7 +386,33 @@ class QuestionViewSet(viewsets.ModelViewSet):
 
 
 
-class ContentViewSet(viewsets.ModelViewSet):
+class ImageUploadURLMixin:
+    @action(detail=False, methods=["post"], url_path="upload-url")
+    def upload_url(self, request, *args, **kwargs):
+        """
+        Presign a direct image upload to storage. The returned `upload_token`
+        is then sent as `image` to create or partial_update.
+        """
+        serializer = DirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data["content_type"].startswith("image/"):
+            return Response(
+                {"detail": "Only images can be uploaded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            upload = create_direct_upload(
+                self.queryset.model._meta.get_field("image"),
+                **serializer.validated_data,
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"detail": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(upload, status=status.HTTP_200_OK)
+
+
+class ContentViewSet(ImageUploadURLMixin, viewsets.ModelViewSet):
     queryset = Content.objects.all()
     serializer_class = ContentSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -253,7 +434,7 @@ class ContentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class AnswerOptionViewSet(viewsets.ModelViewSet):
+class AnswerOptionViewSet(ImageUploadURLMixin, viewsets.ModelViewSet):
     queryset = AnswerOption.objects.all()
     serializer_class = AnswerOptionSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -324,7 +505,7 @@ class AnswerQuestionAPIView(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Step 2: Get question and answer option
+        # Step 2: Get answer option together with its question and test
         question_id = request.query_params.get("question_id")
         if not question_id:
             return Response(
@@ -332,7 +513,6 @@ class AnswerQuestionAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        question = get_object_or_404(Question, pk=question_id)
         answer_option_id = request.data.get("answer_option")
 
         if not answer_option_id:
@@ -342,53 +522,206 @@ class AnswerQuestionAPIView(APIView):
             )
 
         answer_option = get_object_or_404(
-            AnswerOption, pk=answer_option_id, question=question
+            AnswerOption.objects.select_related("question__test"),
+            pk=answer_option_id,
+            question_id=question_id,
         )
+        question = answer_option.question
+        total_questions = get_test_questions_count(question.test_id)
+
+        with transaction.atomic():
+            # Step 3: Find or create the test result for current attempt
+            result_filter["test"] = question.test
+            last_result = (
+                TestResult.objects.select_for_update()
+                .filter(**result_filter)
+                .order_by("-attempt_number")
+                .first()
+            )
+
+            if last_result and not last_result.is_finished:
+                test_result = last_result
+            else:
+                next_attempt = (last_result.attempt_number + 1) if last_result else 1
+                test_result = TestResult.objects.create(
+                    **result_filter, attempt_number=next_attempt
+                )
 
-        # Step 3: Find or create the test result for current attempt
-        result_filter["test"] = question.test
-        last_result = (
-            TestResult.objects.filter(**result_filter)
-            .order_by("-attempt_number")
-            .first()
+            # Step 4: Save or update the answer for this question in current attempt
+            previous_answer = (
+                TestAnswer.objects.filter(test_result=test_result, question=question)
+                .only("pk", "is_correct")
+                .first()
+            )
+            if previous_answer is None:
+                TestAnswer.objects.create(
+                    test_result=test_result,
+                    question=question,
+                    user=entity if user.is_student else None,
+                    child=entity if user.is_parent else None,
+                    answer_option=answer_option,
+                    is_correct=answer_option.is_correct,
+                )
+                answered_delta = 1
+                correct_delta = int(answer_option.is_correct)
+            else:
+                TestAnswer.objects.filter(pk=previous_answer.pk).update(
+                    answer_option=answer_option,
+                    is_correct=answer_option.is_correct,
+                )
+                answered_delta = 0
+                correct_delta = int(answer_option.is_correct) - int(
+                    previous_answer.is_correct
+                )
+
+            # Step 5: Adjust the test result progress in place
+            is_finished = test_result.record_answers(
+                answered_delta, correct_delta, total_questions
+            )
+
+        if is_finished:
+            # Chapters show whether their diagnostic tests are finished
+            delete_learner_cache(test_result.user_id, test_result.child_id)
+
+        return Response(
+            {"detail": "Answer submitted successfully."},
+            status=status.HTTP_201_CREATED,
         )
 
-        if last_result and not last_result.is_finished:
-            test_result = last_result
+
+class SubmitTestAnswersAPIView(APIView):
+    """
+    Accepts a whole attempt, or a chunk of it, in one request:
+    {
+        "test": 1,
+        "answers": [{"question": 1, "answer_option": 3}, ...],
+        "finish": false
+    }
+    Answers go to the current unfinished attempt. `finish` closes the attempt
+    even if some questions were left unanswered.
+    """
+
+    permission_classes = [IsParent | IsStudent]
+
+    def post(self, request, *args, **kwargs):
+        user: User = request.user
+
+        if user.is_student:
+            entity: User = user
+            result_filter = {"user": entity}
+        elif user.is_parent:
+            child_id = request.query_params.get("child_id")
+            if not child_id:
+                return Response(
+                    {"detail": "Child ID is required for parent users."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            entity: Child = get_object_or_404(Child, pk=child_id, parent__user=user)
+            result_filter = {"child": entity}
         else:
-            next_attempt = (last_result.attempt_number + 1) if last_result else 1
-            test_result = TestResult.objects.create(
-                **result_filter, attempt_number=next_attempt
+            return Response(
+                {"detail": "You do not have permission to answer questions."},
+                status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Step 4: Save or update the answer for this question in current attempt
-        TestAnswer.objects.update_or_create(
-            test_result=test_result,
-            question=question,
-            user=entity if user.is_student else None,
-            child=entity if user.is_parent else None,
-            defaults={
-                "answer_option": answer_option,
-                "is_correct": answer_option.is_correct,
-            },
+        serializer = TestAnswersSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        test = get_object_or_404(Test, pk=serializer.validated_data["test"])
+        submitted = {
+            answer["question"]: answer["answer_option"]
+            for answer in serializer.validated_data["answers"]
+        }
+
+        options = (
+            AnswerOption.objects.filter(pk__in=submitted.values(), question__test=test)
+            .only("pk", "question_id", "is_correct")
+            .in_bulk()
         )
+        invalid_questions = [
+            question_id
+            for question_id, option_id in submitted.items()
+            if option_id not in options or options[option_id].question_id != question_id
+        ]
+        if invalid_questions:
+            return Response(
+                {
+                    "detail": "Answer options do not belong to the given questions.",
+                    "questions": invalid_questions,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        # Step 5: Calculate progress and update the test result
-        answers = TestAnswer.objects.filter(test_result=test_result)
-        answered_questions = answers.count()
-        correct_answers = answers.filter(is_correct=True).count()
-        total_questions = question.test.questions.count()
+        total_questions = get_test_questions_count(test.id)
 
-        test_result.total_questions = total_questions
-        test_result.correct_answers = correct_answers
-        test_result.score = (
-            round((correct_answers / total_questions) * 100) if total_questions else 0
-        )
-        test_result.is_finished = answered_questions == total_questions
-        test_result.save()
+        with transaction.atomic():
+            result_filter["test"] = test
+            last_result = (
+                TestResult.objects.select_for_update()
+                .filter(**result_filter)
+                .order_by("-attempt_number")
+                .first()
+            )
+
+            if last_result and not last_result.is_finished:
+                test_result = last_result
+            else:
+                next_attempt = (last_result.attempt_number + 1) if last_result else 1
+                test_result = TestResult.objects.create(
+                    **result_filter, attempt_number=next_attempt
+                )
+
+            previous_answers = {
+                answer.question_id: answer
+                for answer in TestAnswer.objects.filter(
+                    test_result=test_result, question_id__in=submitted.keys()
+                ).only("pk", "question_id", "is_correct")
+            }
+
+            new_answers = []
+            changed_answers = []
+            correct_delta = 0
+            for question_id, option_id in submitted.items():
+                option = options[option_id]
+                previous_answer = previous_answers.get(question_id)
+                if previous_answer is None:
+                    new_answers.append(
+                        TestAnswer(
+                            test_result=test_result,
+                            question_id=question_id,
+                            user=entity if user.is_student else None,
+                            child=entity if user.is_parent else None,
+                            answer_option=option,
+                            is_correct=option.is_correct,
+                        )
+                    )
+                    correct_delta += int(option.is_correct)
+                else:
+                    correct_delta += int(option.is_correct) - int(
+                        previous_answer.is_correct
+                    )
+                    previous_answer.answer_option = option
+                    previous_answer.is_correct = option.is_correct
+                    changed_answers.append(previous_answer)
+
+            TestAnswer.objects.bulk_create(new_answers)
+            TestAnswer.objects.bulk_update(
+                changed_answers, ["answer_option", "is_correct"]
+            )
+
+            is_finished = test_result.record_answers(
+                len(new_answers),
+                correct_delta,
+                total_questions,
+                finish=serializer.validated_data["finish"],
+            )
 
+        if is_finished:
+            # Chapters show whether their diagnostic tests are finished
+            delete_learner_cache(test_result.user_id, test_result.child_id)
+
+        test_result.refresh_from_db()
         return Response(
-            {"detail": "Answer submitted successfully."},
+            ShortTestResultSerializer(test_result).data,
             status=status.HTTP_201_CREATED,
         )
 
@@ -421,6 +754,13 @@ class TestReviewAPIView(APIView):
                 "description": "ID of the child (required for parent users).",
                 "type": "integer",
             },
+            {
+                "name": "compact",
+                "required": False,
+                "in": "query",
+                "description": "Return answers as id references into the test body.",
+                "type": "boolean",
+            },
         ],
     )
     def get(self, request, *args, **kwargs):
@@ -461,10 +801,9 @@ class TestReviewAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        test = get_object_or_404(Test, pk=test_id)
-
         result_queryset = TestResult.objects.filter(
-            test=test, **({"user": entity} if user.is_student else {"child": entity})
+            test_id=test_id,
+            **({"user": entity} if user.is_student else {"child": entity}),
         )
 
         if attempt_number is not None:
@@ -478,9 +817,39 @@ class TestReviewAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        if request.query_params.get("compact") == "true":
+            return Response(
+                self._get_compact_review(test_result), status=status.HTTP_200_OK
+            )
+
         serializer = TestResultSerializer(test_result, context={"request": request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def _get_compact_review(self, test_result):
+        """
+        The attempt with its answers as id references into the cached test
+        body, instead of a full question per answer.
+        """
+        answers = TestAnswer.objects.filter(test_result=test_result).values(
+            "question_id", "answer_option_id", "is_correct"
+        )
+        return {
+            "result": {
+                "id": test_result.id,
+                "date_taken": test_result.date_taken,
+                **ShortTestResultSerializer(test_result).data,
+            },
+            "test": get_test_bodies([test_result.test_id])[test_result.test_id],
+            "answers": [
+                {
+                    "question": answer["question_id"],
+                    "answer_option": answer["answer_option_id"],
+                    "is_correct": answer["is_correct"],
+                }
+                for answer in answers
+            ],
+        }
+
 
 class TestCategoryViewSet(viewsets.ModelViewSet):
     """
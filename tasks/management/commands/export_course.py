@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import Course
+from tasks.utils import export_course_snapshot
+
+
+class Command(BaseCommand):
+    help = "Export a course with its whole content tree as a JSON snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", type=int)
+        parser.add_argument(
+            "-o", "--output", help="File to write to, stdout by default."
+        )
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(pk=options["course_id"]).first()
+        if course is None:
+            raise CommandError(f"Course {options['course_id']} does not exist.")
+
+        data = json.dumps(export_course_snapshot(course), ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(data)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Course {course.pk} exported to {options['output']}"
+                )
+            )
+        else:
+            self.stdout.write(data)
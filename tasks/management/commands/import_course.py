@@ -0,0 +1,43 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.utils import import_course_snapshot
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Create a new course from a JSON snapshot made by export_course."
+
+    def add_arguments(self, parser):
+        parser.add_argument("snapshot", help="Path to the snapshot file.")
+        parser.add_argument("--name")
+        parser.add_argument("--language")
+        parser.add_argument("--grade", type=int)
+        parser.add_argument("--created-by", help="Username of the course author.")
+
+    def handle(self, *args, **options):
+        with open(options["snapshot"], encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+
+        created_by = None
+        if options["created_by"]:
+            created_by = User.objects.filter(username=options["created_by"]).first()
+            if created_by is None:
+                raise CommandError(f"User {options['created_by']} does not exist.")
+
+        overrides = {
+            field: options[field]
+            for field in ("name", "language", "grade")
+            if options[field] is not None
+        }
+        try:
+            course = import_course_snapshot(
+                snapshot, created_by=created_by, **overrides
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Course {course.pk} created: {course}"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0031_questionaccuracy_answerstatisticscursor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="canvasimage",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
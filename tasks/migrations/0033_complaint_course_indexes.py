@@ -0,0 +1,61 @@
+# Generated by Django 5.1 on 2026-10-19 18:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_complaint_course(apps, schema_editor):
+    Complaint = apps.get_model("tasks", "Complaint")
+    Question = apps.get_model("tasks", "Question")
+
+    course = Question.objects.filter(pk=OuterRef("question_id")).values(
+        "task__chapter__section__course_id"
+    )
+    Complaint.objects.update(course_id=Subquery(course))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0032_image_variants"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="complaint",
+            name="course",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="complaints",
+                to="tasks.course",
+            ),
+        ),
+        migrations.RunPython(populate_complaint_course, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="complaint",
+            index=models.Index(fields=["-created_at"], name="complaint_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="complaint",
+            index=models.Index(
+                fields=["status", "-created_at"], name="complaint_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="complaint",
+            index=models.Index(
+                fields=["type", "-created_at"], name="complaint_type_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="complaint",
+            index=models.Index(
+                fields=["course", "-created_at"], name="complaint_course_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-19 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_complaints_notified(apps, schema_editor):
+    # Only complaints created from now on go into digests
+    Complaint = apps.get_model("tasks", "Complaint")
+    Complaint.objects.update(notified_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0033_complaint_course_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="complaint",
+            name="notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(
+            mark_existing_complaints_notified, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name="complaint",
+            index=models.Index(
+                condition=models.Q(("notified_at__isnull", True)),
+                fields=["created_at"],
+                name="complaint_unnotified_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-19 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0034_complaint_notified_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answer",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db import transaction
 from modo.models import Test
 
 from account.models import GRADE_CHOICES, LANGUAGE_CHOICES, Child
+from account.utils import allocate_orders
 
 User = get_user_model()
 
@@ -49,10 +50,7 @@ class Section(models.Model):
 
     def save(self, *args, **kwargs):
         if self.order == 0:
-            last_order = Section.objects.filter(course=self.course).aggregate(
-                models.Max("order")
-            )["order__max"]
-            self.order = (last_order + 1) if last_order is not None else 1
+            allocate_orders(Section.objects, [self], "course")
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -107,10 +105,7 @@ class Content(models.Model):
 
     def save(self, *args, **kwargs):
         if self.pk is None:
-            last_order = Content.objects.filter(chapter=self.chapter).aggregate(
-                models.Max("order")
-            )["order__max"]
-            self.order = (last_order + 1) if last_order is not None else 1
+            allocate_orders(Content.objects, [self], "chapter")
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -179,10 +174,7 @@ class ContentNode(models.Model):
     def save(self, *args, **kwargs):
         self.clean()
         if self.pk is None:
-            last_order = ContentNode.objects.filter(chapter=self.chapter).aggregate(
-                models.Max("order")
-            )["order__max"]
-            self.order = (last_order + 1) if last_order is not None else 1
+            allocate_orders(ContentNode.objects, [self], "chapter")
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -223,10 +215,7 @@ class Question(models.Model):
 
     def save(self, *args, **kwargs):
         if self.pk is None:
-            last_order = Question.objects.filter(task=self.task).aggregate(
-                models.Max("order")
-            )["order__max"]
-            self.order = (last_order + 1) if last_order is not None else 1
+            allocate_orders(Question.objects, [self], "task")
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -236,6 +225,8 @@ class Question(models.Model):
 class Image(models.Model):
     option_id = models.PositiveIntegerField(default=0, blank=True, null=True)
     image = models.ImageField(upload_to="questions/")
+    # Resized copies built by account.tasks.generate_image_variants
+    image_variants = models.JSONField(default=dict, blank=True)
     question = models.ForeignKey(
         Question, related_name="images", on_delete=models.CASCADE
     )
@@ -247,6 +238,8 @@ class Image(models.Model):
 class CanvasImage(models.Model):
     image_id = models.CharField(max_length=100, blank=True, null=True)
     image = models.ImageField(upload_to="questions/")
+    # Resized copies built by account.tasks.generate_image_variants
+    image_variants = models.JSONField(default=dict, blank=True)
     question = models.ForeignKey(
         Question, related_name="canvas_images", on_delete=models.CASCADE
     )
@@ -267,6 +260,7 @@ class Answer(models.Model):
     )
     # answer = models.TextField()
     is_correct = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = (("user", "question"), ("child", "question"))
@@ -331,6 +325,80 @@ class Complaint(models.Model):
         ],
         default="pending",
     )
+    # Course of the question, copied on save so the triage list can filter
+    # on an indexed column
+    course = models.ForeignKey(
+        Course,
+        null=True,
+        blank=True,
+        related_name="complaints",
+        on_delete=models.CASCADE,
+    )
+    # Set when the complaint is included in an admin digest
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at"], name="complaint_created_idx"),
+            models.Index(
+                fields=["status", "-created_at"], name="complaint_status_created_idx"
+            ),
+            models.Index(
+                fields=["type", "-created_at"], name="complaint_type_created_idx"
+            ),
+            models.Index(
+                fields=["course", "-created_at"], name="complaint_course_created_idx"
+            ),
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(notified_at__isnull=True),
+                name="complaint_unnotified_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.course_id is None:
+            self.course_id = (
+                Question.objects.filter(pk=self.question_id)
+                .values_list("task__chapter__section__course_id", flat=True)
+                .first()
+            )
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Complaint by {self.user} on {self.question}"
+
+
+class QuestionAccuracy(models.Model):
+    """
+    Running answer counts per question, folded in incrementally from `Answer`
+    by tasks.tasks.refresh_question_accuracy.
+    """
+
+    question = models.OneToOneField(
+        Question, related_name="accuracy", on_delete=models.CASCADE
+    )
+    task = models.ForeignKey(
+        Task, related_name="question_accuracies", on_delete=models.CASCADE
+    )
+    chapter = models.ForeignKey(
+        Chapter, related_name="question_accuracies", on_delete=models.CASCADE
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.question} - {self.correct}/{self.attempts}"
+
+
+class AnswerStatisticsCursor(models.Model):
+    """
+    Single row holding the last `Answer` id folded into QuestionAccuracy.
+    """
+
+    last_answer_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Answers processed up to {self.last_answer_id}"
@@ -1,7 +1,8 @@
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 
-from account.models import Child
+from account.models import GRADE_CHOICES, LANGUAGE_CHOICES, Child
+from account.serializers import DirectUploadSerializer, ImageVariantsField
 from modo.models import Test
 from modo.serializers import ShortTestSerializer
 
@@ -26,6 +27,51 @@ class AnswerSerializer(serializers.Serializer):
     answer = serializers.CharField()
 
 
+class TaskAnswerItemSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    is_correct = serializers.BooleanField()
+
+
+class TaskAnswersSubmitSerializer(serializers.Serializer):
+    answers = TaskAnswerItemSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, value):
+        question_ids = [answer["question"] for answer in value]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError(
+                "Each question can be answered only once per submission."
+            )
+        return value
+
+
+QUESTION_MEDIA_KINDS = ["image", "canvas_image"]
+
+
+class QuestionMediaUploadSerializer(DirectUploadSerializer):
+    kind = serializers.ChoiceField(choices=QUESTION_MEDIA_KINDS)
+
+
+class QuestionMediaConfirmSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=QUESTION_MEDIA_KINDS)
+    upload_token = serializers.CharField()
+    # option_id of an image, image_id of a canvas image
+    media_id = serializers.CharField(max_length=100)
+
+    def validate(self, data):
+        if data["kind"] == "image" and not data["media_id"].isdigit():
+            raise serializers.ValidationError(
+                {"media_id": "Option id of an image must be a number."}
+            )
+        return data
+
+
+class CourseSnapshotImportSerializer(serializers.Serializer):
+    snapshot = serializers.JSONField()
+    name = serializers.CharField(max_length=255, required=False)
+    language = serializers.ChoiceField(choices=LANGUAGE_CHOICES, required=False)
+    grade = serializers.ChoiceField(choices=GRADE_CHOICES, required=False)
+
+
 class LessonSerializer(serializers.ModelSerializer):
     used_in_content_node = serializers.SerializerMethodField()
 
@@ -46,10 +92,11 @@ class LessonSummarySerializer(serializers.ModelSerializer):
 class ImageSerializer(serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     value = serializers.SerializerMethodField()
+    variants = ImageVariantsField(source="image_variants")
 
     class Meta:
         model = Image
-        fields = ["id", "value"]
+        fields = ["id", "value", "variants"]
 
     def get_id(self, obj):
         return obj.option_id
@@ -60,10 +107,11 @@ class ImageSerializer(serializers.ModelSerializer):
 
 class CanvasImageSerializer(serializers.ModelSerializer):
     value = serializers.SerializerMethodField()
+    variants = ImageVariantsField(source="image_variants")
 
     class Meta:
         model = CanvasImage
-        fields = "image_id", "value"
+        fields = "image_id", "value", "variants"
 
     def get_value(self, obj):
         return obj.image.url
@@ -335,6 +383,51 @@ class ContentNodeSerializer(serializers.ModelSerializer):
         return None
 
 
+class LearningPathLessonSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ["id", "title", "description", "video_url"]
+
+
+class LearningPathTaskSerializer(serializers.ModelSerializer):
+    is_completed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Task
+        fields = ["id", "title", "description", "video_url", "is_completed"]
+
+    def get_is_completed(self, obj):
+        return obj.id in self.context.get("completed_task_ids", ())
+
+
+class LearningPathNodeSerializer(serializers.ModelSerializer):
+    """
+    A content node with summaries of its lesson and task. Completion comes
+    from `completed_task_ids` in the context, looked up once for the chapter.
+    """
+
+    lesson = LearningPathLessonSerializer(read_only=True)
+    task = LearningPathTaskSerializer(read_only=True)
+    is_completed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ContentNode
+        fields = [
+            "id",
+            "title",
+            "description",
+            "order",
+            "lesson",
+            "task",
+            "is_completed",
+        ]
+
+    def get_is_completed(self, obj):
+        if obj.task_id is None:
+            return None
+        return obj.task_id in self.context.get("completed_task_ids", ())
+
+
 class ChapterSerializer(serializers.ModelSerializer):
     contents = ContentSerializer(many=True, read_only=True)
     total_tasks = serializers.SerializerMethodField()
@@ -511,11 +604,13 @@ class CourseSerializer(serializers.ModelSerializer):
 class ComplaintSerializer(serializers.ModelSerializer):
     class Meta:
         model = Complaint
-        fields = "__all__"
+        exclude = ["notified_at"]
+        read_only_fields = ["course"]
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         task = instance.question.task
+        course = instance.course or task.chapter.section.course
         rep["user_email"] = instance.user.email if instance.user else None
         rep["question_id"] = instance.question.id
         rep["question_text"] = instance.question.question_text
@@ -526,8 +621,8 @@ class ComplaintSerializer(serializers.ModelSerializer):
         rep["chapter_id"] = task.chapter.id
         rep["section"] = task.chapter.section.title
         rep["section_id"] = task.chapter.section.id
-        rep["course"] = task.chapter.section.course.name
-        rep["course_id"] = task.chapter.section.course.id
-        rep["grade"] = task.chapter.section.course.grade
-        rep["language"] = task.chapter.section.course.language
+        rep["course"] = course.name
+        rep["course_id"] = course.id
+        rep["grade"] = course.grade
+        rep["language"] = course.language
         return rep
@@ -1,16 +1,41 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from account.tasks import schedule_image_variants
+from account.cache import bump_progress_version
+from account.images import delete_image_variants
 from documents.tasks import invalidate_cache_celery
-from .utils import get_complaint_list_cache_key, get_complaint_cache_key
+from .utils import bump_complaint_list_version, get_complaint_cache_key
 
-from .models import Complaint
+from .models import Answer, CanvasImage, Complaint, Image
 
 
 @receiver([post_save, post_delete], sender=Complaint)
-def invalidate_cache_complaints(sender, instance, **kwargs):
+def invalidate_cache_complaints(sender, instance, created=False, **kwargs):
     """
-    Invalidate cache for complaint list and specific complaint.
+    Invalidate the complaint list pages affected by the complaint and the
+    cache of the complaint itself.
     """
-    cache_keys = [get_complaint_list_cache_key(), get_complaint_cache_key(instance.pk)]
+    bump_complaint_list_version(instance.course_id, created=created)
+    cache_keys = [get_complaint_cache_key(instance.pk)]
     print("Cache keys to invalidate:", cache_keys)
     invalidate_cache_celery.delay(cache_keys)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=CanvasImage)
+def create_image_variants(sender, instance, **kwargs):
+    schedule_image_variants(instance, "image")
+
+
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=CanvasImage)
+def delete_question_image_variants(sender, instance, **kwargs):
+    # Courses cloned from a snapshot share image files with the original
+    if sender.objects.filter(image=instance.image.name).exists():
+        return
+    delete_image_variants(instance.image_variants, instance.image.storage)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_answer_progress(sender, instance, **kwargs):
+    bump_progress_version(instance.user_id, instance.child_id)
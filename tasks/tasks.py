@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Answer, AnswerStatisticsCursor, QuestionAccuracy
+
+# Answers younger than this are left for the next run, so that rows whose
+# transaction commits after a higher id is already visible are not skipped.
+# Must be longer than any transaction that inserts answers.
+ANSWER_STATISTICS_LAG = timedelta(minutes=10)
+
+
+@shared_task
+def refresh_question_accuracy(rebuild=False):
+    """
+    Fold answers created since the last run into QuestionAccuracy. Only the
+    new id range of `Answer` is aggregated, grouped by question in the
+    database, and it stops at the last answer older than
+    ANSWER_STATISTICS_LAG. `rebuild` starts over from the first answer.
+    """
+    with transaction.atomic():
+        cursor, _ = AnswerStatisticsCursor.objects.select_for_update().get_or_create(
+            pk=1
+        )
+        if rebuild:
+            QuestionAccuracy.objects.all().delete()
+            cursor.last_answer_id = 0
+
+        last_answer_id = (
+            Answer.objects.filter(
+                id__gt=cursor.last_answer_id,
+                created_at__lt=timezone.now() - ANSWER_STATISTICS_LAG,
+            ).aggregate(last=Max("id"))["last"]
+            or cursor.last_answer_id
+        )
+        counts = (
+            Answer.objects.filter(id__gt=cursor.last_answer_id, id__lte=last_answer_id)
+            .values("question_id", "question__task_id", "question__task__chapter_id")
+            .annotate(
+                new_attempts=Count("id"),
+                new_correct=Count("id", filter=Q(is_correct=True)),
+            )
+            .order_by()
+        )
+
+        existing = QuestionAccuracy.objects.in_bulk(
+            [row["question_id"] for row in counts], field_name="question_id"
+        )
+        created = []
+        for row in counts:
+            accuracy = existing.get(row["question_id"])
+            if accuracy is None:
+                accuracy = QuestionAccuracy(question_id=row["question_id"])
+                created.append(accuracy)
+            accuracy.task_id = row["question__task_id"]
+            accuracy.chapter_id = row["question__task__chapter_id"]
+            accuracy.attempts += row["new_attempts"]
+            accuracy.correct += row["new_correct"]
+
+        QuestionAccuracy.objects.bulk_create(created)
+        QuestionAccuracy.objects.bulk_update(
+            existing.values(), ["task", "chapter", "attempts", "correct"]
+        )
+
+        processed_from = cursor.last_answer_id
+        cursor.last_answer_id = last_answer_id
+        cursor.save()
+
+    report = {
+        "answers_from": processed_from,
+        "answers_to": last_answer_id,
+        "questions_created": len(created),
+        "questions_updated": len(existing),
+    }
+    print(f"Question accuracy refreshed: {report}")
+    return report
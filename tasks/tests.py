@@ -1,11 +1,32 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from account.models import Child, Student
+from account.models import Child, Parent, Student
 
-from .models import Content, Course, Question, Section, Task
+from .models import (
+    Answer,
+    Chapter,
+    Complaint,
+    Content,
+    ContentNode,
+    Course,
+    Lesson,
+    Question,
+    QuestionAccuracy,
+    Section,
+    Task,
+    TaskCompletion,
+)
 
 User = get_user_model()
 
@@ -157,3 +178,478 @@ class ChildModelTest(TestCase):
     def test_child_creation(self):
         self.assertEqual(self.child.grade, 3)
         self.assertEqual(self.child.parent, self.parent)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ComplaintListCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="admin", is_superuser=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.question = self.create_question("Math")
+        self.other_question = self.create_question("Physics")
+        self.old = self.create_complaint(self.question, days_ago=2)
+        self.newer = self.create_complaint(self.question, days_ago=1)
+        self.other = self.create_complaint(self.other_question, days_ago=1)
+
+    def create_question(self, name):
+        course = Course.objects.create(name=name, grade=5, created_by=self.user)
+        section = Section.objects.create(course=course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        return Question.objects.create(task=task, question_type="true_false")
+
+    def create_complaint(self, question, days_ago=0):
+        complaint = Complaint.objects.create(
+            question=question, user=self.user, type="bug", description="Wrong"
+        )
+        # Distinct timestamps keep the cursor order stable
+        Complaint.objects.filter(pk=complaint.pk).update(
+            created_at=datetime.now() - timedelta(days=days_ago)
+        )
+        complaint.refresh_from_db()
+        return complaint
+
+    @contextmanager
+    def assertServedFromCache(self):
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertFalse(
+            [query for query in queries if "tasks_complaint" in query["sql"]]
+        )
+
+    def get_list(self, **params):
+        response = self.client.get("/api/complaints/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def get_counts(self, **params):
+        response = self.client.get("/api/complaints/status-counts/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def get_cursor(self, page):
+        return parse_qs(urlparse(page["next"]).query)["cursor"][0]
+
+    def test_new_complaint_refreshes_first_page_and_counts_only(self):
+        course_id = self.question.task.chapter.section.course_id
+        first_page = self.get_list(course=course_id, page_size=1)
+        cursor = self.get_cursor(first_page)
+        cursor_page = self.get_list(course=course_id, page_size=1, cursor=cursor)
+        self.assertEqual(self.get_counts(course=course_id)["pending"], 2)
+
+        new = self.create_complaint(self.question)
+
+        first_page = self.get_list(course=course_id, page_size=1)
+        self.assertEqual(first_page["results"][0]["id"], new.pk)
+        self.assertEqual(self.get_counts(course=course_id)["pending"], 3)
+        with self.assertServedFromCache():
+            self.assertEqual(
+                self.get_list(course=course_id, page_size=1, cursor=cursor),
+                cursor_page,
+            )
+
+    def test_update_refreshes_cursor_pages(self):
+        course_id = self.question.task.chapter.section.course_id
+        cursor = self.get_cursor(self.get_list(course=course_id, page_size=1))
+        cursor_page = self.get_list(course=course_id, page_size=1, cursor=cursor)
+        self.assertEqual(cursor_page["results"][0]["status"], "pending")
+
+        self.old.status = "resolved"
+        self.old.save()
+
+        cursor_page = self.get_list(course=course_id, page_size=1, cursor=cursor)
+        self.assertEqual(cursor_page["results"][0]["id"], self.old.pk)
+        self.assertEqual(cursor_page["results"][0]["status"], "resolved")
+        self.assertEqual(self.get_counts(course=course_id)["resolved"], 1)
+
+    def test_other_course_pages_untouched(self):
+        other_course_id = self.other_question.task.chapter.section.course_id
+        page = self.get_list(course=other_course_id)
+        counts = self.get_counts(course=other_course_id)
+
+        self.create_complaint(self.question)
+        self.newer.status = "rejected"
+        self.newer.save()
+
+        with self.assertServedFromCache():
+            self.assertEqual(self.get_list(course=other_course_id), page)
+            self.assertEqual(self.get_counts(course=other_course_id), counts)
+        self.assertEqual(len(self.get_list()["results"]), 4)
+
+    def test_invalid_filters_rejected(self):
+        for params in (
+            {"status": "open"},
+            {"type": "spam"},
+            {"course": "math"},
+            {"created_after": "yesterday"},
+            {"created_before": "2024-13-01"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get("/api/complaints/", params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("message", response.json())
+
+        response = self.client.get("/api/complaints/status-counts/", {"type": "spam"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CourseTreeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username="student", role="student")
+        )
+        self.course = Course.objects.create(name="Math", grade=5)
+        section = Section.objects.create(course=self.course, title="Section")
+        Chapter.objects.create(section=section, title="Chapter")
+
+    def test_tree_of_course(self):
+        response = self.client.get(f"/api/courses/{self.course.pk}/tree/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["sections"][0]["title"], "Section")
+
+    def test_invalid_or_missing_course_not_found(self):
+        for pk in ("abc", self.course.pk + 1):
+            with self.subTest(pk=pk):
+                response = self.client.get(f"/api/courses/{pk}/tree/")
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QuestionAccuracyViewTest(TestCase):
+    url = "/api/question-accuracy/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username="staff", is_staff=True)
+        )
+        self.math = self.create_accuracy("Math", attempts=4, correct=1)
+        self.physics = self.create_accuracy("Physics", attempts=2, correct=2)
+
+    def create_accuracy(self, name, attempts, correct):
+        course = Course.objects.create(name=name, grade=5)
+        section = Section.objects.create(course=course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        question = Question.objects.create(task=task, question_type="true_false")
+        return QuestionAccuracy.objects.create(
+            question=question,
+            task=task,
+            chapter=chapter,
+            attempts=attempts,
+            correct=correct,
+        )
+
+    def test_filter_by_course(self):
+        response = self.client.get(
+            self.url, {"course": self.math.chapter.section.course_id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["question_id"], row["correct_rate"]) for row in response.json()],
+            [(self.math.question_id, 0.25)],
+        )
+
+    def test_invalid_filters_rejected(self):
+        for params in (
+            {"course": "abc"},
+            {"chapter": "1.5"},
+            {"task": "-1"},
+            {"level": "section"},
+            {"ordering": "title"},
+            {"limit": "all"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("message", response.json())
+
+
+class CourseSnapshotTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="staff", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(name="Math", grade=5, language="ru")
+        section = Section.objects.create(course=self.course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        lesson = Lesson.objects.create(
+            chapter=chapter, title="Lesson", content_type="lesson"
+        )
+        task = Task.objects.create(chapter=chapter, title="Task", content_type="task")
+        ContentNode.objects.create(lesson=lesson, task=task)
+        Question.objects.create(task=task, title="Question", question_type="input_text")
+
+    def export(self):
+        response = self.client.get(f"/api/courses/{self.course.pk}/export/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def import_snapshot(self, snapshot, **overrides):
+        return self.client.post(
+            "/api/courses/import-snapshot/",
+            {"snapshot": snapshot, **overrides},
+            format="json",
+        )
+
+    def test_export_import_round_trip(self):
+        response = self.import_snapshot(self.export(), name="Математика", grade=6)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        copy = Course.objects.get(pk=response.json()["id"])
+        self.assertEqual(
+            (copy.name, copy.grade, copy.language, copy.created_by),
+            ("Математика", 6, "ru", self.user),
+        )
+        chapter = Chapter.objects.get(section__course=copy)
+        self.assertEqual(chapter.section.title, "Section")
+        node = ContentNode.objects.get(chapter=chapter)
+        self.assertEqual((node.lesson.chapter, node.task.chapter), (chapter, chapter))
+        self.assertEqual(node.task.questions.get().title, "Question")
+        # The source course is left as it was
+        self.assertEqual(ContentNode.objects.count(), 2)
+        self.assertEqual(
+            ContentNode.objects.get(chapter__section__course=self.course).task.title,
+            "Task",
+        )
+
+    def test_malformed_snapshot_rejected(self):
+        snapshot = self.export()
+        task = snapshot["tasks"][0]
+        for case, malformed in (
+            ("format", {**snapshot, "format": 2}),
+            ("not an object", [snapshot]),
+            ("course", {**snapshot, "course": "Math"}),
+            ("row without id", {**snapshot, "sections": [{"title": "Section"}]}),
+            ("dangling id", {**snapshot, "tasks": [{**task, "chapter_id": 0}]}),
+        ):
+            with self.subTest(case=case):
+                response = self.import_snapshot(malformed)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("message", response.json())
+        self.assertEqual(Course.objects.count(), 1)
+        self.assertEqual(Section.objects.count(), 1)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class TaskSubmitAnswersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="student", role="student")
+        self.student = Student.objects.create(user=self.user, grade=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        course = Course.objects.create(name="Math", grade=5)
+        section = Section.objects.create(course=course, title="Section")
+        chapter = Chapter.objects.create(section=section, title="Chapter")
+        self.task = Task.objects.create(
+            chapter=chapter, title="Task", content_type="task"
+        )
+        self.questions = [
+            Question.objects.create(task=self.task, question_type="true_false")
+            for _ in range(2)
+        ]
+        self.url = (
+            f"/api/courses/{course.pk}/sections/{section.pk}/chapters/{chapter.pk}"
+            f"/tasks/{self.task.pk}/submit-answers/"
+        )
+
+    def submit(self, answers, **data):
+        return self.client.post(
+            self.url,
+            {
+                "answers": [
+                    {"question": question.pk, "is_correct": is_correct}
+                    for question, is_correct in answers
+                ],
+                **data,
+            },
+            format="json",
+        )
+
+    def test_whole_task_completes_once(self):
+        first, second = self.questions
+
+        response = self.submit([(first, True), (second, False)])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            {
+                "message": "Answers processed",
+                "answered": 2,
+                "skipped": 0,
+                "rewarded": 1,
+                "is_completed": True,
+            },
+        )
+        self.student.refresh_from_db()
+        self.assertEqual(
+            (self.student.cups, self.student.streak), (settings.QUESTION_REWARD, 1)
+        )
+        completion = TaskCompletion.objects.get(user=self.user, task=self.task)
+        self.assertEqual((completion.correct, completion.wrong), (1, 1))
+
+        response = self.submit([(first, True), (second, True)])
+
+        self.assertEqual(response.json()["skipped"], 2)
+        self.assertFalse(response.json()["is_completed"])
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.cups, settings.QUESTION_REWARD)
+        self.assertEqual(Answer.objects.count(), 2)
+
+    def test_task_completes_with_its_last_answers(self):
+        first, second = self.questions
+
+        response = self.submit([(first, True)])
+
+        self.assertFalse(response.json()["is_completed"])
+        self.assertFalse(TaskCompletion.objects.exists())
+
+        response = self.submit([(first, False), (second, True)])
+
+        self.assertEqual(
+            (response.json()["answered"], response.json()["skipped"]), (1, 1)
+        )
+        self.assertTrue(response.json()["is_completed"])
+        completion = TaskCompletion.objects.get()
+        self.assertEqual((completion.correct, completion.wrong), (2, 0))
+
+    def test_question_of_another_task_rejected(self):
+        other = Question.objects.create(
+            task=Task.objects.create(
+                chapter=self.task.chapter, title="Other", content_type="task"
+            ),
+            question_type="true_false",
+        )
+
+        response = self.submit([(self.questions[0], True), (other, True)])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["questions"], [other.pk])
+        self.assertFalse(Answer.objects.exists())
+
+    def test_parent_answers_for_own_child(self):
+        parent = User.objects.create(username="parent", role="parent")
+        child = Child.objects.create(
+            parent=Parent.objects.create(user=parent), first_name="A", grade=5
+        )
+        self.client.force_authenticate(parent)
+
+        response = self.submit([(self.questions[0], True)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.submit([(self.questions[0], True)], child_id=child.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Answer.objects.filter(child=child, user=None).exists())
+        child.refresh_from_db()
+        self.assertEqual(child.cups, settings.QUESTION_REWARD)
+
+
+class LearningPathTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="student", role="student", is_test_user=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        course = Course.objects.create(name="Math", grade=5)
+        section = Section.objects.create(course=course, title="Section")
+        self.chapter = Chapter.objects.create(section=section, title="Chapter")
+        self.url = (
+            f"/api/courses/{course.pk}/sections/{section.pk}"
+            f"/chapters/{self.chapter.pk}/content-nodes/learning-path/"
+        )
+        lesson = Lesson.objects.create(
+            chapter=self.chapter, title="Lesson", content_type="lesson"
+        )
+        self.tasks = [self.add_node(f"Task {index}") for index in (1, 2)]
+        ContentNode.objects.create(lesson=lesson)
+        TaskCompletion.objects.create(user=self.user, task=self.tasks[0])
+
+    def add_node(self, title):
+        task = Task.objects.create(
+            chapter=self.chapter, title=title, content_type="task"
+        )
+        ContentNode.objects.create(task=task)
+        return task
+
+    def get_path(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_nodes_in_order_with_completion(self):
+        other = User.objects.create(username="other", role="student")
+        TaskCompletion.objects.create(user=other, task=self.tasks[1])
+
+        path = self.get_path()
+
+        self.assertEqual((path["total_tasks"], path["completed_tasks"]), (2, 1))
+        self.assertEqual(
+            [
+                (node["title"], node["is_completed"], bool(node["lesson"]))
+                for node in path["nodes"]
+            ],
+            [("Task 1", True, False), ("Task 2", False, False), ("Lesson", None, True)],
+        )
+        self.assertTrue(path["nodes"][0]["task"]["is_completed"])
+
+    def count_content_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            path = self.get_path()
+        # Silk records requests in the same connection
+        content_queries = [
+            query
+            for query in queries
+            if query["sql"].startswith("SELECT") and '"tasks_' in query["sql"]
+        ]
+        return len(content_queries), path
+
+    def test_queries_do_not_grow_with_nodes(self):
+        count, _ = self.count_content_queries()
+        for index in range(3, 6):
+            self.add_node(f"Task {index}")
+
+        more_count, path = self.count_content_queries()
+
+        self.assertEqual(len(path["nodes"]), 6)
+        self.assertEqual(more_count, count)
+
+    def test_parent_sees_own_child_only(self):
+        parent = User.objects.create(
+            username="parent", role="parent", is_test_user=True
+        )
+        child = Child.objects.create(
+            parent=Parent.objects.create(user=parent), first_name="A", grade=5
+        )
+        TaskCompletion.objects.create(child=child, task=self.tasks[1])
+        other_child = Child.objects.create(
+            parent=Parent.objects.create(
+                user=User.objects.create(username="other", role="parent")
+            ),
+            first_name="B",
+            grade=5,
+        )
+        self.client.force_authenticate(parent)
+
+        path = self.get_path(child_id=child.pk)
+
+        self.assertEqual(
+            [node["is_completed"] for node in path["nodes"]], [False, True, None]
+        )
+        response = self.client.get(self.url, {"child_id": other_child.pk})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
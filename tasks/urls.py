@@ -9,6 +9,7 @@ from .views import (
     CourseViewSet,
     LessonViewSet,
     PlayGameView,
+    QuestionAccuracyView,
     QuestionViewSet,
     SectionViewSet,
     TaskViewSet,
@@ -48,6 +49,11 @@ complaint_router.register(r"complaints", ComplaintViewSet, basename="complaints"
 urlpatterns = [
     path("play-game/", PlayGameView.as_view(), name="play-game"),
     path("canvas-images/", DeleteCanvasImage.as_view(), name="delete-canvas-image"),
+    path(
+        "question-accuracy/",
+        QuestionAccuracyView.as_view(),
+        name="question-accuracy",
+    ),
 ]
 
 urlpatterns += (
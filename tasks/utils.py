@@ -1,8 +1,71 @@
-def get_complaint_list_cache_key():
+import copy
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from account.tasks import delete_keys_matching
+from account.cache import get_progress_version_cache_key, get_versions
+from account.utils import get_cache_key
+from modo.models import Test
+
+from .models import (
+    CanvasImage,
+    Chapter,
+    Content,
+    ContentNode,
+    Course,
+    Image,
+    Lesson,
+    Question,
+    Section,
+    Task,
+)
+
+
+def get_complaint_list_version_cache_keys(course_id=None):
+    """
+    Return the (pages, head) version keys of the complaint list of a course,
+    or of all complaints. Every change bumps the head version, which first
+    pages and status counts are cached under. Only changes to existing
+    complaints bump the pages version of the pages behind a cursor, since a
+    new complaint is always the newest.
+    """
+    scope = f"course_{course_id}" if course_id else "all"
+    return (
+        f"complaint_list_pages_version_{scope}",
+        f"complaint_list_head_version_{scope}",
+    )
+
+
+def bump_complaint_list_version(course_id=None, created=False):
+    keys = []
+    for scope_course_id in {None, course_id}:
+        pages_key, head_key = get_complaint_list_version_cache_keys(scope_course_id)
+        keys.append(head_key)
+        if not created:
+            keys.append(pages_key)
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def get_complaint_list_cache_key(query_params, course_id=None, kind="page"):
     """
-    Generate a cache key for the complaint list.
+    Generate a cache key for a page (kind "page") or the status counts (kind
+    "counts") of the complaint list for the given query.
     """
-    return "complaint_list"
+    pages_key, head_key = get_complaint_list_version_cache_keys(course_id)
+    if kind == "page" and query_params.get("cursor"):
+        version_key = pages_key
+    else:
+        version_key = head_key
+    version = get_versions([version_key])[version_key]
+    query = hashlib.md5(
+        "&".join(f"{k}={v}" for k, v in sorted(query_params.items())).encode()
+    ).hexdigest()
+    return f"complaint_list_{kind}_{version}_{query}"
 
 
 def get_complaint_cache_key(complaint_id):
@@ -10,3 +73,397 @@ def get_complaint_cache_key(complaint_id):
     Generate a cache key for a specific complaint.
     """
     return f"complaint_{complaint_id}"
+
+
+CONTENT_VERSION_CACHE_KEY = "content_version"
+
+
+def get_content_version():
+    """
+    Return the current version of course content. Anything cached under it is
+    dropped at once by bump_content_version instead of key by key.
+    """
+    version = cache.get(CONTENT_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CONTENT_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_content_version():
+    cache.set(CONTENT_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def get_content_cache_key(prefix, user, child_id=None, **kwargs):
+    """
+    Generate the cache key of a learner's view of course content. The key is
+    under the content version, so content changes drop it for every learner
+    at once without touching the learner cache indexes.
+    """
+    return get_cache_key(
+        prefix, user, child_id, version=get_content_version(), **kwargs
+    )
+
+
+def get_content_etag(request):
+    """
+    Return a strong ETag for a read of course or test content by the request
+    user, derived from the content version and the learner's progress
+    version. None if the learner cannot be told from the request.
+    """
+    user = request.user
+    child_id = request.query_params.get("child_id")
+    if user.is_parent and child_id:
+        if not child_id.isdigit():
+            return None
+        progress_key = get_progress_version_cache_key(child_id=child_id)
+    else:
+        progress_key = get_progress_version_cache_key(user_id=user.pk)
+
+    versions = get_versions([CONTENT_VERSION_CACHE_KEY, progress_key])
+    digest = hashlib.md5(
+        ":".join(
+            [
+                versions[CONTENT_VERSION_CACHE_KEY],
+                versions[progress_key],
+                str(user.pk),
+                request.get_full_path(),
+            ]
+        ).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+class _NotModified(Exception):
+    pass
+
+
+class ContentETagMixin:
+    """
+    Conditional GET for the read actions in `etag_actions`: responses carry
+    an ETag from get_content_etag, and a request whose If-None-Match matches
+    it is answered with 304 before the action runs.
+    """
+
+    etag_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.content_etag = None
+        if request.method in ("GET", "HEAD") and self.action in self.etag_actions:
+            self.content_etag = get_content_etag(request)
+            if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+            if self.content_etag and self.content_etag in if_none_match:
+                raise _NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _NotModified):
+            response = HttpResponseNotModified()
+            response["ETag"] = self.content_etag
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "content_etag", None) and response.status_code == 200:
+            response["ETag"] = self.content_etag
+        return response
+
+
+COURSE_TREE_CACHE_TIMEOUT = 3600
+
+
+def get_course_tree_cache_key(course_id, version):
+    return f"course_tree_{course_id}_{version}"
+
+
+def get_course_tree(course_id):
+    """
+    Return the outline of a course (sections, chapters and their contents)
+    without any learner progress, or None if the course does not exist.
+    Built from one flat query per level and cached per content version.
+    """
+    cache_key = get_course_tree_cache_key(course_id, get_content_version())
+    tree = cache.get(cache_key)
+    if tree is not None:
+        return tree
+
+    tree = (
+        Course.objects.filter(pk=course_id)
+        .values(
+            "id", "name", "description", "course_type", "grade", "language", "is_active"
+        )
+        .first()
+    )
+    if tree is None:
+        return None
+
+    sections = list(
+        Section.objects.filter(course_id=course_id)
+        .order_by("order", "pk")
+        .values("id", "title", "description", "order")
+    )
+    chapters = list(
+        Chapter.objects.filter(section__course_id=course_id)
+        .order_by("order", "pk")
+        .values(
+            "id",
+            "section_id",
+            "title",
+            "description",
+            "order",
+            "before_diagnostic_test_id",
+            "after_diagnostic_test_id",
+        )
+    )
+    contents = list(
+        Content.objects.filter(chapter__section__course_id=course_id)
+        .order_by("order", "pk")
+        .values(
+            "id",
+            "chapter_id",
+            "title",
+            "description",
+            "order",
+            "content_type",
+            "video_url",
+        )
+    )
+
+    chapters_by_id = {}
+    for chapter in chapters:
+        chapter["contents"] = []
+        chapter["total_tasks"] = 0
+        chapters_by_id[chapter["id"]] = chapter
+    for content in contents:
+        chapter = chapters_by_id[content.pop("chapter_id")]
+        chapter["contents"].append(content)
+        if content["content_type"] == "task":
+            chapter["total_tasks"] += 1
+
+    sections_by_id = {}
+    for section in sections:
+        section["chapters"] = []
+        sections_by_id[section["id"]] = section
+    for chapter in chapters:
+        sections_by_id[chapter.pop("section_id")]["chapters"].append(chapter)
+    for section in sections:
+        section["total_tasks"] = sum(
+            chapter["total_tasks"] for chapter in section["chapters"]
+        )
+
+    tree["sections"] = sections
+    tree["total_tasks"] = sum(section["total_tasks"] for section in sections)
+    cache.set(cache_key, tree, timeout=COURSE_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def _set_progress(node, completed_tasks):
+    node["completed_tasks"] = completed_tasks
+    node["percentage_completed"] = (
+        completed_tasks * 100 / node["total_tasks"] if node["total_tasks"] > 0 else 0
+    )
+
+
+def apply_course_progress(tree, completed_task_ids):
+    """
+    Add completed_tasks and percentage_completed to every level of a course
+    tree and is_completed to its tasks. The cached tree is left untouched.
+    """
+    tree = copy.deepcopy(tree)
+    course_completed = 0
+    for section in tree["sections"]:
+        section_completed = 0
+        for chapter in section["chapters"]:
+            chapter_completed = 0
+            for content in chapter["contents"]:
+                if content["content_type"] == "task":
+                    content["is_completed"] = content["id"] in completed_task_ids
+                    chapter_completed += content["is_completed"]
+            _set_progress(chapter, chapter_completed)
+            section_completed += chapter_completed
+        _set_progress(section, section_completed)
+        course_completed += section_completed
+    _set_progress(tree, course_completed)
+    return tree
+
+
+COURSE_SNAPSHOT_FORMAT = 1
+
+# (snapshot key, model, lookup from the model to the course, foreign keys
+# remapped on import as {attname: snapshot key}), in dependency order
+COURSE_SNAPSHOT_LEVELS = [
+    ("sections", Section, "course", {"course_id": "course"}),
+    ("chapters", Chapter, "section__course", {"section_id": "sections"}),
+    ("lessons", Lesson, "chapter__section__course", {"chapter_id": "chapters"}),
+    ("tasks", Task, "chapter__section__course", {"chapter_id": "chapters"}),
+    (
+        "content_nodes",
+        ContentNode,
+        "chapter__section__course",
+        {"chapter_id": "chapters", "lesson_id": "lessons", "task_id": "tasks"},
+    ),
+    ("questions", Question, "task__chapter__section__course", {"task_id": "tasks"}),
+    (
+        "images",
+        Image,
+        "question__task__chapter__section__course",
+        {"question_id": "questions"},
+    ),
+    (
+        "canvas_images",
+        CanvasImage,
+        "question__task__chapter__section__course",
+        {"question_id": "questions"},
+    ),
+]
+
+
+def _get_snapshot_fields(model):
+    return [
+        field.attname
+        for field in model._meta.concrete_fields
+        if not field.primary_key and not field.auto_created
+    ]
+
+
+def export_course_snapshot(course):
+    """
+    Serialize a course with its whole content tree into a JSON-ready dict,
+    one flat query per level. Rows keep their ids so references between
+    levels can be remapped on import. Files are exported by storage name and
+    shared with the copies rather than duplicated.
+    """
+    snapshot = {
+        "format": COURSE_SNAPSHOT_FORMAT,
+        "course": {
+            field: getattr(course, field)
+            for field in _get_snapshot_fields(Course)
+            if field != "created_by_id"
+        },
+    }
+    for key, model, course_lookup, _ in COURSE_SNAPSHOT_LEVELS:
+        snapshot[key] = list(
+            model.objects.filter(**{course_lookup: course})
+            .order_by("pk")
+            .values("pk", *_get_snapshot_fields(model))
+        )
+        for row in snapshot[key]:
+            row["id"] = row.pop("pk")
+    return snapshot
+
+
+def _bulk_create(model, objs):
+    """
+    bulk_create that also handles the multi-table children of Content: the
+    parent rows are bulk created first, then the child rows are inserted
+    with one INSERT.
+    """
+    if not model._meta.parents:
+        return model.objects.bulk_create(objs)
+
+    ((parent, parent_link),) = model._meta.parents.items()
+    parent_fields = _get_snapshot_fields(parent)
+    parents = parent.objects.bulk_create(
+        [
+            parent(**{field: getattr(obj, field) for field in parent_fields})
+            for obj in objs
+        ]
+    )
+    for obj, parent_obj in zip(objs, parents):
+        obj.pk = parent_obj.pk
+        setattr(obj, parent_link.attname, parent_obj.pk)
+        obj._state.adding = False
+    if objs:
+        model._base_manager._insert(objs, fields=model._meta.local_concrete_fields)
+    return objs
+
+
+def import_course_snapshot(snapshot, created_by=None, **overrides):
+    """
+    Create a new course from a snapshot of export_course_snapshot, e.g. with
+    another `language`, `grade` or `name` given in `overrides`. Every level is
+    created with one bulk_create, which fires no per-object signals, so the
+    content caches are invalidated once after the commit instead.
+    Raises ValueError for malformed snapshots.
+    """
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get("format") != COURSE_SNAPSHOT_FORMAT
+    ):
+        raise ValueError(
+            f"Unsupported snapshot format, expected {COURSE_SNAPSHOT_FORMAT}."
+        )
+
+    if not isinstance(snapshot.get("course", {}), dict):
+        raise ValueError("course must be an object.")
+
+    course_fields = _get_snapshot_fields(Course)
+    course_data = {
+        field: value
+        for field, value in {**snapshot.get("course", {}), **overrides}.items()
+        if field in course_fields
+    }
+
+    missing = [field for field in ("name", "grade") if course_data.get(field) is None]
+    if missing:
+        raise ValueError(f"Course {', '.join(missing)} is required.")
+
+    with transaction.atomic():
+        (course,) = Course.objects.bulk_create(
+            [Course(**course_data, created_by=created_by)]
+        )
+        id_map = {}
+
+        for key, model, _, references in COURSE_SNAPSHOT_LEVELS:
+            fields = _get_snapshot_fields(model)
+            rows = snapshot.get(key, [])
+            if not isinstance(rows, list) or not all(
+                isinstance(row, dict) and "id" in row for row in rows
+            ):
+                raise ValueError(f"{key} must be a list of rows with ids.")
+            objs = []
+            for index, row in enumerate(rows):
+                data = {field: row[field] for field in fields if field in row}
+                for attname, target in references.items():
+                    if target == "course":
+                        data[attname] = course.pk
+                    elif data.get(attname) is not None:
+                        try:
+                            data[attname] = id_map[target][data[attname]]
+                        except KeyError:
+                            raise ValueError(
+                                f"{key}[{index}]: {attname} {data[attname]} "
+                                f"is not in {target}."
+                            )
+                objs.append(model(**data))
+
+            if model is Chapter:
+                _drop_missing_tests(objs)
+            created = _bulk_create(model, objs)
+            id_map[key] = {row["id"]: obj.pk for row, obj in zip(rows, created)}
+
+        transaction.on_commit(_invalidate_content_caches)
+
+    return course
+
+
+def _drop_missing_tests(chapters):
+    # Diagnostic tests are shared between courses, not copied
+    test_fields = ["before_diagnostic_test_id", "after_diagnostic_test_id"]
+    test_ids = {
+        getattr(chapter, field)
+        for chapter in chapters
+        for field in test_fields
+        if getattr(chapter, field)
+    }
+    existing = set(Test.objects.filter(pk__in=test_ids).values_list("pk", flat=True))
+    for chapter in chapters:
+        for field in test_fields:
+            if getattr(chapter, field) not in existing:
+                setattr(chapter, field, None)
+
+
+def _invalidate_content_caches():
+    bump_content_version()
+    delete_keys_matching.delay()
@@ -1,8 +1,14 @@
+from datetime import datetime, time, timedelta
+
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
+from django.utils.dateparse import parse_date
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,11 +17,31 @@ from account.models import Child, Student
 from account.permissions import (
     HasSubscription,
     IsSuperUserOrStaffOrReadOnly,
+    IsStaff,
     IsSuperUser,
 )
-from account.tasks import send_complaint_to_admins
-from account.utils import get_cache_key
-from .utils import get_complaint_list_cache_key
+from account.cache import (
+    bump_progress_version,
+    get_learner_cache_index_key,
+    get_or_build_response,
+    set_cached_response,
+)
+from account.utils import (
+    confirm_direct_upload,
+    create_direct_upload,
+    reorder,
+    update_rows_by_pk,
+)
+from .utils import (
+    ContentETagMixin,
+    apply_course_progress,
+    bump_content_version,
+    export_course_snapshot,
+    get_complaint_list_cache_key,
+    get_content_cache_key,
+    get_course_tree,
+    import_course_snapshot,
+)
 
 from .models import (
     Answer,
@@ -25,8 +51,10 @@ from .models import (
     Content,
     ContentNode,
     Course,
+    Image,
     Lesson,
     Question,
+    QuestionAccuracy,
     Section,
     Task,
     TaskCompletion,
@@ -38,85 +66,85 @@ from .serializers import (
     ContentNodeSerializer,
     ContentSerializer,
     CourseSerializer,
+    CourseSnapshotImportSerializer,
+    LearningPathNodeSerializer,
     LessonSerializer,
+    QuestionMediaConfirmSerializer,
+    QuestionMediaUploadSerializer,
     QuestionSerializer,
     SectionSerializer,
+    TaskAnswersSubmitSerializer,
     TaskSerializer,
     TaskSummarySerializer,
 )
 
 GAME_COST_CONST = 20
 CACHE_TIMEOUT = 3600
+QUESTION_MEDIA_MODELS = {"image": Image, "canvas_image": CanvasImage}
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
+    etag_actions = ("list", "retrieve", "tree")
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         user = request.user
         child_id = request.query_params.get("child_id")
-        cache_key = get_cache_key("course", user, child_id, id=instance.id)
+        cache_key = get_content_cache_key("course", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            print("Cache hit", cached_data)
-            return Response(cached_data)
+        def build():
+            serializer = self.serializer_class(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        print("Cache miss")
-        serializer = self.serializer_class(
-            instance, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-
-        return Response(serializer.data)
 
     def list(self, request):
         user = request.user
         child_id = request.query_params.get("child_id")
-        cache_key = get_cache_key("courses", user, child_id)
-        print(cache_key)
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
-
-        print("Cache miss")
+        cache_key = get_content_cache_key("courses", user, child_id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
+
+        def build():
+            if user.is_student:
+                student = get_object_or_404(Student, user=user)
+                if not user.is_test_user:
+                    queryset = Course.objects.filter(
+                        grade__in=[student.grade, -1],
+                        language__in=[student.language, "cm"],
+                        is_active=True,
+                    )
+                else:
+                    queryset = Course.objects.all()
 
-        if user.is_student:
-            student = get_object_or_404(Student, user=user)
-            if not user.is_test_user:
+            elif user.is_parent and child_id:
+                child = get_object_or_404(Child, parent=user.parent, pk=child_id)
                 queryset = Course.objects.filter(
-                    grade__in=[student.grade, -1],
-                    language__in=[student.language, "cm"],
+                    grade__in=[child.grade, -1],
+                    language__in=[child.language, "cm"],
                     is_active=True,
                 )
+
             else:
                 queryset = Course.objects.all()
 
-        elif user.is_parent and child_id:
-            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
-            queryset = Course.objects.filter(
-                grade__in=[child.grade, -1],
-                language__in=[child.language, "cm"],
-                is_active=True,
+            serializer = self.serializer_class(
+                queryset,
+                many=True,
+                context={"request": request, "child_id": child_id},
             )
+            return serializer.data
 
-        else:
-            queryset = Course.objects.all()
-
-        serializer = self.serializer_class(
-            queryset,
-            many=True,
-            context={"request": request, "child_id": child_id},
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-
-        return Response(serializer.data)
 
     def create(self, request):
         user = request.user
@@ -128,13 +156,80 @@ class CourseViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=["get"], url_path="tree")
+    def tree(self, request, pk=None, *args, **kwargs):
+        """
+        Return the whole course outline in one response: sections, chapters
+        and their lessons and tasks, with the progress of the learner.
+        """
+        tree = get_course_tree(int(pk)) if pk.isdigit() else None
+        if tree is None:
+            return Response(
+                {"message": "Course not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        user = request.user
+        child_id = request.query_params.get("child_id")
+        completions = TaskCompletion.objects.none()
+        if user.is_student:
+            completions = TaskCompletion.objects.filter(user=user)
+        elif user.is_parent and child_id:
+            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
+            completions = TaskCompletion.objects.filter(child=child)
+
+        completed_task_ids = set(
+            completions.filter(task__chapter__section__course_id=pk).values_list(
+                "task_id", flat=True
+            )
+        )
+        return Response(apply_course_progress(tree, completed_task_ids))
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsSuperUser | IsStaff],
+    )
+    def export(self, request, *args, **kwargs):
+        """
+        Return the course with its whole content tree as a snapshot for
+        import-snapshot.
+        """
+        return Response(export_course_snapshot(self.get_object()))
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import-snapshot",
+        permission_classes=[IsSuperUser | IsStaff],
+    )
+    def import_snapshot(self, request, *args, **kwargs):
+        """
+        Create a new course from a snapshot, optionally under another name,
+        language or grade.
+        """
+        serializer = CourseSnapshotImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        overrides = dict(serializer.validated_data)
+        snapshot = overrides.pop("snapshot")
+        try:
+            course = import_course_snapshot(
+                snapshot, created_by=request.user, **overrides
+            )
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            self.serializer_class(course, context={"request": request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
 
 
-class SectionViewSet(viewsets.ModelViewSet):
+class SectionViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Section.objects.all()
     serializer_class = SectionSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -149,42 +244,37 @@ class SectionViewSet(viewsets.ModelViewSet):
         user = request.user
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("section", user, child_id, id=instance.id)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("section", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            serializer = self.serializer_class(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            instance, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
 
     def list(self, request, course_pk=None):
         user = request.user
         child_id = request.query_params.get("child_id")
-        cache_key = get_cache_key("sections", user, child_id, course=course_pk)
-        print("Cache key", cache_key)
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("sections", user, child_id, course=course_pk)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            queryset = self.get_queryset()
 
-        queryset = self.get_queryset()
+            serializer = self.serializer_class(
+                queryset, many=True, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            queryset, many=True, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
 
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
-
     def create(self, request, course_pk=None):
         data = request.data.copy()
 
@@ -209,7 +299,7 @@ class SectionViewSet(viewsets.ModelViewSet):
         return context
 
 
-class ChapterViewSet(viewsets.ModelViewSet):
+class ChapterViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Chapter.objects.all()
     serializer_class = ChapterSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -219,42 +309,39 @@ class ChapterViewSet(viewsets.ModelViewSet):
         user = request.user
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("chapter", user, child_id, id=instance.id)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("chapter", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            serializer = self.serializer_class(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            instance, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
 
     def list(self, request, *args, **kwargs):
         user = request.user
         course_pk = self.kwargs["course_pk"]
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("chapters", user, child_id, course=course_pk)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("chapters", user, child_id, course=course_pk)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            queryset = self.get_queryset()
 
-        queryset = self.get_queryset()
+            serializer = self.serializer_class(
+                queryset, many=True, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            queryset, many=True, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
 
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
-
     def get_queryset(self):
         return Chapter.objects.filter(section_id=self.kwargs["section_pk"]).order_by(
             "order"
@@ -270,7 +357,7 @@ class ChapterViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ContentViewSet(viewsets.ModelViewSet):
+class ContentViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Content.objects.all()
     serializer_class = ContentSerializer
     permission_classes = [IsSuperUserOrStaffOrReadOnly]
@@ -285,42 +372,41 @@ class ContentViewSet(viewsets.ModelViewSet):
         user = request.user
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("content", user, child_id, id=instance.id)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("content", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            serializer = self.serializer_class(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            instance, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
 
     def list(self, request, *args, **kwargs):
         user = request.user
         chapter_pk = self.kwargs["chapter_pk"]
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("contents", user, child_id, chapter=chapter_pk)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key(
+            "contents", user, child_id, chapter=chapter_pk
+        )
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            queryset = self.get_queryset()
 
-        queryset = self.get_queryset()
+            serializer = self.serializer_class(
+                queryset, many=True, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            queryset, many=True, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
 
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
-
     def create(self, request, chapter_pk=None):
         data = request.data.copy()
         data["chapter"] = chapter_pk
@@ -350,35 +436,40 @@ class ContentViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
 
-                content_ids = [content_data["id"] for content_data in contents_data]
-                contents = Content.objects.in_bulk(content_ids)
-                if len(contents) != len(content_ids):
+                values_by_pk = {
+                    content_data["id"]: {
+                        field: content_data[field]
+                        for field in ("order", "title", "description")
+                        if field in content_data
+                    }
+                    for content_data in contents_data
+                }
+                updated = update_rows_by_pk(
+                    Content.objects.all(),
+                    values_by_pk,
+                    ["order", "title", "description"],
+                )
+                if updated != len(values_by_pk) and any(values_by_pk.values()):
+                    transaction.set_rollback(True)
                     return Response(
                         {"detail": "Some contents do not exist."},
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-                for content_data in contents_data:
-                    content = contents.get(content_data["id"])
+                # The bulk UPDATE skips post_save, so the course trees are
+                # invalidated here
+                transaction.on_commit(bump_content_version)
 
-                    if content:
-                        content.order = content_data.get("order", content.order)
-                        content.title = content_data.get("title", content.title)
-                        content.description = content_data.get(
-                            "description", content.description
-                        )
-                Content.objects.bulk_update(
-                    contents.values(),
-                    ["order", "title", "description"],
-                )
-
-                cache_key = get_cache_key("contents", user, child_id, chapter=chapter_pk)
+                cache_key = get_content_cache_key("contents", user, child_id, chapter=chapter_pk)
+                index_key = get_learner_cache_index_key(user.id, child_id)
                 queryset = self.get_queryset()
 
                 serializer = self.serializer_class(
                     queryset, many=True, context={"request": request, "child_id": child_id}
                 )
-                cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
+                set_cached_response(
+                    cache_key, serializer.data, CACHE_TIMEOUT, index_key=index_key
+                )
 
             return Response(
                 {"detail": "Contents updated successfully."}, status=status.HTTP_200_OK
@@ -401,9 +492,11 @@ class ContentNodeViewSet(viewsets.ModelViewSet):
     queryset = ContentNode.objects.all()
 
     def get_queryset(self):
-        return ContentNode.objects.filter(
-            chapter_id=self.kwargs["chapter_pk"]
-        ).order_by("order")
+        return (
+            ContentNode.objects.filter(chapter_id=self.kwargs["chapter_pk"])
+            .select_related("lesson", "task")
+            .order_by("order")
+        )
 
     def create(self, request, course_pk=None, section_pk=None, chapter_pk=None):
         data = request.data.copy()
@@ -414,8 +507,52 @@ class ContentNodeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="learning-path",
+        permission_classes=[HasSubscription],
+    )
+    def learning_path(self, request, course_pk=None, section_pk=None, chapter_pk=None):
+        """
+        Return the ordered nodes of the chapter with their lesson and task
+        summaries and the completion flags of the learner.
+        """
+        chapter = get_object_or_404(
+            Chapter, pk=chapter_pk, section_id=section_pk, section__course_id=course_pk
+        )
+        nodes = self.get_queryset()
+
+        user = request.user
+        child_id = request.query_params.get("child_id")
+        completions = TaskCompletion.objects.none()
+        if user.is_student:
+            completions = TaskCompletion.objects.filter(user=user)
+        elif user.is_parent and child_id:
+            child = get_object_or_404(Child, parent=user.parent, pk=child_id)
+            completions = TaskCompletion.objects.filter(child=child)
 
-class LessonViewSet(viewsets.ModelViewSet):
+        completed_task_ids = set(
+            completions.filter(task__chapter_id=chapter.id).values_list(
+                "task_id", flat=True
+            )
+        )
+        serializer = LearningPathNodeSerializer(
+            nodes, many=True, context={"completed_task_ids": completed_task_ids}
+        )
+        task_ids = [node.task_id for node in nodes if node.task_id is not None]
+        return Response(
+            {
+                "chapter": chapter.id,
+                "title": chapter.title,
+                "total_tasks": len(task_ids),
+                "completed_tasks": len(completed_task_ids.intersection(task_ids)),
+                "nodes": serializer.data,
+            }
+        )
+
+
+class LessonViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [HasSubscription, IsSuperUserOrStaffOrReadOnly]
@@ -430,41 +567,39 @@ class LessonViewSet(viewsets.ModelViewSet):
         user = request.user
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("lesson", user, child_id, id=instance.id)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("lesson", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
-        serializer = self.serializer_class(
-            instance, context={"request": request, "child_id": child_id}
+        def build():
+            serializer = self.serializer_class(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
+
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
 
     def list(self, request, *args, **kwargs):
         user = request.user
         chapter_pk = self.kwargs["chapter_pk"]
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("lessons", user, child_id, chapter=chapter_pk)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("lessons", user, child_id, chapter=chapter_pk)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            queryset = self.get_queryset()
 
-        queryset = self.get_queryset()
+            serializer = self.serializer_class(
+                queryset, many=True, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.serializer_class(
-            queryset, many=True, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
 
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
-
     def create(self, request, course_pk=None, section_pk=None, chapter_pk=None):
         content_node = request.query_params.get("content-node") or request.data.get(
             "content-node"
@@ -524,7 +659,7 @@ class LessonViewSet(viewsets.ModelViewSet):
         return context
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ContentETagMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [HasSubscription, IsSuperUserOrStaffOrReadOnly]
@@ -587,47 +722,153 @@ class TaskViewSet(viewsets.ModelViewSet):
         chapter_pk = self.kwargs["chapter_pk"]
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("tasks", user, child_id, chapter=chapter_pk)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("tasks", user, child_id, chapter=chapter_pk)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            queryset = self.get_queryset()
 
-        queryset = self.get_queryset()
+            serializer = self.get_serializer(
+                queryset, many=True, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.get_serializer(
-            queryset, many=True, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
 
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
-
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         user = request.user
         child_id = request.query_params.get("child_id")
 
-        cache_key = get_cache_key("task", user, child_id, id=instance.id)
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
+        cache_key = get_content_cache_key("task", user, child_id, id=instance.id)
+        index_key = get_learner_cache_index_key(user.id, child_id)
 
-        print("Cache miss")
+        def build():
+            serializer = self.get_serializer(
+                instance, context={"request": request, "child_id": child_id}
+            )
+            return serializer.data
 
-        serializer = self.get_serializer(
-            instance, context={"request": request, "child_id": child_id}
+        return get_or_build_response(
+            request, cache_key, build, CACHE_TIMEOUT, index_key=index_key
         )
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
 
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="submit-answers",
+        permission_classes=[IsAuthenticated],
+    )
+    def submit_answers(self, request, *args, **kwargs):
+        """
+        Records every answer of a task in one request:
+        {"child_id": 1, "answers": [{"question": 1, "is_correct": true}, ...]}
+        Questions that were already answered are skipped without reward.
+        """
+        user = request.user
+        child_id = request.data.get("child_id")
+
+        if user.is_student:
+            entity = user.student
+            learner_filter = {"user": user, "child": None}
+        elif user.is_parent and child_id:
+            entity = get_object_or_404(Child, parent=user.parent, pk=child_id)
+            learner_filter = {"user": None, "child": entity}
+        else:
+            return Response(
+                {"message": "Invalid request. Parent must provide child_id."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = TaskAnswersSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = self.get_object()
+        submitted = {
+            answer["question"]: answer["is_correct"]
+            for answer in serializer.validated_data["answers"]
+        }
+
+        task_question_ids = set(task.questions.values_list("id", flat=True))
+        unknown_questions = [
+            question_id
+            for question_id in submitted
+            if question_id not in task_question_ids
+        ]
+        if unknown_questions:
+            return Response(
+                {
+                    "message": "Questions do not belong to this task.",
+                    "questions": unknown_questions,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            # Serialises concurrent submissions of the same learner; the
+            # locked row is used so later saves do not write stale columns
+            entity = type(entity).objects.select_for_update().get(pk=entity.pk)
+
+            previous_answers = dict(
+                Answer.objects.filter(
+                    **learner_filter, question__task=task
+                ).values_list("question_id", "is_correct")
+            )
+            new_answers = [
+                Answer(
+                    **learner_filter,
+                    question_id=question_id,
+                    is_correct=is_correct,
+                )
+                for question_id, is_correct in submitted.items()
+                if question_id not in previous_answers
+            ]
+            Answer.objects.bulk_create(new_answers)
+            if new_answers:
+                # bulk_create skips the Answer post_save bumping this
+                bump_progress_version(
+                    new_answers[0].user_id, new_answers[0].child_id
+                )
+
+            rewarded_answers = sum(answer.is_correct for answer in new_answers)
+            if rewarded_answers:
+                entity.add_question_rewards(rewarded_answers)
+                entity.update_level()
+
+            answered_questions = len(previous_answers) + len(new_answers)
+            correct_answers = sum(previous_answers.values()) + rewarded_answers
+            is_completed = bool(new_answers) and answered_questions == len(
+                task_question_ids
+            )
+
+            if is_completed:
+                TaskCompletion.objects.update_or_create(
+                    **learner_filter,
+                    task=task,
+                    defaults={
+                        "correct": correct_answers,
+                        "wrong": answered_questions - correct_answers,
+                    },
+                )
+                entity.update_streak()
+
+        return Response(
+            {
+                "message": "Answers processed",
+                "answered": len(new_answers),
+                "skipped": len(submitted) - len(new_answers),
+                "rewarded": rewarded_answers,
+                "is_completed": is_completed,
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 class QuestionViewSet(viewsets.ModelViewSet):
     queryset = Question.objects.all()
@@ -695,6 +936,79 @@ class QuestionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(detail=False, methods=["post"], url_path="media-upload-url")
+    def media_upload_url(self, request, *args, **kwargs):
+        """
+        Presign a direct upload of a question image or canvas image. The
+        returned `upload_token` is attached with confirm-media.
+        """
+        serializer = QuestionMediaUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if not data["content_type"].startswith("image/"):
+            return Response(
+                {"message": "Only images can be uploaded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            upload = create_direct_upload(
+                QUESTION_MEDIA_MODELS[data["kind"]]._meta.get_field("image"),
+                data["filename"],
+                data["content_type"],
+                method=data["method"],
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"message": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(upload, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="confirm-media")
+    def confirm_media(self, request, *args, **kwargs):
+        """
+        Attach a finished direct upload to the question, replacing the image
+        of the same option or canvas image id.
+        """
+        question = self.get_object()
+        serializer = QuestionMediaConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        kind = serializer.validated_data["kind"]
+        media_id = serializer.validated_data["media_id"]
+
+        try:
+            name = confirm_direct_upload(
+                QUESTION_MEDIA_MODELS[kind]._meta.get_field("image"),
+                serializer.validated_data["upload_token"],
+            )
+        except DjangoValidationError as e:
+            return Response(
+                {"message": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            if kind == "image":
+                image, _ = question.images.update_or_create(
+                    option_id=media_id, defaults={"image": name}
+                )
+                option = {"id": media_id, "value": image.image.url}
+                options = [
+                    option if str(item.get("id")) == media_id else item
+                    for item in question.options or []
+                ]
+                if option not in options:
+                    options.append(option)
+                question.options = options
+            else:
+                question.canvas_images.update_or_create(
+                    image_id=media_id, defaults={"image": name}
+                )
+            question.save()
+
+        return Response(
+            self.serializer_class(question, context={"request": request}).data,
+            status=status.HTTP_200_OK,
+        )
+
     @action(
         detail=True,
         methods=["post"],
@@ -833,28 +1147,21 @@ class QuestionViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
 
-                questions_ids = [
-                    question_data["id"] for question_data in questions_data
-                ]
-                questions = Question.objects.in_bulk(questions_ids)
-
-                if len(questions) != len(questions_ids):
+                orders = {
+                    question_data["id"]: question_data["order"]
+                    for question_data in questions_data
+                    if "order" in question_data
+                }
+                if reorder(Question.objects.all(), orders) != len(orders):
+                    transaction.set_rollback(True)
                     return Response(
                         {"detail": "Some questions do not exist."},
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-                for question_data in questions_data:
-                    question = questions.get(question_data["id"])
-
-                    if question:
-                        question.order = question_data.get("order", question.order)
-                Question.objects.bulk_update(
-                    questions.values(),
-                    [
-                        "order",
-                    ],
-                )
+                # The bulk UPDATE skips post_save, so the content versions
+                # are bumped here
+                transaction.on_commit(bump_content_version)
 
             return Response(
                 {"detail": "Question updated successfully."}, status=status.HTTP_200_OK
@@ -939,12 +1246,23 @@ class DeleteCanvasImage(APIView):
         )
 
 
+class ComplaintCursorPagination(CursorPagination):
+    ordering = "-created_at"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
 class ComplaintViewSet(viewsets.ModelViewSet):
     """
     A viewset for viewing and editing complaint instances.
+    The list is cursor-paginated, newest first, and can be filtered with the
+    query params status, type, course, created_after and created_before
+    (dates, inclusive).
     """
 
     serializer_class = ComplaintSerializer
+    pagination_class = ComplaintCursorPagination
 
     def get_permissions(self):
         if self.action in ["update", "partial_update"]:
@@ -953,24 +1271,216 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
+    def get_filters(self, query_params, with_status=True):
+        """
+        Return the lookups of the list filters in `query_params`, or raise
+        ValueError with a message for the client.
+        """
+        filters = {}
+        choice_fields = ["type", "status"] if with_status else ["type"]
+        for name in choice_fields:
+            value = query_params.get(name)
+            if value:
+                choices = dict(Complaint._meta.get_field(name).choices)
+                if value not in choices:
+                    raise ValueError(f"{name} must be one of {list(choices)}")
+                filters[name] = value
+
+        course_id = query_params.get("course")
+        if course_id:
+            if not course_id.isdigit():
+                raise ValueError("course must be a course id")
+            filters["course_id"] = int(course_id)
+
+        # Compared as datetimes so the created_at indexes can be used
+        for name, lookup, days in (
+            ("created_after", "created_at__gte", 0),
+            ("created_before", "created_at__lt", 1),
+        ):
+            value = query_params.get(name)
+            if value:
+                date = parse_date(value)
+                if not date:
+                    raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+                filters[lookup] = datetime.combine(
+                    date + timedelta(days=days), time.min
+                )
+        return filters
+
     def list(self, request, *args, **kwargs):
-        cache_key = get_complaint_list_cache_key()
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print("Cache hit:", cache_key)
-            return Response(cached_data)
-
-        print("Cache miss")
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        cache.set(cache_key, serializer.data, CACHE_TIMEOUT)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            filters = self.get_filters(request.query_params)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = get_complaint_list_cache_key(
+            request.query_params, filters.get("course_id")
+        )
+
+        def build():
+            queryset = (
+                self.get_queryset()
+                .filter(**filters)
+                .only(
+                    *[field.name for field in Complaint._meta.concrete_fields],
+                    "user__email",
+                    "question__title",
+                    "question__question_text",
+                    "question__task__title",
+                    "question__task__chapter__title",
+                    "question__task__chapter__section__title",
+                    "course__name",
+                    "course__grade",
+                    "course__language",
+                )
+            )
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return {
+                "next": self.paginator.get_next_link(),
+                "previous": self.paginator.get_previous_link(),
+                "results": serializer.data,
+            }
+
+        return get_or_build_response(request, cache_key, build, CACHE_TIMEOUT)
+
+    @action(detail=False, methods=["get"], url_path="status-counts")
+    def status_counts(self, request):
+        """
+        Return the number of complaints per status for the list filters other
+        than status, from one aggregate query.
+        """
+        try:
+            filters = self.get_filters(request.query_params, with_status=False)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = get_complaint_list_cache_key(
+            request.query_params, filters.get("course_id"), kind="counts"
+        )
+
+        def build():
+            statuses = dict(Complaint._meta.get_field("status").choices)
+            return Complaint.objects.filter(**filters).aggregate(
+                total=Count("id"),
+                **{value: Count("id", filter=Q(status=value)) for value in statuses},
+            )
+
+        return get_or_build_response(request, cache_key, build, CACHE_TIMEOUT)
 
     def get_queryset(self):
         return Complaint.objects.select_related(
-            "question",
-            "question__task",
-            "question__task__chapter",
+            "user",
+            "course",
             "question__task__chapter__section",
-            "question__task__chapter__section__course",
         )
+
+
+class QuestionAccuracyView(APIView):
+    """
+    Accuracy of course questions for staff, from the QuestionAccuracy table
+    refreshed by tasks.tasks.refresh_question_accuracy.
+    Query params: level (question, task, chapter), course, chapter, task,
+    min_attempts, ordering (correct_rate, attempts, correct; "-" for
+    descending, default correct_rate) and limit.
+    """
+
+    permission_classes = [IsSuperUser | IsStaff]
+
+    # (id fields, {output name: lookup}) of each level
+    LEVEL_FIELDS = {
+        "question": (
+            ["question_id", "task_id", "chapter_id"],
+            {
+                "question_title": "question__title",
+                "question_text": "question__question_text",
+                "task_title": "task__title",
+                "chapter_title": "chapter__title",
+            },
+        ),
+        "task": (
+            ["task_id", "chapter_id"],
+            {"task_title": "task__title", "chapter_title": "chapter__title"},
+        ),
+        "chapter": (["chapter_id"], {"chapter_title": "chapter__title"}),
+    }
+    ORDERING_FIELDS = {
+        "correct_rate": "correct_rate",
+        "attempts": "total_attempts",
+        "correct": "total_correct",
+    }
+    MAX_LIMIT = 500
+
+    def get(self, request):
+        level = request.query_params.get("level", "question")
+        if level not in self.LEVEL_FIELDS:
+            return Response(
+                {"message": f"level must be one of {list(self.LEVEL_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ordering = request.query_params.get("ordering", "correct_rate")
+        descending = ordering.startswith("-")
+        order_field = self.ORDERING_FIELDS.get(ordering.lstrip("-"))
+        if order_field is None:
+            return Response(
+                {"message": f"ordering must be one of {list(self.ORDERING_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            min_attempts = int(request.query_params.get("min_attempts", 1))
+            limit = min(int(request.query_params.get("limit", 100)), self.MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {"message": "min_attempts and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = QuestionAccuracy.objects.all()
+        for param, lookup in (
+            ("course", "chapter__section__course_id"),
+            ("chapter", "chapter_id"),
+            ("task", "task_id"),
+        ):
+            value = request.query_params.get(param)
+            if value:
+                if not value.isdigit():
+                    return Response(
+                        {"message": f"{param} must be a {param} id"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                queryset = queryset.filter(**{lookup: int(value)})
+
+        id_fields, titles = self.LEVEL_FIELDS[level]
+        rows = (
+            queryset.values(
+                *id_fields, **{name: F(lookup) for name, lookup in titles.items()}
+            )
+            .annotate(
+                questions=Count("id"),
+                total_attempts=Sum("attempts"),
+                total_correct=Sum("correct"),
+            )
+            .annotate(
+                correct_rate=Cast("total_correct", FloatField())
+                / NullIf("total_attempts", 0)
+            )
+            .filter(total_attempts__gte=min_attempts)
+            .order_by(
+                F(order_field).desc() if descending else F(order_field).asc(),
+                "-total_attempts",
+            )[:limit]
+        )
+
+        data = [
+            {
+                **{field: row[field] for field in [*id_fields, *titles]},
+                "questions": row["questions"],
+                "attempts": row["total_attempts"],
+                "correct": row["total_correct"],
+                "correct_rate": row["correct_rate"],
+            }
+            for row in rows
+        ]
+        return Response(data, status=status.HTTP_200_OK)
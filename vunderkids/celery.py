@@ -51,4 +51,16 @@ def debug_task(self):
             "task": "account.tasks.generate_daily_messages",
             "schedule": crontab(hour=11, minute=28),
         },
+        "compute-test-statistics-every-night": {
+            "task": "modo.tasks.compute_test_statistics",
+            "schedule": crontab(hour=3, minute=15),
+        },
+        "refresh-question-accuracy-hourly": {
+            "task": "tasks.tasks.refresh_question_accuracy",
+            "schedule": crontab(minute=40),
+        },
+        "send-complaint-digest-every-15-minutes": {
+            "task": "account.tasks.send_complaint_digest",
+            "schedule": crontab(minute="*/15"),
+        },
     }
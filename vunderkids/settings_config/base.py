@@ -178,6 +178,10 @@ MIDDLEWARE = [
 if STAGE == "DEV":
     MIDDLEWARE.insert(1, "silk.middleware.SilkyMiddleware")
 
+# Send gzip-compressed cached responses to clients as they are, see
+# account.cache.get_or_build_response. Off in DEV, where silk parses bodies.
+VIEW_CACHE_GZIP_PASSTHROUGH = STAGE != "DEV"
+
 ROOT_URLCONF = "vunderkids.urls"
 
 TEMPLATES = [
@@ -224,7 +228,8 @@ AUTHENTICATION_BACKENDS = [
 AWS_ACCESS_KEY_ID = os.getenv("YANDEX_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("YANDEX_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("YANDEX_BUCKET_NAME")
-AWS_S3_ENDPOINT_URL = "https://storage.yandexcloud.kz"
+# Overridable to point at a local S3-compatible server (e.g. MinIO) in development
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL", "https://storage.yandexcloud.kz")
 AWS_S3_REGION_NAME = "kz1"
 AWS_S3_SIGNATURE_VERSION = "s3"
 AWS_S3_ADDRESSING_STYLE = "path"
@@ -238,12 +243,17 @@ USE_TZ = False
 STATIC_URL = "/staticfiles/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# Uploaded test bundles wait here for the import worker, see modo.tasks. It
+# must be shared by the web and worker containers; the default is inside the
+# project mount they share and is ignored by git.
+TEST_IMPORT_ROOT = os.getenv("TEST_IMPORT_ROOT", os.path.join(BASE_DIR, "imports"))
+
 MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.storage.yandexcloud.kz/media/"
 # DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
 
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        "BACKEND": "account.storages.CachedUrlS3Storage",
     },
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",